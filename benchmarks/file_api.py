@@ -0,0 +1,139 @@
+import asyncio
+import os
+import platform
+import sys
+from datetime import datetime
+from typing import Dict, Optional
+
+import click
+from rich.console import Console
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.workload import LoadGenerator, Workload, parse_size, parse_weights
+from benchmarks.results import (compare_runs, load_results, print_comparison, print_run,
+                                save_results, summarize_latencies)
+from benchmarks.servers import node_server, scratch_dir
+
+console = Console()
+
+def run_workload(base_url: str, workload: Workload, generator_class=LoadGenerator) -> Dict:
+    generator = generator_class(base_url, workload)
+    elapsed = asyncio.run(generator.run())
+    operations = {
+        op: summarize_latencies(stats.latencies_ms, stats.bytes, stats.errors, elapsed)
+        for op, stats in generator.stats.items()
+    }
+    all_latencies = [lat for stats in generator.stats.values() for lat in stats.latencies_ms]
+    operations["total"] = summarize_latencies(
+        all_latencies,
+        sum(stats.bytes for stats in generator.stats.values()),
+        sum(stats.errors for stats in generator.stats.values()),
+        elapsed
+    )
+    return {"elapsed_s": elapsed, "operations": operations}
+
+def build_workload(concurrency, duration, warmup_files, sizes, mix, seed) -> Workload:
+    return Workload(
+        concurrency=concurrency,
+        duration_s=duration,
+        warmup_files=warmup_files,
+        sizes={parse_size(size): weight for size, weight in parse_weights(sizes).items()},
+        mix=parse_weights(mix),
+        seed=seed
+    )
+
+def finish(results: Dict, save: Optional[str], baseline: Optional[str], threshold: float):
+    if save:
+        save_results(save, results)
+        console.print(f"[green]Results saved to {save}[/green]")
+    if baseline:
+        rows = compare_runs(load_results(baseline), results, threshold)
+        if not print_comparison(rows, threshold):
+            sys.exit(1)
+
+def workload_options(command):
+    options = [
+        click.option('--concurrency', default=16, help='Concurrent client connections'),
+        click.option('--duration', default=10.0, help='Measured seconds per run'),
+        click.option('--warmup-files', default=100, help='Files written before measuring'),
+        click.option('--sizes', default='4KiB:0.6,64KiB:0.3,1MiB:0.1', help='File size distribution as size:weight,...'),
+        click.option('--mix', default='read:0.7,write:0.2,list:0.05,delete:0.05', help='Operation mix as op:weight,...'),
+        click.option('--seed', default=0, help='Random seed for the workload'),
+        click.option('--save', default=None, help='Write results to this JSON file'),
+        click.option('--baseline', default=None, type=click.Path(exists=True, dir_okay=False),
+                     help='Compare against a saved baseline and fail on regressions'),
+        click.option('--threshold', default=0.1, help='Allowed relative regression before failing'),
+    ]
+    for option in reversed(options):
+        command = option(command)
+    return command
+
+def metadata(workload: Workload, **extra) -> Dict:
+    return {
+        "benchmark": "file_api",
+        "timestamp": datetime.now().isoformat(),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "workload": workload.dict(),
+        **extra
+    }
+
+@click.group()
+def cli():
+    """Throughput benchmarks for the node file API"""
+
+@cli.command()
+@click.option('--url', default=None, help='Benchmark an already running node instead of starting one')
+@click.option('--workers', default=1, help='uvicorn workers for the node started by the benchmark')
+@click.option('--port', default=8101, help='Port for the node started by the benchmark')
+@workload_options
+def run(url, workers, port, concurrency, duration, warmup_files, sizes, mix, seed, save, baseline, threshold):
+    """Run one workload against a node"""
+    workload = build_workload(concurrency, duration, warmup_files, sizes, mix, seed)
+    if url:
+        label = "external"
+        result = run_workload(url, workload)
+    else:
+        label = f"workers={workers}"
+        with scratch_dir() as scratch, node_server(port, workers, scratch):
+            result = run_workload(f"http://127.0.0.1:{port}", workload)
+
+    print_run(f"File API ({label}, concurrency={concurrency})", result["operations"])
+    finish({**metadata(workload), "runs": [{"label": label, **result}]}, save, baseline, threshold)
+
+@cli.command()
+@click.option('--workers', 'worker_counts', default='1,2,4', help='Comma-separated uvicorn worker counts to sweep')
+@click.option('--port', default=8101, help='Port for the nodes started by the benchmark')
+@workload_options
+def sweep(worker_counts, port, concurrency, duration, warmup_files, sizes, mix, seed, save, baseline, threshold):
+    """Run the workload against a local node for each worker count"""
+    workload = build_workload(concurrency, duration, warmup_files, sizes, mix, seed)
+    runs = []
+    for workers in (int(count) for count in worker_counts.split(",")):
+        with scratch_dir() as scratch, node_server(port, workers, scratch):
+            result = run_workload(f"http://127.0.0.1:{port}", workload)
+        label = f"workers={workers}"
+        print_run(f"File API ({label}, concurrency={concurrency})", result["operations"])
+        runs.append({"label": label, "workers": workers, **result})
+
+    console.print("\n[bold]Scaling[/bold]")
+    for entry in runs:
+        total = entry["operations"]["total"]
+        console.print(f"{entry['label']}: {total['ops_per_s']:.1f} ops/s, {total['mb_per_s']:.2f} MB/s, p99 {total['p99_ms']:.2f} ms")
+    finish({**metadata(workload), "runs": runs}, save, baseline, threshold)
+
+@cli.command()
+@click.argument('baseline', type=click.Path(exists=True, dir_okay=False))
+@click.argument('current', type=click.Path(exists=True, dir_okay=False))
+@click.option('--threshold', default=0.1, help='Allowed relative regression before failing')
+def compare(baseline, current, threshold):
+    """Compare two saved result files"""
+    rows = compare_runs(load_results(baseline), load_results(current), threshold)
+    if not print_comparison(rows, threshold):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    cli()
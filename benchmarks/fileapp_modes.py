@@ -0,0 +1,48 @@
+import os
+import sys
+
+import click
+from rich.console import Console
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.file_api import build_workload, finish, metadata, run_workload, workload_options
+from benchmarks.results import print_run
+from benchmarks.servers import FILEAPP_SCRIPTS, fileapp_server, node_server, scratch_dir
+from benchmarks.workload import FileAppLoadGenerator
+
+console = Console()
+
+@click.command()
+@click.option('--modes', default='flask,async', help='Comma-separated file app serving modes to compare')
+@click.option('--fileapp-workers', default=1, help='uvicorn workers for the async mode')
+@click.option('--node-workers', default=1, help='uvicorn workers for the node behind the file app')
+@click.option('--port', default=5101, help='Port for the file app started by the benchmark')
+@click.option('--node-port', default=8101, help='Port for the node started by the benchmark')
+@workload_options
+def main(modes, fileapp_workers, node_workers, port, node_port,
+         concurrency, duration, warmup_files, sizes, mix, seed, save, baseline, threshold):
+    """Compare the Flask and async serving modes of the web file app"""
+    workload = build_workload(concurrency, duration, warmup_files, sizes, mix, seed)
+    runs = []
+    for mode in modes.split(","):
+        if mode not in FILEAPP_SCRIPTS:
+            raise click.BadParameter(f"Unknown mode {mode}", param_hint="--modes")
+        node_url = f"http://127.0.0.1:{node_port}"
+        with scratch_dir() as scratch, node_server(node_port, node_workers, scratch), \
+                fileapp_server(mode, port, node_url, fileapp_workers):
+            result = run_workload(f"http://127.0.0.1:{port}", workload, FileAppLoadGenerator)
+        label = f"mode={mode}"
+        print_run(f"File app ({label}, concurrency={concurrency})", result["operations"])
+        runs.append({"label": label, "mode": mode, **result})
+
+    console.print("\n[bold]Serving modes[/bold]")
+    for entry in runs:
+        total = entry["operations"]["total"]
+        console.print(f"{entry['label']}: {total['ops_per_s']:.1f} ops/s, {total['mb_per_s']:.2f} MB/s, "
+                      f"p99 {total['p99_ms']:.2f} ms, {total['errors']} errors")
+    finish({**metadata(workload, benchmark="fileapp_modes"), "runs": runs}, save, baseline, threshold)
+
+if __name__ == '__main__':
+    main()
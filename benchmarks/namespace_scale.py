@@ -0,0 +1,160 @@
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import click
+from rich.console import Console
+from rich.table import Table
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.results import print_run, save_results, summarize_latencies
+from node_common.namespace import Namespace
+
+console = Console()
+
+FILE_CONTENTS = b"x" * 64
+LIST_PAGE = 1000
+
+def populate_flat(root: str, count: int) -> List[str]:
+    names = [f"file-{i:07d}.log" for i in range(count)]
+    for name in names:
+        with open(os.path.join(root, name), "wb") as f:
+            f.write(FILE_CONTENTS)
+    return names
+
+def time_each(fn: Callable[[str], object], names: List[str]) -> Dict:
+    latencies = []
+    errors = 0
+    start = time.perf_counter()
+    for name in names:
+        t = time.perf_counter()
+        try:
+            fn(name)
+        except OSError:
+            errors += 1
+            continue
+        latencies.append((time.perf_counter() - t) * 1000)
+    return summarize_latencies(latencies, 0, errors, time.perf_counter() - start)
+
+def time_repeated(fn: Callable[[], object], repeats: int) -> Dict:
+    return time_each(lambda _: fn(), [""] * repeats)
+
+def flat_list(root: str):
+    # What GET /files did before the sharded layout
+    return [(p.name, p.stat().st_size, p.stat().st_mtime) for p in Path(root).glob("*") if p.is_file()]
+
+def flat_create(root: str, name: str):
+    with open(os.path.join(root, name), "wb") as f:
+        f.write(FILE_CONTENTS)
+
+def sharded_create(namespace: Namespace, name: str):
+    tmp_path = namespace.temp_file()
+    with open(tmp_path, "wb") as f:
+        f.write(FILE_CONTENTS)
+    namespace.commit(name, tmp_path)
+
+def sharded_lookup(namespace: Namespace, name: str):
+    try:
+        namespace.locate(name)
+    except FileNotFoundError:
+        pass
+
+def measure(scratch: str, count: int, samples: int, list_repeats: int) -> Dict:
+    root = os.path.join(scratch, f"storage-{count}")
+    os.makedirs(root)
+    try:
+        console.print(f"Creating {count:,} files in a flat directory...")
+        names = populate_flat(root, count)
+        sample = random.sample(names, min(samples, count))
+        missing = [f"missing-{i}.log" for i in range(samples)]
+        created = [f"new-{i}.log" for i in range(samples)]
+
+        flat = {
+            "lookup": time_each(lambda name: os.path.isfile(os.path.join(root, name)), sample),
+            "lookup missing": time_each(lambda name: os.path.isfile(os.path.join(root, name)), missing),
+            "create": time_each(lambda name: flat_create(root, name), created),
+            "delete": time_each(lambda name: os.remove(os.path.join(root, name)), created),
+            "list all": time_repeated(lambda: flat_list(root), list_repeats)
+        }
+
+        console.print(f"Migrating {count:,} files into shards...")
+        namespace = Namespace(root)
+        start = time.perf_counter()
+        namespace.index_legacy()
+        while namespace.migrate_batch():
+            pass
+        migration_s = time.perf_counter() - start
+
+        sharded = {
+            "lookup": time_each(lambda name: sharded_lookup(namespace, name), sample),
+            "lookup missing": time_each(lambda name: sharded_lookup(namespace, name), missing),
+            "create": time_each(lambda name: sharded_create(namespace, name), created),
+            "delete": time_each(namespace.remove, created),
+            "list page": time_repeated(lambda: namespace.list("", limit=LIST_PAGE), list_repeats),
+            "list all": time_repeated(lambda: namespace.list(""), list_repeats)
+        }
+        return {
+            "files": count,
+            "migration_s": migration_s,
+            "migration_files_per_s": count / migration_s if migration_s else 0.0,
+            "flat": flat,
+            "sharded": sharded
+        }
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+def print_summary(results: List[Dict]):
+    table = Table(title="Flat vs sharded (p50 / p99 ms)")
+    table.add_column("Files", justify="right")
+    table.add_column("Operation")
+    table.add_column("Flat", justify="right")
+    table.add_column("Sharded", justify="right")
+    for result in results:
+        for op in ("lookup", "lookup missing", "create", "delete", "list page", "list all"):
+            cells = []
+            for layout in ("flat", "sharded"):
+                stats = result[layout].get(op)
+                cells.append(f"{stats['p50_ms']:.3f} / {stats['p99_ms']:.3f}" if stats else "-")
+            table.add_row(f"{result['files']:,}", op, *cells)
+        table.add_row(f"{result['files']:,}", "migration",
+                      f"{result['migration_s']:.1f}s", f"{result['migration_files_per_s']:,.0f} files/s")
+    console.print(table)
+
+@click.command()
+@click.option('--counts', default="10000,100000", show_default=True,
+              help='Comma-separated file counts to measure at, e.g. 10000,100000,1000000')
+@click.option('--samples', default=2000, help='Operations timed per measurement')
+@click.option('--list-repeats', default=3, help='Times each listing is repeated')
+@click.option('--path', default=None, type=click.Path(file_okay=False),
+              help='Scratch directory (a temporary one by default); put it on the file system under test')
+@click.option('--seed', default=0, help='Random seed for the sampled names')
+@click.option('--save', default=None, type=click.Path(dir_okay=False), help='Write the results to a JSON file')
+def main(counts, samples, list_repeats, path, seed, save):
+    """Lookup, create, delete and listing latency of the flat and sharded storage layouts"""
+    random.seed(seed)
+    scratch = path or tempfile.mkdtemp(prefix="ontap-namespace-")
+    os.makedirs(scratch, exist_ok=True)
+    results = []
+    try:
+        for count in (int(c) for c in counts.split(",")):
+            result = measure(scratch, count, samples, list_repeats)
+            results.append(result)
+            for layout in ("flat", "sharded"):
+                print_run(f"{layout.capitalize()} layout, {count:,} files", result[layout])
+    finally:
+        if path is None:
+            shutil.rmtree(scratch, ignore_errors=True)
+    print_summary(results)
+    if save:
+        save_results(save, {"benchmark": "namespace_scale", "samples": samples, "results": results})
+        console.print(f"[green]Results saved to {save}[/green]")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+import json
+import os
+import sys
+from typing import Dict, List, Tuple
+
+from rich.console import Console
+from rich.table import Table
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stats import percentile
+
+console = Console()
+
+# Metrics where a lower value is better; everything else is a throughput
+LATENCY_METRICS = ("p50_ms", "p90_ms", "p99_ms")
+THROUGHPUT_METRICS = ("ops_per_s", "mb_per_s")
+
+def summarize_latencies(latencies_ms: List[float], byte_count: int, errors: int, elapsed_s: float) -> Dict:
+    """Throughput and latency percentiles for one set of operations."""
+    ordered = sorted(latencies_ms)
+    return {
+        "count": len(ordered),
+        "errors": errors,
+        "ops_per_s": len(ordered) / elapsed_s if elapsed_s else 0.0,
+        "mb_per_s": byte_count / (1024 ** 2) / elapsed_s if elapsed_s else 0.0,
+        "p50_ms": percentile(ordered, 50),
+        "p90_ms": percentile(ordered, 90),
+        "p99_ms": percentile(ordered, 99),
+        "max_ms": ordered[-1] if ordered else 0.0
+    }
+
+def save_results(path: str, results: Dict):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+def load_results(path: str) -> Dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def print_run(title: str, operations: Dict[str, Dict]):
+    table = Table(title=title)
+    for column in ("Operation", "Ops", "Errors", "Ops/s", "MB/s", "p50 ms", "p90 ms", "p99 ms", "Max ms"):
+        table.add_column(column)
+    for op, stats in operations.items():
+        if not stats["count"] and not stats["errors"]:
+            continue
+        table.add_row(
+            op, str(stats["count"]), str(stats["errors"]),
+            f"{stats['ops_per_s']:.1f}", f"{stats['mb_per_s']:.2f}",
+            f"{stats['p50_ms']:.2f}", f"{stats['p90_ms']:.2f}", f"{stats['p99_ms']:.2f}", f"{stats['max_ms']:.2f}"
+        )
+    console.print(table)
+
+def compare_runs(baseline: Dict, current: Dict, threshold: float) -> List[Tuple[str, str, str, float, float, float, bool]]:
+    """Compare two result files run by run and operation by operation.
+
+    Runs are matched on their ``label``. A metric regresses when throughput
+    drops, or latency rises, by more than ``threshold`` (a fraction).
+    Returns rows of (run, operation, metric, baseline, current, change, regressed).
+    """
+    baseline_runs = {run["label"]: run for run in baseline["runs"]}
+    rows = []
+    for run in current["runs"]:
+        base_run = baseline_runs.get(run["label"])
+        if base_run is None:
+            continue
+        for op, stats in run["operations"].items():
+            base_stats = base_run["operations"].get(op)
+            if not base_stats or not base_stats["count"] or not stats["count"]:
+                continue
+            for metric in THROUGHPUT_METRICS + LATENCY_METRICS:
+                old, new = base_stats[metric], stats[metric]
+                if not old:
+                    continue
+                change = (new - old) / old
+                regressed = change > threshold if metric in LATENCY_METRICS else change < -threshold
+                rows.append((run["label"], op, metric, old, new, change, regressed))
+    return rows
+
+def print_comparison(rows, threshold: float) -> bool:
+    """Print a comparison table and return True if nothing regressed."""
+    table = Table(title=f"Comparison against baseline (threshold {threshold:.0%})")
+    for column in ("Run", "Operation", "Metric", "Baseline", "Current", "Change", ""):
+        table.add_column(column)
+    regressions = 0
+    for label, op, metric, old, new, change, regressed in rows:
+        regressions += regressed
+        table.add_row(
+            label, op, metric, f"{old:.2f}", f"{new:.2f}", f"{change:+.1%}",
+            "[red]REGRESSION[/red]" if regressed else ""
+        )
+    console.print(table)
+    if regressions:
+        console.print(f"[red]{regressions} metric(s) regressed[/red]")
+    else:
+        console.print("[green]No regressions[/green]")
+    return regressions == 0
@@ -0,0 +1,96 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import psutil
+import requests
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class ServerProcess:
+    """Run a simulator component in the background for the length of a benchmark."""
+
+    def __init__(self, command: List[str], health_url: str, env: Optional[Dict[str, str]] = None):
+        self.command = command
+        self.health_url = health_url
+        self.env = dict(os.environ, **(env or {}))
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            self.command,
+            cwd=ROOT_PATH,
+            env=self.env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        self.wait_until_ready()
+        return self
+
+    def wait_until_ready(self, timeout: float = 30.0):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {self.process.returncode}: {' '.join(self.command)}")
+            try:
+                if requests.get(self.health_url, timeout=1).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"Server did not become ready: {self.health_url}")
+
+    def __exit__(self, *exc_info):
+        # uvicorn workers are children of the supervisor process
+        try:
+            parent = psutil.Process(self.process.pid)
+            children = parent.children(recursive=True)
+            parent.terminate()
+            gone, alive = psutil.wait_procs([parent] + children, timeout=5)
+            for p in alive:
+                p.kill()
+        except psutil.NoSuchProcess:
+            pass
+
+def node_server(port: int, workers: int, scratch_path: str, node_dir: str = "node_a") -> ServerProcess:
+    """A node under uvicorn with scratch storage and fencing disabled.
+
+    Workers share node state through a file in the scratch directory.
+    """
+    storage_path = os.path.join(scratch_path, "storage")
+    command = [
+        sys.executable, "-m", "uvicorn", "node:app",
+        "--app-dir", os.path.join(ROOT_PATH, node_dir),
+        "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(workers),
+        "--log-level", "warning"
+    ]
+    env = {
+        "ONTAP_STORAGE_PATH": storage_path,
+        "ONTAP_MEDIATOR_URL": "",
+        "ONTAP_NODE_STATE": os.path.join(scratch_path, "node_state.mmap"),
+        "ONTAP_UPLOAD_PATH": os.path.join(scratch_path, "uploads")
+    }
+    return ServerProcess(command, f"http://127.0.0.1:{port}/health", env)
+
+FILEAPP_SCRIPTS = {
+    "flask": "app.py",
+    "async": "asgi_app.py"
+}
+
+def fileapp_server(mode: str, port: int, node_url: str, workers: int = 1) -> ServerProcess:
+    """The web file app in one of its serving modes, pointed at a single node."""
+    command = [sys.executable, os.path.join(ROOT_PATH, "fileapp", FILEAPP_SCRIPTS[mode])]
+    env = {
+        "ONTAP_FILEAPP_PORT": str(port),
+        "ONTAP_FILEAPP_WORKERS": str(workers),
+        "ONTAP_NODE_A_URL": node_url,
+        "ONTAP_NODE_B_URL": node_url
+    }
+    return ServerProcess(command, f"http://127.0.0.1:{port}/", env)
+
+def scratch_dir() -> tempfile.TemporaryDirectory:
+    return tempfile.TemporaryDirectory(prefix="ontap-bench-")
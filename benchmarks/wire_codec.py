@@ -0,0 +1,153 @@
+import json
+import os
+import sys
+import timeit
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import click
+from fastapi.encoders import jsonable_encoder
+from rich.console import Console
+from rich.table import Table
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.results import save_results
+from models import LogicalInterface, Node, NVRAMEntry, Volume
+from wire_format import (AckRecord, HealthRecord, NodeRecord, NVRAMSyncRecord, StatusRecord,
+                         decode, encode, msgpack)
+
+console = Console()
+
+FENCING_STATUS = {"enabled": True, "epoch": 7, "owns_storage": True, "lease_remaining_s": 1.4}
+
+def render_json(content) -> bytes:
+    """What FastAPI's JSONResponse sends for an endpoint's return value."""
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+
+def sample_node(nvram_entries: int) -> Node:
+    now = datetime.now()
+    return Node(
+        name="node-a",
+        role="primary",
+        partner_node="node-b",
+        volumes=[Volume(name="vol1", size_gb=100, used_gb=20.5, state="online", owner_node="node-a",
+                        last_sync=now)],
+        lifs=[LogicalInterface(name="lif1", ip_address="192.168.1.10", current_node="node-a",
+                               home_node="node-a", protocol="nfs", port=2049)],
+        nvram_log=[
+            NVRAMEntry(timestamp=now, operation="write", sequence_no=i,
+                       data={"filename": f"file_{i:06d}.dat", "offset": i * 4096, "length": 4096})
+            for i in range(nvram_entries)
+        ],
+        last_heartbeat=now
+    )
+
+def build_cases(nvram_entries: int) -> List[Dict]:
+    """Each message with the work either side does for it in the JSON and wire format paths.
+
+    Encoding starts from the node's models, as the endpoints do. Decoding
+    ends with what the receiver works with: parsed JSON or a record for
+    replies, and a node model for NVRAM entries sent to the partner
+    (validated from JSON, constructed from the wire format).
+    """
+    node = sample_node(nvram_entries)
+    entry = node.nvram_log[0]
+    now = datetime.now()
+    return [
+        {
+            "message": "health",
+            "json_encode": lambda: render_json({"status": node.status, "last_heartbeat": node.last_heartbeat,
+                                                "role": node.role}),
+            "json_decode": json.loads,
+            "wire_encode": lambda: encode(HealthRecord(node.status, node.last_heartbeat, node.role)),
+            "wire_decode": decode
+        },
+        {
+            "message": f"status ({nvram_entries} NVRAM entries)",
+            "json_encode": lambda: render_json({
+                "node": node.dict(),
+                "volumes": [vol.dict() for vol in node.volumes],
+                "lifs": [lif.dict() for lif in node.lifs],
+                "nvram_entries": len(node.nvram_log),
+                "fencing": FENCING_STATUS
+            }),
+            "json_decode": json.loads,
+            "wire_encode": lambda: encode(StatusRecord(NodeRecord.from_model(node), len(node.nvram_log),
+                                                       FENCING_STATUS)),
+            "wire_decode": decode
+        },
+        {
+            "message": "nvram sync",
+            "json_encode": lambda: render_json(entry),
+            "json_decode": NVRAMEntry.parse_raw,
+            "wire_encode": lambda: encode(NVRAMSyncRecord.from_model(entry)),
+            "wire_decode": lambda body: decode(body).to_model()
+        },
+        {
+            "message": "takeover ack",
+            "json_encode": lambda: render_json({"message": "Takeover initiated", "timestamp": now}),
+            "json_decode": json.loads,
+            "wire_encode": lambda: encode(AckRecord("Takeover initiated", now)),
+            "wire_decode": decode
+        }
+    ]
+
+def ops_per_second(fn: Callable, repeat: int) -> float:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return number / min(timer.repeat(repeat=repeat, number=number))
+
+def measure(case: Dict, repeat: int) -> List[Dict]:
+    rows = []
+    for fmt in ("json", "wire"):
+        encode_fn, decode_fn = case[f"{fmt}_encode"], case[f"{fmt}_decode"]
+        body = encode_fn()
+        rows.append({
+            "message": case["message"],
+            "format": fmt,
+            "bytes": len(body),
+            "encode_ops_per_s": ops_per_second(encode_fn, repeat),
+            "decode_ops_per_s": ops_per_second(lambda: decode_fn(body), repeat)
+        })
+    return rows
+
+def print_results(rows: List[Dict]):
+    table = Table(title=f"Control-plane message encoding (msgpack {'installed' if msgpack else 'not installed'})")
+    table.add_column("Message")
+    table.add_column("Format")
+    table.add_column("Bytes", justify="right")
+    table.add_column("Encode ops/s", justify="right")
+    table.add_column("Decode ops/s", justify="right")
+    table.add_column("vs JSON (size / enc / dec)", justify="right")
+    json_rows = {row["message"]: row for row in rows if row["format"] == "json"}
+    for row in rows:
+        baseline = json_rows[row["message"]]
+        relative = "" if row is baseline else (
+            f"{row['bytes'] / baseline['bytes']:.2f}x / "
+            f"{row['encode_ops_per_s'] / baseline['encode_ops_per_s']:.1f}x / "
+            f"{row['decode_ops_per_s'] / baseline['decode_ops_per_s']:.1f}x"
+        )
+        table.add_row(row["message"], row["format"], str(row["bytes"]), f"{row['encode_ops_per_s']:,.0f}",
+                      f"{row['decode_ops_per_s']:,.0f}", relative)
+    console.print(table)
+
+@click.command()
+@click.option('--nvram-entries', default=100, help='NVRAM log length of the node in the status message')
+@click.option('--repeat', default=5, help='Timing repeats per measurement; the best is reported')
+@click.option('--save', default=None, type=click.Path(dir_okay=False), help='Write the results to a JSON file')
+def main(nvram_entries, repeat, save):
+    """Compare JSON and the binary wire format for control-plane messages"""
+    rows = []
+    for case in build_cases(nvram_entries):
+        rows.extend(measure(case, repeat))
+    print_results(rows)
+    if save:
+        save_results(save, {"benchmark": "wire_format", "nvram_entries": nvram_entries,
+                            "msgpack": msgpack is not None, "results": rows})
+        console.print(f"[green]Results saved to {save}[/green]")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+import asyncio
+import os
+import random
+import time
+from typing import Dict, List
+
+import aiohttp
+from pydantic import BaseModel, validator
+
+OPERATIONS = ("read", "write", "list", "delete")
+
+UNITS = {"b": 1, "kib": 1024, "kb": 1024, "mib": 1024 ** 2, "mb": 1024 ** 2, "gib": 1024 ** 3, "gb": 1024 ** 3}
+
+def parse_size(text: str) -> int:
+    """Parse sizes like ``4KiB`` or ``1MB`` into bytes."""
+    text = text.strip().lower()
+    for unit in sorted(UNITS, key=len, reverse=True):
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * UNITS[unit])
+    return int(text)
+
+def parse_weights(text: str) -> Dict[str, float]:
+    """Parse ``key:weight,key:weight`` into a dict."""
+    weights = {}
+    for part in text.split(","):
+        key, _, weight = part.partition(":")
+        weights[key.strip()] = float(weight) if weight else 1.0
+    return weights
+
+class Workload(BaseModel):
+    concurrency: int = 16
+    duration_s: float = 10.0
+    warmup_files: int = 100
+    # File size in bytes -> relative weight
+    sizes: Dict[int, float] = {4096: 0.6, 65536: 0.3, 1048576: 0.1}
+    # Operation -> relative weight
+    mix: Dict[str, float] = {"read": 0.7, "write": 0.2, "list": 0.05, "delete": 0.05}
+    seed: int = 0
+
+    @validator("mix")
+    def known_operations(cls, mix):
+        unknown = set(mix) - set(OPERATIONS)
+        if unknown:
+            raise ValueError(f"Unknown operations: {', '.join(sorted(unknown))}")
+        return mix
+
+class OpStats:
+    """Latencies and byte counts for one operation type."""
+    __slots__ = ("latencies_ms", "bytes", "errors")
+
+    def __init__(self):
+        self.latencies_ms: List[float] = []
+        self.bytes = 0
+        self.errors = 0
+
+class LoadGenerator:
+    """Async closed-loop load generator for a node's file API.
+
+    Each of ``concurrency`` workers issues one request at a time, picking the
+    operation and file size from the workload's weighted distributions.
+    Payloads are generated once per size and reused so the client does not
+    dominate the measurement.
+    """
+
+    def __init__(self, base_url: str, workload: Workload, prefix: str = "bench"):
+        self.base_url = base_url
+        self.workload = workload
+        self.prefix = prefix
+        self.rng = random.Random(workload.seed)
+        self.payloads = {size: os.urandom(size) for size in workload.sizes}
+        self.files: List[str] = []
+        self.stats: Dict[str, OpStats] = {op: OpStats() for op in OPERATIONS}
+        self._counter = 0
+
+    def _next_name(self) -> str:
+        self._counter += 1
+        return f"{self.prefix}-{self._counter:08d}"
+
+    def _pick_size(self) -> int:
+        sizes = list(self.workload.sizes)
+        return self.rng.choices(sizes, weights=[self.workload.sizes[s] for s in sizes])[0]
+
+    def _pick_operation(self) -> str:
+        ops = list(self.workload.mix)
+        op = self.rng.choices(ops, weights=[self.workload.mix[o] for o in ops])[0]
+        # Keep the working set from draining
+        if op in ("read", "delete") and not self.files:
+            return "write"
+        return op
+
+    async def _write(self, session: aiohttp.ClientSession) -> int:
+        name = self._next_name()
+        payload = self.payloads[self._pick_size()]
+        form = aiohttp.FormData()
+        form.add_field("file", payload, filename=name, content_type="application/octet-stream")
+        async with session.post(f"{self.base_url}/files/upload", data=form) as response:
+            await response.read()
+            response.raise_for_status()
+        self.files.append(name)
+        return len(payload)
+
+    async def _read(self, session: aiohttp.ClientSession) -> int:
+        name = self.rng.choice(self.files)
+        async with session.get(f"{self.base_url}/files/{name}") as response:
+            body = await response.read()
+            if response.status == 404:
+                return 0  # Deleted by another worker in the meantime
+            response.raise_for_status()
+        return len(body)
+
+    async def _list(self, session: aiohttp.ClientSession) -> int:
+        async with session.get(f"{self.base_url}/files") as response:
+            body = await response.read()
+            response.raise_for_status()
+        return len(body)
+
+    async def _remove(self, session: aiohttp.ClientSession, name: str):
+        async with session.delete(f"{self.base_url}/files/{name}") as response:
+            await response.read()
+            if response.status != 404:
+                response.raise_for_status()
+
+    async def _delete(self, session: aiohttp.ClientSession) -> int:
+        await self._remove(session, self.files.pop(self.rng.randrange(len(self.files))))
+        return 0
+
+    async def _run_op(self, session: aiohttp.ClientSession, op: str):
+        handler = getattr(self, f"_{op}")
+        stats = self.stats[op]
+        start = time.perf_counter()
+        try:
+            # Await before touching the counter so concurrent workers don't lose updates
+            transferred = await handler(session)
+            stats.bytes += transferred
+            stats.latencies_ms.append((time.perf_counter() - start) * 1000)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            stats.errors += 1
+
+    async def warm_up(self, session: aiohttp.ClientSession):
+        """Populate the working set before measuring."""
+        for _ in range(self.workload.warmup_files):
+            await self._write(session)
+
+    async def _worker(self, session: aiohttp.ClientSession, deadline: float):
+        while time.perf_counter() < deadline:
+            await self._run_op(session, self._pick_operation())
+
+    async def run(self) -> float:
+        """Run the workload and return the measured wall-clock seconds."""
+        connector = aiohttp.TCPConnector(limit=self.workload.concurrency)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            await self.warm_up(session)
+            self.stats = {op: OpStats() for op in OPERATIONS}
+            start = time.perf_counter()
+            deadline = start + self.workload.duration_s
+            await asyncio.gather(*(self._worker(session, deadline) for _ in range(self.workload.concurrency)))
+            elapsed = time.perf_counter() - start
+
+            # Leave the target storage as we found it
+            for name in self.files:
+                try:
+                    await self._remove(session, name)
+                except aiohttp.ClientError:
+                    pass
+            self.files = []
+        return elapsed
+
+class FileAppLoadGenerator(LoadGenerator):
+    """The same workload driven through the web file app's form routes.
+
+    Redirects back to the file list are not followed, so each operation
+    costs one request to the file app.
+    """
+
+    async def _write(self, session: aiohttp.ClientSession) -> int:
+        name = self._next_name()
+        payload = self.payloads[self._pick_size()]
+        form = aiohttp.FormData()
+        form.add_field("file", payload, filename=name, content_type="application/octet-stream")
+        async with session.post(f"{self.base_url}/upload", data=form, allow_redirects=False) as response:
+            await response.read()
+            if response.status != 302:
+                raise aiohttp.ClientResponseError(response.request_info, (), status=response.status)
+        self.files.append(name)
+        return len(payload)
+
+    async def _read(self, session: aiohttp.ClientSession) -> int:
+        name = self.rng.choice(self.files)
+        async with session.get(f"{self.base_url}/download/{name}") as response:
+            body = await response.read()
+            response.raise_for_status()
+        return len(body)
+
+    async def _list(self, session: aiohttp.ClientSession) -> int:
+        async with session.get(f"{self.base_url}/") as response:
+            body = await response.read()
+            response.raise_for_status()
+        return len(body)
+
+    async def _remove(self, session: aiohttp.ClientSession, name: str):
+        async with session.get(f"{self.base_url}/delete/{name}", allow_redirects=False) as response:
+            await response.read()
@@ -0,0 +1,392 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import time
+from enum import Enum
+from typing import Dict, List, Optional
+
+import aiohttp
+import click
+import psutil
+from pydantic import BaseModel
+from rich.console import Console
+from rich.table import Table
+
+# Add parent directory to path for imports
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_PATH)
+
+from controller.event_store import EVENT_LOG_PATH, FailoverRecord
+from chaos.proxy import PartitionProxy
+from stats import percentile
+
+console = Console()
+logger = logging.getLogger(__name__)
+
+NODES = {
+    "a": {"name": "node-a", "script": "node_a/node.py", "port": 8001, "proxy_port": 9001},
+    "b": {"name": "node-b", "script": "node_b/node.py", "port": 8002, "proxy_port": 9002}
+}
+
+RESULTS_PATH = os.path.join(ROOT_PATH, "data", "chaos", "results.jsonl")
+
+class FaultType(str, Enum):
+    CRASH = "crash"
+    HANG = "hang"
+    SLOW_DISK = "slow_disk"
+    PARTITION = "partition"
+    FLAP = "flap"
+
+# Slow disks only delay file I/O, so the controller is not expected to notice
+DETECTED_BY_DEFAULT = {FaultType.CRASH, FaultType.HANG, FaultType.PARTITION, FaultType.FLAP}
+
+class FaultSpec(BaseModel):
+    type: FaultType
+    node: str
+    weight: float = 1.0
+    duration_s: float = 2.0
+    delay_ms: float = 200.0  # slow_disk
+    cycles: int = 3  # flap
+    period_s: float = 1.0  # flap
+    expect_detection: Optional[bool] = None
+
+    @property
+    def detection_expected(self) -> bool:
+        if self.expect_detection is not None:
+            return self.expect_detection
+        return self.type in DETECTED_BY_DEFAULT
+
+class LatencyTargets(BaseModel):
+    detection_p99_ms: Optional[float] = None
+    recovery_p99_ms: Optional[float] = None
+
+class Scenario(BaseModel):
+    name: str
+    seed: int = 0
+    duration_s: float = 3600
+    max_injections: Optional[int] = None
+    interval_s: float = 1.0
+    jitter_s: float = 0.5
+    heartbeat_interval_s: float = 0.5
+    detection_timeout_s: float = 10.0
+    recovery_timeout_s: float = 30.0
+    faults: List[FaultSpec]
+    targets: LatencyTargets = LatencyTargets()
+
+def load_scenario(path: str) -> Scenario:
+    with open(path, "r", encoding="utf-8") as f:
+        scenario = Scenario(**json.load(f))
+    for spec in scenario.faults:
+        if spec.node not in NODES:
+            raise click.BadParameter(f"Unknown node '{spec.node}' in scenario")
+    return scenario
+
+class ChaosEngine:
+    def __init__(self, scenario: Scenario, use_proxy: bool, manage_controller: bool, output_path: str):
+        self.scenario = scenario
+        self.use_proxy = use_proxy
+        self.manage_controller = manage_controller
+        self.output_path = output_path
+        self.rng = random.Random(scenario.seed)
+        self.proxies: Dict[str, PartitionProxy] = {}
+        self.controller_process = None
+        # Nodes restarted after a crash, stopped when the run ends
+        self.respawned: Dict[str, subprocess.Popen] = {}
+        self.results: List[Dict] = []
+        self._events: List[FailoverRecord] = []
+        self._log_offset = 0
+
+    def node_url(self, key: str) -> str:
+        return f"http://localhost:{NODES[key]['port']}"
+
+    def probe_url(self, key: str) -> str:
+        """URL the controller uses to reach a node."""
+        return self.proxies[key].url if self.use_proxy else self.node_url(key)
+
+    async def setup(self):
+        if any(spec.type in (FaultType.PARTITION, FaultType.FLAP) for spec in self.scenario.faults) and not self.use_proxy:
+            raise click.UsageError("partition and flap faults require --proxy")
+
+        if self.use_proxy:
+            for key, info in NODES.items():
+                proxy = PartitionProxy(info["proxy_port"], "localhost", info["port"])
+                await proxy.start()
+                self.proxies[key] = proxy
+
+        if self.manage_controller:
+            env = dict(os.environ)
+            env["ONTAP_NODE_A_URL"] = self.probe_url("a")
+            env["ONTAP_NODE_B_URL"] = self.probe_url("b")
+            env["ONTAP_HEARTBEAT_INTERVAL"] = str(self.scenario.heartbeat_interval_s)
+            self.controller_process = subprocess.Popen(
+                [sys.executable, os.path.join(ROOT_PATH, "controller", "monitor.py")],
+                env=env,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+            console.print("[green]Started HA Controller[/green]")
+        elif self.use_proxy:
+            console.print("[yellow]Controller must be started with ONTAP_NODE_A_URL/ONTAP_NODE_B_URL "
+                          "pointing at the proxies for partitions to take effect[/yellow]")
+
+        # Only events recorded after this point count towards detection
+        if os.path.exists(EVENT_LOG_PATH):
+            self._log_offset = os.path.getsize(EVENT_LOG_PATH)
+
+    async def teardown(self):
+        for proxy in self.proxies.values():
+            await proxy.stop()
+        for process in [self.controller_process, *self.respawned.values()]:
+            if process and process.poll() is None:
+                process.terminate()
+                try:
+                    process.wait(5)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+    def _poll_event_log(self):
+        if not os.path.exists(EVENT_LOG_PATH):
+            return
+        with open(EVENT_LOG_PATH, "r", encoding="utf-8") as log:
+            log.seek(self._log_offset)
+            for line in log:
+                if not line.endswith("\n"):
+                    break  # Partially written, pick it up next time
+                self._log_offset += len(line.encode("utf-8"))
+                if line.strip():
+                    self._events.append(FailoverRecord(*json.loads(line)))
+
+    async def wait_for_detection(self, node_name: str, injected_at: float) -> Optional[FailoverRecord]:
+        deadline = time.time() + self.scenario.detection_timeout_s
+        while time.time() < deadline:
+            self._poll_event_log()
+            for record in self._events:
+                if record.failed_node == node_name and record.timestamp >= injected_at:
+                    self._events.remove(record)
+                    return record
+            await asyncio.sleep(0.05)
+        return None
+
+    async def wait_for_recovery(self, session: aiohttp.ClientSession, url: str) -> bool:
+        deadline = time.time() + self.scenario.recovery_timeout_s
+        while time.time() < deadline:
+            try:
+                async with session.get(f"{url}/health", timeout=aiohttp.ClientTimeout(total=1)) as response:
+                    if response.status == 200:
+                        return True
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                pass
+            await asyncio.sleep(0.05)
+        return False
+
+    async def _status(self, session: aiohttp.ClientSession, key: str) -> Optional[Dict]:
+        try:
+            async with session.get(f"{self.node_url(key)}/status", timeout=aiohttp.ClientTimeout(total=2)) as response:
+                if response.status == 200:
+                    return await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            pass
+        return None
+
+    async def _post(self, session: aiohttp.ClientSession, key: str, path: str):
+        try:
+            async with session.post(f"{self.node_url(key)}{path}", timeout=aiohttp.ClientTimeout(total=15)):
+                pass
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"{path} on {NODES[key]['name']} failed: {e}")
+
+    async def restore_pair(self, session: aiohttp.ClientSession) -> bool:
+        """Give back a taken-over node so the next injection starts from a healthy pair.
+
+        Healthy means both nodes are up and serving their own LIFs, with
+        node A owning the shared storage. A node that was hung or restarted
+        while node B served for it is failed over and given back, which is
+        how it reacquires the storage.
+        """
+        deadline = time.time() + self.scenario.recovery_timeout_s
+        while time.time() < deadline:
+            a, b = await self._status(session, "a"), await self._status(session, "b")
+            if a is not None and b is not None:
+                a_status, b_status = a["node"]["status"], b["node"]["status"]
+                if b_status == "takeover":
+                    await self._post(session, "b", "/prepare-giveback")
+                elif a_status == "failed":
+                    await self._post(session, "a", "/giveback")
+                elif a_status == "healthy" and b_status == "healthy":
+                    if a["fencing"]["owns_storage"]:
+                        return True
+                    await self._post(session, "a", "/failover")
+                    await self._post(session, "a", "/giveback")
+            await asyncio.sleep(0.2)
+        return False
+
+    async def crash(self, session: aiohttp.ClientSession, key: str, spec: FaultSpec):
+        async with session.get(f"{self.node_url(key)}/fault") as response:
+            pid = (await response.json())["pid"]
+        psutil.Process(pid).kill()
+        await asyncio.sleep(spec.duration_s)
+        # The replacement runs until the end of the run, when it is stopped
+        self.respawned[key] = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT_PATH, NODES[key]["script"])],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+
+    async def apply_fault(self, session: aiohttp.ClientSession, spec: FaultSpec):
+        """Inject the fault and hold it until it is healed."""
+        key = spec.node
+        if spec.type == FaultType.CRASH:
+            await self.crash(session, key, spec)
+        elif spec.type == FaultType.HANG:
+            async with session.post(f"{self.node_url(key)}/fault/hang", params={"seconds": spec.duration_s}):
+                pass
+            await asyncio.sleep(spec.duration_s)
+        elif spec.type == FaultType.SLOW_DISK:
+            async with session.post(
+                f"{self.node_url(key)}/fault/slow-disk",
+                params={"delay_ms": spec.delay_ms, "seconds": spec.duration_s}
+            ):
+                pass
+            await asyncio.sleep(spec.duration_s)
+        elif spec.type == FaultType.PARTITION:
+            self.proxies[key].partition()
+            await asyncio.sleep(spec.duration_s)
+            self.proxies[key].heal()
+        elif spec.type == FaultType.FLAP:
+            for _ in range(spec.cycles):
+                self.proxies[key].partition()
+                await asyncio.sleep(spec.period_s / 2)
+                self.proxies[key].heal()
+                await asyncio.sleep(spec.period_s / 2)
+
+    async def inject(self, session: aiohttp.ClientSession, spec: FaultSpec) -> Dict:
+        node_name = NODES[spec.node]["name"]
+        injected_at = time.time()
+        detection = asyncio.create_task(self.wait_for_detection(node_name, injected_at))
+
+        error = None
+        try:
+            await self.apply_fault(session, spec)
+        except (aiohttp.ClientError, psutil.Error) as e:
+            error = str(e)
+        healed_at = time.time()
+
+        recovered = await self.wait_for_recovery(session, self.probe_url(spec.node))
+        recovered_at = time.time()
+        record = await detection
+
+        return {
+            "timestamp": injected_at,
+            "fault": spec.type.value,
+            "node": node_name,
+            "detection_expected": spec.detection_expected,
+            "detected": record is not None,
+            "detection_ms": (record.timestamp - injected_at) * 1000 if record else None,
+            "takeover_ms": record.duration_ms if record else None,
+            "recovered": recovered,
+            "recovery_ms": (recovered_at - healed_at) * 1000 if recovered else None,
+            "error": error
+        }
+
+    async def run(self):
+        await self.setup()
+        os.makedirs(os.path.dirname(os.path.abspath(self.output_path)), exist_ok=True)
+        try:
+            with open(self.output_path, "a", encoding="utf-8") as output:
+                async with aiohttp.ClientSession() as session:
+                    await self._run_injections(session, output)
+        finally:
+            await self.teardown()
+
+    async def _run_injections(self, session: aiohttp.ClientSession, output):
+        weights = [spec.weight for spec in self.scenario.faults]
+        deadline = time.time() + self.scenario.duration_s
+        while time.time() < deadline:
+            if self.scenario.max_injections is not None and len(self.results) >= self.scenario.max_injections:
+                break
+            spec = self.rng.choices(self.scenario.faults, weights=weights)[0]
+            if not await self.restore_pair(session):
+                console.print("[red]Could not restore a healthy pair; stopping the run[/red]")
+                break
+            result = await self.inject(session, spec)
+            result["scenario"] = self.scenario.name
+            self.results.append(result)
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+            console.print(
+                f"[{len(self.results)}] {result['fault']} {result['node']}: "
+                f"detection={result['detection_ms']} recovery={result['recovery_ms']}"
+            )
+            await asyncio.sleep(self.scenario.interval_s + self.rng.uniform(0, self.scenario.jitter_s))
+
+    def summarize(self) -> bool:
+        """Print per-fault latency stats and return whether all targets were met."""
+        table = Table(title=f"Chaos scenario: {self.scenario.name}")
+        for column in ("Fault", "Injections", "Detected", "Detection p50/p99 ms", "Takeover p50 ms",
+                       "Recovered", "Recovery p50/p99 ms"):
+            table.add_column(column)
+
+        targets = self.scenario.targets
+        met = True
+        for fault in FaultType:
+            results = [r for r in self.results if r["fault"] == fault.value]
+            if not results:
+                continue
+            detections = sorted(r["detection_ms"] for r in results if r["detected"])
+            takeovers = sorted(r["takeover_ms"] for r in results if r["detected"])
+            recoveries = sorted(r["recovery_ms"] for r in results if r["recovered"])
+            expected = [r for r in results if r["detection_expected"]]
+
+            if expected and targets.detection_p99_ms is not None:
+                # Missed detections count as infinitely slow
+                padded = detections + [float("inf")] * (len(expected) - len(detections))
+                met &= percentile(sorted(padded), 99) <= targets.detection_p99_ms
+            if targets.recovery_p99_ms is not None:
+                padded = recoveries + [float("inf")] * (len(results) - len(recoveries))
+                met &= percentile(sorted(padded), 99) <= targets.recovery_p99_ms
+
+            table.add_row(
+                fault.value,
+                str(len(results)),
+                f"{len(detections)}/{len(expected)} expected",
+                f"{percentile(detections, 50):.0f} / {percentile(detections, 99):.0f}",
+                f"{percentile(takeovers, 50):.1f}",
+                f"{len(recoveries)}/{len(results)}",
+                f"{percentile(recoveries, 50):.0f} / {percentile(recoveries, 99):.0f}"
+            )
+
+        console.print(table)
+        if targets.detection_p99_ms is not None or targets.recovery_p99_ms is not None:
+            console.print("[green]Latency targets met[/green]" if met else "[red]Latency targets missed[/red]")
+        return met
+
+@click.command()
+@click.argument('scenario_path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--proxy/--no-proxy', default=True, help='Route controller traffic through partition proxies')
+@click.option('--manage-controller/--no-manage-controller', default=True,
+              help='Start a controller wired to the proxies for the duration of the run')
+@click.option('--output', default=RESULTS_PATH, help='JSON-lines file to append per-injection results to')
+def main(scenario_path, proxy, manage_controller, output):
+    """Run a fault-injection scenario against the HA pair.
+
+    The nodes must already be running (e.g. via main.py). Stop the HA
+    controller started by main.py first when using --manage-controller.
+    Each injection starts from a healthy pair, given back if need be, and
+    nodes restarted after a crash are stopped when the run ends.
+    """
+    logging.basicConfig(level=logging.WARNING)
+    scenario = load_scenario(scenario_path)
+    engine = ChaosEngine(scenario, proxy, manage_controller, output)
+    try:
+        asyncio.run(engine.run())
+    except KeyboardInterrupt:
+        console.print("\n[yellow]Stopping chaos run...[/yellow]")
+    if not engine.summarize():
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
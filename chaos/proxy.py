@@ -0,0 +1,84 @@
+import asyncio
+import logging
+from typing import Set
+
+logger = logging.getLogger(__name__)
+
+class PartitionProxy:
+    """TCP forwarder placed between the controller and a node.
+
+    While partitioned, established connections are cut and new ones are
+    closed as soon as they are accepted, so the controller sees the node as
+    unreachable while the node itself keeps serving direct clients.
+    """
+
+    def __init__(self, listen_port: int, target_host: str, target_port: int, listen_host: str = "localhost"):
+        self.listen_host = listen_host
+        self.listen_port = listen_port
+        self.target_host = target_host
+        self.target_port = target_port
+        self.partitioned = False
+        self._server = None
+        self._writers: Set[asyncio.StreamWriter] = set()
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.listen_host}:{self.listen_port}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_client, self.listen_host, self.listen_port)
+        logger.info(f"Proxy {self.url} -> {self.target_host}:{self.target_port}")
+
+    async def stop(self):
+        self.partition()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def partition(self):
+        """Drop all traffic through the proxy."""
+        self.partitioned = True
+        for writer in list(self._writers):
+            writer.close()
+        self._writers.clear()
+
+    def heal(self):
+        """Resume forwarding."""
+        self.partitioned = False
+
+    async def _handle_client(self, client_reader: asyncio.StreamReader, client_writer: asyncio.StreamWriter):
+        if self.partitioned:
+            client_writer.close()
+            return
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection(self.target_host, self.target_port)
+        except OSError:
+            client_writer.close()
+            return
+
+        self._writers.update((client_writer, upstream_writer))
+        try:
+            await asyncio.gather(
+                self._pipe(client_reader, upstream_writer),
+                self._pipe(upstream_reader, client_writer)
+            )
+        except asyncio.CancelledError:
+            pass  # Proxy shut down while the connection was open
+        finally:
+            for writer in (client_writer, upstream_writer):
+                self._writers.discard(writer)
+                writer.close()
+
+    async def _pipe(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while not self.partitioned:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
@@ -5,6 +5,7 @@ from rich.console import Console
 from rich.table import Table
 from rich.live import Live
 from rich.panel import Panel
+from rich.progress import Progress
 from datetime import datetime
 import time
 import sys
@@ -17,11 +18,21 @@ import psutil
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from client.uploads import UploadFailed, resumable_upload
+from tracing.clients import TracingSession
+from tracing.tracer import Tracer
+from wire_format import WIRE_ACCEPT, decode_body
+
 console = Console()
 simulator_process = None
 CONTROL_URL = "http://localhost:8000"
+CONTROLLER_ADMIN_URL = os.environ.get("ONTAP_CONTROLLER_ADMIN_URL", "http://localhost:8004")
 shutdown_in_progress = False
 
+# Each command is a trace root when ONTAP_TRACING=1
+tracer = Tracer("cli")
+http = TracingSession(tracer)
+
 def kill_proc_tree(pid, include_parent=True):
     """Kill a process tree (including grandchildren) with given pid."""
     try:
@@ -131,9 +142,9 @@ class ONTAPSimulator:
 
     def get_node_status(self, node_url):
         try:
-            response = requests.get(f"{node_url}/status")
-            return response.json()
-        except requests.RequestException:
+            response = http.get(f"{node_url}/status", headers=WIRE_ACCEPT)
+            return decode_body(response.headers.get('Content-Type'), response.content)
+        except (requests.RequestException, ValueError):
             return None
 
     def display_status(self):
@@ -179,10 +190,14 @@ class ONTAPSimulator:
         console.print(table)
 
 @click.group()
-def cli():
+@click.pass_context
+def cli(ctx):
     """ONTAP HA Pair Simulator CLI"""
     # Start simulator when any command is run
     start_simulator()
+    # The monitor traces each refresh on its own instead
+    if ctx.invoked_subcommand != 'monitor':
+        ctx.with_resource(tracer.span(ctx.invoked_subcommand))
 
 @cli.command()
 def status():
@@ -198,7 +213,7 @@ def fail(node):
     node_url = simulator.node_a_url if node == 'a' else simulator.node_b_url
     
     try:
-        response = requests.post(f"{node_url}/failover")
+        response = http.post(f"{node_url}/failover")
         if response.status_code == 200:
             console.print(f"[green]Node {node.upper()} failure simulated successfully[/green]")
         else:
@@ -212,16 +227,552 @@ def giveback(node):
     """Initiate giveback operation"""
     simulator = ONTAPSimulator()
     node_url = simulator.node_a_url if node == 'a' else simulator.node_b_url
+    partner_url = simulator.node_b_url if node == 'a' else simulator.node_a_url
     
     try:
-        response = requests.post(f"{node_url}/giveback")
+        # The partner drains its writes and hands over the log of files it changed
+        response = http.post(f"{partner_url}/prepare-giveback")
+        if response.status_code == 200:
+            console.print(f"[cyan]{response.json()['message']}[/cyan]")
+        elif response.status_code != 400:
+            console.print(f"[yellow]Partner did not prepare for giveback: {response.text}[/yellow]")
+        response = http.post(f"{node_url}/giveback")
         if response.status_code == 200:
             console.print(f"[green]Giveback initiated successfully for Node {node.upper()}[/green]")
+            console.print(response.json()['message'])
         else:
             console.print(f"[red]Failed to initiate giveback: {response.text}[/red]")
     except requests.RequestException as e:
         console.print(f"[red]Error communicating with node: {e}[/red]")
 
+@cli.command()
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--node', type=click.Choice(['a', 'b']), default='a', help='Node to start the upload on')
+@click.option('--chunk-size', default=4, help='Chunk size in MiB')
+@click.option('--volume', default=None, help='Volume whose QoS policy the upload is throttled by')
+@click.option('--folder', default='', help='Folder to upload into, e.g. logs/2024')
+def upload(path, node, chunk_size, volume, folder):
+    """Upload a file in resumable chunks, continuing on the partner after a failover"""
+    simulator = ONTAPSimulator()
+    node_urls = [simulator.node_a_url, simulator.node_b_url]
+    if node == 'b':
+        node_urls.reverse()
+    filename = os.path.basename(path)
+    if folder.strip('/'):
+        filename = f"{folder.strip('/')}/{filename}"
+
+    with Progress(console=console) as progress:
+        task = progress.add_task(f"Uploading {filename}", total=os.path.getsize(path))
+        try:
+            with open(path, 'rb') as f:
+                finished_on = resumable_upload(
+                    node_urls, f, filename,
+                    chunk_size=chunk_size * 1024 * 1024,
+                    on_progress=lambda offset, length: progress.update(task, completed=offset),
+                    session=http,
+                    volume=volume
+                )
+        except UploadFailed as e:
+            console.print(f"[red]{e}[/red]")
+            return
+    console.print(f"[green]Uploaded {filename} via {finished_on}[/green]")
+
+@cli.command('download-archive')
+@click.argument('node', type=click.Choice(['a', 'b']))
+@click.argument('names', nargs=-1)
+@click.option('--prefix', default=None, help='Include files whose names start with this prefix')
+@click.option('--output', '-o', default='files.tar', type=click.Path(dir_okay=False), help='Archive to write')
+def download_archive(node, names, prefix, output):
+    """Download files as a single tar archive (all files if none are named)"""
+    simulator = ONTAPSimulator()
+    node_url = simulator.node_a_url if node == 'a' else simulator.node_b_url
+    params = [('name', name) for name in names]
+    if prefix:
+        params.append(('prefix', prefix))
+
+    try:
+        with http.get(f"{node_url}/bulk/archive", params=params, stream=True) as response:
+            if response.status_code != 200:
+                console.print(f"[red]Failed to download archive: {response.text}[/red]")
+                return
+            size = 0
+            with open(output, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    f.write(chunk)
+                    size += len(chunk)
+        console.print(f"[green]Saved {size / 1024:.1f} KB archive to {output}[/green]")
+    except requests.RequestException as e:
+        console.print(f"[red]Error communicating with node: {e}[/red]")
+
+@cli.command('upload-archive')
+@click.argument('node', type=click.Choice(['a', 'b']))
+@click.argument('archive', type=click.Path(exists=True, dir_okay=False))
+def upload_archive(node, archive):
+    """Upload a tar archive and unpack it into shared storage"""
+    simulator = ONTAPSimulator()
+    node_url = simulator.node_a_url if node == 'a' else simulator.node_b_url
+
+    try:
+        with open(archive, 'rb') as f:
+            response = http.post(f"{node_url}/bulk/archive", data=f,
+                                 headers={'Content-Type': 'application/x-tar'})
+        if response.status_code == 200:
+            result = response.json()
+            console.print(f"[green]Unpacked {len(result['files'])} files ({result['bytes'] / 1024:.1f} KB)[/green]")
+            if result['skipped']:
+                console.print(f"[yellow]Skipped {len(result['skipped'])} non-file entries[/yellow]")
+        else:
+            console.print(f"[red]Failed to upload archive: {response.text}[/red]")
+    except requests.RequestException as e:
+        console.print(f"[red]Error communicating with node: {e}[/red]")
+
+@cli.command('delete-files')
+@click.argument('node', type=click.Choice(['a', 'b']))
+@click.argument('names', nargs=-1)
+@click.option('--prefix', default=None, help='Delete files whose names start with this prefix')
+def delete_files(node, names, prefix):
+    """Delete several files in one request"""
+    if not names and not prefix:
+        console.print("[red]Name at least one file or give --prefix[/red]")
+        return
+    simulator = ONTAPSimulator()
+    node_url = simulator.node_a_url if node == 'a' else simulator.node_b_url
+
+    try:
+        response = http.post(f"{node_url}/bulk/delete", json={'names': list(names), 'prefix': prefix})
+        if response.status_code == 200:
+            result = response.json()
+            console.print(f"[green]Deleted {len(result['deleted'])} files[/green]")
+            if result['missing']:
+                console.print(f"[yellow]Not found: {', '.join(result['missing'])}[/yellow]")
+        else:
+            console.print(f"[red]Failed to delete files: {response.text}[/red]")
+    except requests.RequestException as e:
+        console.print(f"[red]Error communicating with node: {e}[/red]")
+
+@cli.group()
+def qos():
+    """Manage per-volume QoS policy groups"""
+
+def qos_node_url(node):
+    simulator = ONTAPSimulator()
+    return simulator.node_a_url if node == 'a' else simulator.node_b_url
+
+def format_limit(value, unit):
+    return f"{value:g} {unit}" if value else "-"
+
+@qos.command('policies')
+@click.argument('node', type=click.Choice(['a', 'b']))
+def qos_policies(node):
+    """List policy groups and their volumes"""
+    try:
+        response = http.get(f"{qos_node_url(node)}/qos/policies")
+        response.raise_for_status()
+    except requests.RequestException as e:
+        console.print(f"[red]Error communicating with node: {e}[/red]")
+        return
+    table = Table(title=f"QoS policies on Node {node.upper()}")
+    table.add_column("Policy")
+    table.add_column("Max")
+    table.add_column("Min")
+    table.add_column("Volumes")
+    for policy in response.json()['policies']:
+        table.add_row(
+            policy['name'],
+            f"{format_limit(policy['max_iops'], 'IOPS')} / {format_limit(policy['max_mbps'], 'MB/s')}",
+            f"{format_limit(policy['min_iops'], 'IOPS')} / {format_limit(policy['min_mbps'], 'MB/s')}",
+            ", ".join(policy['volumes']) or "-"
+        )
+    console.print(table)
+
+@qos.command('set')
+@click.argument('node', type=click.Choice(['a', 'b']))
+@click.argument('name')
+@click.option('--max-iops', type=int, default=None, help='Operations per second the group may not exceed')
+@click.option('--max-mbps', type=float, default=None, help='MB/s the group may not exceed')
+@click.option('--min-iops', type=int, default=None, help='Operations per second reserved for the group')
+@click.option('--min-mbps', type=float, default=None, help='MB/s reserved for the group')
+def qos_set(node, name, max_iops, max_mbps, min_iops, min_mbps):
+    """Create or replace a policy group"""
+    params = {'max_iops': max_iops, 'max_mbps': max_mbps, 'min_iops': min_iops, 'min_mbps': min_mbps}
+    try:
+        response = http.put(f"{qos_node_url(node)}/qos/policies/{name}",
+                            params={k: v for k, v in params.items() if v is not None})
+        if response.status_code == 200:
+            console.print(f"[green]Policy {name} saved on Node {node.upper()}[/green]")
+        else:
+            console.print(f"[red]Failed to save policy: {response.text}[/red]")
+    except requests.RequestException as e:
+        console.print(f"[red]Error communicating with node: {e}[/red]")
+
+@qos.command('delete')
+@click.argument('node', type=click.Choice(['a', 'b']))
+@click.argument('name')
+def qos_delete(node, name):
+    """Delete a policy group no volume is attached to"""
+    try:
+        response = http.delete(f"{qos_node_url(node)}/qos/policies/{name}")
+        if response.status_code == 200:
+            console.print(f"[green]Policy {name} deleted[/green]")
+        else:
+            console.print(f"[red]Failed to delete policy: {response.text}[/red]")
+    except requests.RequestException as e:
+        console.print(f"[red]Error communicating with node: {e}[/red]")
+
+@qos.command('attach')
+@click.argument('node', type=click.Choice(['a', 'b']))
+@click.argument('volume')
+@click.argument('policy', required=False)
+def qos_attach(node, volume, policy):
+    """Attach a volume to a policy group (detach it if no policy is given)"""
+    try:
+        response = http.put(f"{qos_node_url(node)}/qos/volumes/{volume}",
+                            params={'policy': policy} if policy else None)
+        if response.status_code == 200:
+            console.print(f"[green]{volume} {'attached to ' + policy if policy else 'detached from its policy'}[/green]")
+        else:
+            console.print(f"[red]Failed to update volume: {response.text}[/red]")
+    except requests.RequestException as e:
+        console.print(f"[red]Error communicating with node: {e}[/red]")
+
+@qos.command('stats')
+@click.argument('node', type=click.Choice(['a', 'b']))
+def qos_stats(node):
+    """Show per-policy throughput and latency"""
+    try:
+        response = http.get(f"{qos_node_url(node)}/qos/stats")
+        response.raise_for_status()
+    except requests.RequestException as e:
+        console.print(f"[red]Error communicating with node: {e}[/red]")
+        return
+    stats = response.json()
+    table = Table(title=f"QoS on Node {node.upper()} (last {stats['window_s']:g}s, worker {stats['pid']})")
+    table.add_column("Policy")
+    table.add_column("IOPS", justify="right")
+    table.add_column("MB/s", justify="right")
+    table.add_column("Latency p50/p99 (ms)", justify="right")
+    table.add_column("Queued p50/p99 (ms)", justify="right")
+    table.add_column("Throttled", justify="right")
+    for name, policy in stats['policies'].items():
+        table.add_row(
+            name,
+            f"{policy['iops']:.1f}",
+            f"{policy['mbps']:.2f}",
+            f"{policy['latency_p50_ms']:.1f} / {policy['latency_p99_ms']:.1f}",
+            f"{policy['queue_p50_ms']:.1f} / {policy['queue_p99_ms']:.1f}",
+            f"{policy['throttled']}/{policy['requests']}"
+        )
+    console.print(table)
+
+@cli.group()
+def volume():
+    """List volumes and move them between nodes"""
+
+@volume.command('list')
+@click.argument('node', type=click.Choice(['a', 'b']))
+def volume_list(node):
+    """List the volumes a node owns"""
+    try:
+        response = http.get(f"{qos_node_url(node)}/volumes")
+        response.raise_for_status()
+    except requests.RequestException as e:
+        console.print(f"[red]Error communicating with node: {e}[/red]")
+        return
+    table = Table(title=f"Volumes on Node {node.upper()}")
+    table.add_column("Volume")
+    table.add_column("Owner")
+    table.add_column("Aggregate")
+    table.add_column("Replica")
+    table.add_column("QoS policy")
+    for vol in response.json()['volumes']:
+        table.add_row(vol['name'], vol['owner_node'], vol['location'] or "shared",
+                      "yes" if vol['is_replica'] else "no", vol['qos_policy'] or "-")
+    console.print(table)
+
+@volume.command('move')
+@click.argument('node', type=click.Choice(['a', 'b']))
+@click.argument('name')
+@click.option('--max-mbps', type=float, default=None, help='Cap on the background copy rate in MB/s')
+@click.option('--watch/--no-watch', default=True, help='Follow the move until it completes')
+def volume_move(node, name, max_mbps, watch):
+    """Move a volume to the partner node while it keeps serving I/O"""
+    node_url = qos_node_url(node)
+    try:
+        response = http.post(f"{node_url}/volumes/{name}/move",
+                             params={'max_mbps': max_mbps} if max_mbps else None)
+        if response.status_code != 200:
+            console.print(f"[red]Failed to start move: {response.text}[/red]")
+            return
+        move = response.json()
+        console.print(f"[green]Moving {name} to {move['destination']} (move {move['id']})[/green]")
+        if not watch:
+            return
+        with Progress(console=console) as progress:
+            task = progress.add_task(f"Copying {name}", total=None)
+            while move['state'] in ('copying', 'catching-up', 'cutover', 'cleaning-up'):
+                time.sleep(1)
+                move = http.get(f"{node_url}/volumes/moves/{move['id']}").json()
+                progress.update(task, total=move['files_total'] or None, completed=move['files_copied'],
+                                description=f"{move['state'].capitalize()} {name} ({move['throughput_mbps']:.1f} MB/s)")
+    except requests.RequestException as e:
+        console.print(f"[red]Error communicating with node: {e}[/red]")
+        return
+    if move['state'] != 'done':
+        console.print(f"[red]Move {move['state']}: {move['error'] or ''}[/red]")
+        return
+    console.print(f"[green]{name} now on {move['destination']}: {move['files_copied']} files, "
+                  f"{move['bytes_copied'] / 1024 / 1024:.1f} MiB at {move['throughput_mbps']:.1f} MB/s, "
+                  f"{len(move['passes'])} catch-up passes, {move['cutover_pause_ms']:.1f}ms cutover[/green]")
+
+@volume.command('moves')
+@click.argument('node', type=click.Choice(['a', 'b']))
+def volume_moves(node):
+    """Show the volume moves started on a node"""
+    try:
+        response = http.get(f"{qos_node_url(node)}/volumes/moves")
+        response.raise_for_status()
+    except requests.RequestException as e:
+        console.print(f"[red]Error communicating with node: {e}[/red]")
+        return
+    table = Table(title=f"Volume moves from Node {node.upper()}")
+    table.add_column("Move")
+    table.add_column("Volume")
+    table.add_column("To")
+    table.add_column("State")
+    table.add_column("Files", justify="right")
+    table.add_column("MB/s", justify="right")
+    table.add_column("Cutover (ms)", justify="right")
+    for move in response.json()['moves']:
+        cutover = move['cutover_pause_ms']
+        table.add_row(move['id'][:8], move['volume'], move['destination'], move['state'],
+                      f"{move['files_copied']}/{move['files_total']}", f"{move['throughput_mbps']:.1f}",
+                      f"{cutover:.1f}" if cutover is not None else "-")
+    console.print(table)
+
+@volume.command('cancel')
+@click.argument('node', type=click.Choice(['a', 'b']))
+@click.argument('move_id')
+def volume_cancel(node, move_id):
+    """Stop a move before its cutover"""
+    try:
+        response = http.delete(f"{qos_node_url(node)}/volumes/moves/{move_id}")
+        if response.status_code == 200:
+            console.print(f"[green]{response.json()['message']}[/green]")
+        else:
+            console.print(f"[red]Failed to cancel move: {response.text}[/red]")
+    except requests.RequestException as e:
+        console.print(f"[red]Error communicating with node: {e}[/red]")
+
+@volume.command('handover')
+@click.argument('node', type=click.Choice(['a', 'b']))
+@click.argument('move_id')
+def volume_handover(node, move_id):
+    """Retry handing a moved volume to the partner"""
+    try:
+        response = http.post(f"{qos_node_url(node)}/volumes/moves/{move_id}/handover")
+    except requests.RequestException as e:
+        console.print(f"[red]Error communicating with node: {e}[/red]")
+        return
+    if response.status_code != 200:
+        console.print(f"[red]Failed to retry handover: {response.text}[/red]")
+    elif response.json()['state'] == 'done':
+        console.print(f"[green]{response.json()['volume']} is now owned by {response.json()['destination']}[/green]")
+    else:
+        console.print(f"[red]{response.json()['error']}[/red]")
+
+@cli.group()
+def compression():
+    """Manage inline compression of volumes"""
+
+@compression.command('set')
+@click.argument('node', type=click.Choice(['a', 'b']))
+@click.argument('volume_name')
+@click.option('--codec', default=None, help='zstd, lz4 or zlib (the best installed by default), or off')
+def compression_set(node, volume_name, codec):
+    """Compress files written to a volume from now on"""
+    try:
+        response = http.put(f"{qos_node_url(node)}/compression/volumes/{volume_name}",
+                            params={'codec': codec} if codec else None)
+        if response.status_code == 200:
+            data = response.json()
+            console.print(f"[green]Compression for {data['volume']}: {data['codec']}[/green]")
+        else:
+            console.print(f"[red]Failed to set compression: {response.text}[/red]")
+    except requests.RequestException as e:
+        console.print(f"[red]Error communicating with node: {e}[/red]")
+
+@compression.command('stats')
+@click.argument('node', type=click.Choice(['a', 'b']))
+def compression_stats(node):
+    """Show compression ratio and CPU cost per MB"""
+    try:
+        response = http.get(f"{qos_node_url(node)}/compression/stats")
+        response.raise_for_status()
+        settings = http.get(f"{qos_node_url(node)}/compression/volumes").json()['volumes']
+    except requests.RequestException as e:
+        console.print(f"[red]Error communicating with node: {e}[/red]")
+        return
+    stats = response.json()
+    table = Table(title=f"Compression on Node {node.upper()} (worker {stats['pid']}, codecs: {', '.join(stats['codecs'])})")
+    table.add_column("Volume / encoding")
+    table.add_column("Codec")
+    table.add_column("Compressed", justify="right")
+    table.add_column("Skipped", justify="right")
+    table.add_column("MiB in", justify="right")
+    table.add_column("MiB out", justify="right")
+    table.add_column("Ratio", justify="right")
+    table.add_column("CPU ms/MB", justify="right")
+
+    def add_row(label, codec, counters):
+        table.add_row(label, codec, str(counters['compressed']), str(counters['skipped']),
+                      f"{counters['bytes_in'] / 1024 / 1024:.1f}", f"{counters['bytes_out'] / 1024 / 1024:.1f}",
+                      f"{counters['ratio']:.2f}", f"{counters['cpu_ms_per_mb']:.1f}")
+
+    empty = {'compressed': 0, 'skipped': 0, 'bytes_in': 0, 'bytes_out': 0, 'ratio': 0.0, 'cpu_ms_per_mb': 0.0}
+    for name in sorted(set(settings) | set(stats['volumes'])):
+        add_row(name, settings.get(name, "off"), stats['volumes'].get(name, empty))
+    for encoding, counters in stats['transfers'].items():
+        add_row("(downloads)", encoding, counters)
+    console.print(table)
+    console.print(f"Decompressed {stats['reads']['bytes'] / 1024 / 1024:.1f} MiB on reads at "
+                  f"{stats['reads']['cpu_ms_per_mb']:.1f} CPU ms/MB")
+
+@cli.group()
+def replication():
+    """Manage scheduled replication of volumes to their replicas"""
+
+def format_age(seconds):
+    if seconds is None:
+        return "-"
+    if seconds < 120:
+        return f"{seconds:.0f}s"
+    if seconds < 7200:
+        return f"{seconds / 60:.0f}m"
+    return f"{seconds / 3600:.1f}h"
+
+@replication.command('status')
+def replication_status():
+    """Show each relationship's lag, transfer progress and the transfer queue"""
+    try:
+        response = http.get(f"{CONTROLLER_ADMIN_URL}/replication")
+        response.raise_for_status()
+    except requests.RequestException as e:
+        console.print(f"[red]Error communicating with controller: {e}[/red]")
+        return
+    data = response.json()
+    limit = format_limit(data['max_mbps'], "MB/s")
+    table = Table(title=f"Replication ({data['max_transfers']} parallel transfers, {limit} total)")
+    table.add_column("Source")
+    table.add_column("Destination")
+    table.add_column("Schedule")
+    table.add_column("State")
+    table.add_column("Lag", justify="right")
+    table.add_column("Transfer", justify="right")
+    table.add_column("MB/s", justify="right")
+    table.add_column("Limit", justify="right")
+    table.add_column("Last error")
+    for rel in data['relationships']:
+        transfer = rel['transfer']
+        if transfer is not None:
+            progress = f"{transfer['files']}/{transfer['files_total']} files"
+            rate = transfer['rate_mbps']
+        elif rel['last_transfer'] is not None:
+            progress = f"{rel['last_transfer']['files']} files, {rel['last_transfer']['deleted']} deleted"
+            rate = rel['last_transfer']['throughput_mbps']
+        else:
+            progress, rate = "-", None
+        state = rel['state'] if rel['healthy'] else f"[red]{rel['state']} (unhealthy)[/red]"
+        table.add_row(rel['source_volume'], rel['destination_volume'], rel['schedule'], state,
+                      format_age(rel['lag_s']), progress, f"{rate:.1f}" if rate is not None else "-",
+                      format_limit(rel['max_mbps'], "MB/s"), rel['last_error'] or "")
+    console.print(table)
+    if data['queued']:
+        console.print(f"Queued: {', '.join(data['queued'])}")
+
+@replication.command('create')
+@click.argument('source')
+@click.argument('destination')
+@click.option('--schedule', default='hourly', help='How often to transfer, e.g. 5min, 8hour, 30s, hourly, daily')
+@click.option('--max-mbps', type=float, default=None, help='Cap on this relationship\'s transfer rate in MB/s')
+def replication_create(source, destination, schedule, max_mbps):
+    """Replicate a volume to a replica volume on a schedule"""
+    params = {'source': source, 'schedule': schedule}
+    if max_mbps is not None:
+        params['max_mbps'] = max_mbps
+    replication_configure(destination, params)
+
+@replication.command('modify')
+@click.argument('destination')
+@click.option('--schedule', default=None, help='How often to transfer, e.g. 5min, 8hour, 30s, hourly, daily')
+@click.option('--max-mbps', type=float, default=None, help='Cap on this relationship\'s transfer rate in MB/s; 0 removes it')
+def replication_modify(destination, schedule, max_mbps):
+    """Change a relationship's schedule or bandwidth limit"""
+    params = {}
+    if schedule is not None:
+        params['schedule'] = schedule
+    if max_mbps is not None:
+        params['max_mbps'] = max_mbps
+    replication_configure(destination, params)
+
+def replication_configure(destination, params):
+    try:
+        response = http.put(f"{CONTROLLER_ADMIN_URL}/replication/relationships/{destination}", params=params)
+        if response.status_code == 200:
+            rel = response.json()
+            console.print(f"[green]{rel['source_volume']} → {rel['destination_volume']} on schedule {rel['schedule']}, "
+                          f"limit {format_limit(rel['max_mbps'], 'MB/s')}[/green]")
+        else:
+            console.print(f"[red]Failed to configure relationship: {response.text}[/red]")
+    except requests.RequestException as e:
+        console.print(f"[red]Error communicating with controller: {e}[/red]")
+
+@replication.command('delete')
+@click.argument('destination')
+def replication_delete(destination):
+    """Stop replicating to a volume, keeping the files already copied"""
+    try:
+        response = http.delete(f"{CONTROLLER_ADMIN_URL}/replication/relationships/{destination}")
+        if response.status_code == 200:
+            console.print(f"[green]{response.json()['message']}[/green]")
+        else:
+            console.print(f"[red]Failed to delete relationship: {response.text}[/red]")
+    except requests.RequestException as e:
+        console.print(f"[red]Error communicating with controller: {e}[/red]")
+
+@replication.command('update')
+@click.argument('destination')
+def replication_update(destination):
+    """Transfer now instead of waiting for the schedule"""
+    try:
+        response = http.post(f"{CONTROLLER_ADMIN_URL}/replication/relationships/{destination}/update")
+        if response.status_code == 200:
+            console.print(f"[green]{response.json()['message']}[/green]")
+        else:
+            console.print(f"[red]Failed to start transfer: {response.text}[/red]")
+    except requests.RequestException as e:
+        console.print(f"[red]Error communicating with controller: {e}[/red]")
+
+@replication.command('throttle')
+@click.option('--max-transfers', type=int, default=None, help='Transfers allowed to run at once')
+@click.option('--max-mbps', type=float, default=None, help='Bandwidth shared by all transfers in MB/s; 0 removes the cap')
+def replication_throttle(max_transfers, max_mbps):
+    """Change the parallel transfer limit and the total bandwidth cap"""
+    params = {}
+    if max_transfers is not None:
+        params['max_transfers'] = max_transfers
+    if max_mbps is not None:
+        params['max_mbps'] = max_mbps
+    try:
+        response = http.put(f"{CONTROLLER_ADMIN_URL}/replication/settings", params=params)
+        if response.status_code == 200:
+            data = response.json()
+            console.print(f"[green]{data['max_transfers']} parallel transfers, "
+                          f"{format_limit(data['max_mbps'], 'MB/s')} total[/green]")
+        else:
+            console.print(f"[red]Failed to change settings: {response.text}[/red]")
+    except requests.RequestException as e:
+        console.print(f"[red]Error communicating with controller: {e}[/red]")
+
 @cli.command()
 def monitor():
     """Monitor HA pair status in real-time"""
@@ -230,7 +781,8 @@ def monitor():
     try:
         with Live(auto_refresh=False) as live:
             while True:
-                simulator.display_status()
+                with tracer.span("monitor"):
+                    simulator.display_status()
                 live.refresh()
                 time.sleep(2)
     except KeyboardInterrupt:
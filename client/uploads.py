@@ -0,0 +1,161 @@
+import asyncio
+import os
+import time
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+import requests
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+# Fenced (409) and failed (503) nodes leave the upload to their partner; any other
+# error response would be the same on every node
+RETRY_STATUSES = (409, 503)
+
+class UploadFailed(Exception):
+    pass
+
+class ResumableUpload:
+    """Offset and failover bookkeeping shared by the blocking and asyncio uploaders.
+
+    Does no I/O itself: the uploaders send what it hands out and report
+    back the offsets the nodes acknowledge, or the errors they hit.
+    """
+
+    def __init__(self, node_urls: List[str], fileobj: BinaryIO, filename: str, chunk_size: int,
+                 retry_timeout: float, volume: Optional[str]):
+        self.node_urls = node_urls
+        self.fileobj = fileobj
+        self.filename = filename
+        self.chunk_size = chunk_size
+        self.retry_timeout = retry_timeout
+        self.volume_headers = {"X-Volume": volume} if volume else {}
+        fileobj.seek(0, os.SEEK_END)
+        self.length = fileobj.tell()
+        self.upload_id: Optional[str] = None
+        self.offset = 0
+        self._node_index = 0
+        self._deadline: Optional[float] = None
+
+    @property
+    def node_url(self) -> str:
+        return self.node_urls[self._node_index]
+
+    @property
+    def create_params(self) -> Dict:
+        return {"filename": self.filename, "length": self.length}
+
+    @property
+    def session_url(self) -> str:
+        return f"{self.node_url}/uploads/{self.upload_id}"
+
+    @property
+    def done(self) -> bool:
+        return self.offset >= self.length
+
+    def next_chunk(self) -> Tuple[bytes, Dict[str, str]]:
+        """The chunk at the committed offset and the headers to send it with."""
+        self.fileobj.seek(self.offset)
+        chunk = self.fileobj.read(self.chunk_size)
+        headers = {"Upload-Offset": str(self.offset), "Content-Type": "application/offset+octet-stream",
+                   **self.volume_headers}
+        return chunk, headers
+
+    def acknowledged(self, offset: int):
+        self.offset = offset
+        self._deadline = None
+
+    def failed(self, error: Exception) -> float:
+        """Switch to the next node after an error. Returns how long to wait before resuming.
+
+        Raises UploadFailed once no node has made progress for ``retry_timeout``.
+        """
+        now = time.monotonic()
+        if self._deadline is None:
+            self._deadline = now + self.retry_timeout
+        elif now >= self._deadline:
+            raise UploadFailed(f"Upload of {self.filename} stalled at {self.offset}/{self.length} bytes: {error}")
+        self._node_index = (self._node_index + 1) % len(self.node_urls)
+        return 0.5
+
+    def check(self, status: int, body: str):
+        """Raise UploadFailed for an error response that retrying on another node would not fix."""
+        if status >= 400 and status not in RETRY_STATUSES:
+            raise UploadFailed(f"{self.node_url} rejected the upload of {self.filename} with HTTP {status}: {body}")
+
+    def missing(self) -> UploadFailed:
+        return UploadFailed(f"Upload session {self.upload_id} no longer exists")
+
+def resumable_upload(node_urls: List[str], fileobj: BinaryIO, filename: str,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE, retry_timeout: float = 60.0,
+                     on_progress: Optional[Callable[[int, int], None]] = None,
+                     session: Optional[requests.Session] = None, volume: Optional[str] = None) -> str:
+    """Upload a seekable file in chunks, resuming on the partner node after a failover.
+
+    Upload sessions live on shared storage, so when a node stops answering
+    (or refuses writes after being fenced) the next node is asked for the
+    committed offset and the upload continues from there. At most the chunk
+    in flight is sent twice. Returns the URL of the node that completed it.
+    Chunks are accounted to ``volume``'s QoS policy when one is given.
+    """
+    http = session or requests.Session()
+    upload = ResumableUpload(node_urls, fileobj, filename, chunk_size, retry_timeout, volume)
+    while True:
+        try:
+            if upload.upload_id is None:
+                response = http.post(f"{upload.node_url}/uploads", params=upload.create_params, timeout=10)
+                upload.check(response.status_code, response.text)
+                response.raise_for_status()
+                upload.upload_id = response.json()["id"]
+            else:
+                response = http.head(upload.session_url, timeout=10)
+                if response.status_code == 404:
+                    raise upload.missing()
+                upload.check(response.status_code, response.text)
+                response.raise_for_status()
+                upload.offset = int(response.headers["Upload-Offset"])
+
+            while not upload.done:
+                chunk, headers = upload.next_chunk()
+                response = http.patch(upload.session_url, data=chunk, headers=headers, timeout=60)
+                upload.check(response.status_code, response.text)
+                response.raise_for_status()
+                upload.acknowledged(int(response.headers["Upload-Offset"]))
+                if on_progress:
+                    on_progress(upload.offset, upload.length)
+            return upload.node_url
+        except requests.RequestException as e:
+            # Node down, failed or fenced: resume on the next one
+            time.sleep(upload.failed(e))
+
+async def async_resumable_upload(session: aiohttp.ClientSession, node_urls: List[str], fileobj: BinaryIO,
+                                 filename: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                                 retry_timeout: float = 60.0, volume: Optional[str] = None) -> str:
+    """``resumable_upload`` for asyncio callers, sharing an aiohttp session.
+
+    Only one chunk of the file is held in memory at a time.
+    """
+    upload = ResumableUpload(node_urls, fileobj, filename, chunk_size, retry_timeout, volume)
+    while True:
+        try:
+            if upload.upload_id is None:
+                async with session.post(f"{upload.node_url}/uploads", params=upload.create_params) as response:
+                    upload.check(response.status, await response.text())
+                    response.raise_for_status()
+                    upload.upload_id = (await response.json())["id"]
+            else:
+                async with session.head(upload.session_url) as response:
+                    if response.status == 404:
+                        raise upload.missing()
+                    upload.check(response.status, await response.text())
+                    response.raise_for_status()
+                    upload.offset = int(response.headers["Upload-Offset"])
+
+            while not upload.done:
+                chunk, headers = upload.next_chunk()
+                async with session.patch(upload.session_url, data=chunk, headers=headers) as response:
+                    upload.check(response.status, await response.text())
+                    response.raise_for_status()
+                    upload.acknowledged(int(response.headers["Upload-Offset"]))
+            return upload.node_url
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            await asyncio.sleep(upload.failed(e))
@@ -0,0 +1,261 @@
+import json
+import os
+import sys
+from array import array
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import FailoverEvent
+from stats import percentile
+
+DEFAULT_CAPACITY = 10000
+PERCENTILES = (50, 90, 99)
+
+# The controller spills its failover history here so it survives buffer
+# eviction and restarts, and the chaos engine tails it to measure detection
+EVENT_LOG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "controller", "failover_events.jsonl")
+
+class FailoverRecord:
+    """Lightweight failover record returned by event store queries."""
+    __slots__ = ("timestamp", "trigger", "failed_node", "takeover_node", "duration_ms")
+
+    def __init__(self, timestamp: float, trigger: str, failed_node: str, takeover_node: str, duration_ms: float):
+        self.timestamp = timestamp
+        self.trigger = trigger
+        self.failed_node = failed_node
+        self.takeover_node = takeover_node
+        self.duration_ms = duration_ms
+
+    def to_dict(self) -> Dict:
+        return {
+            "timestamp": datetime.fromtimestamp(self.timestamp).isoformat(),
+            "trigger": self.trigger,
+            "failed_node": self.failed_node,
+            "takeover_node": self.takeover_node,
+            "duration_ms": self.duration_ms
+        }
+
+    def to_event(self) -> FailoverEvent:
+        return FailoverEvent(
+            timestamp=datetime.fromtimestamp(self.timestamp),
+            trigger=self.trigger,
+            failed_node=self.failed_node,
+            takeover_node=self.takeover_node,
+            duration_ms=self.duration_ms
+        )
+
+class FailoverEventStore:
+    """Bounded columnar ring buffer of failover events.
+
+    Events are stored column by column in fixed-size arrays, with node and
+    trigger names interned to small integers. Once the buffer is full the
+    oldest event is overwritten. When ``log_path`` is set every event is also
+    appended to a JSON-lines file so history older than the buffer can still
+    be queried.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, log_path: Optional[str] = None):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.log_path = log_path
+        self._timestamps = array("d", [0.0] * capacity)
+        self._durations = array("d", [0.0] * capacity)
+        self._triggers = array("H", [0] * capacity)
+        self._failed = array("H", [0] * capacity)
+        self._takeover = array("H", [0] * capacity)
+        self._names: List[str] = []
+        self._name_ids: Dict[str, int] = {}
+        self._start = 0
+        self._size = 0
+        self._total = 0
+        # Lifetime aggregates per failed node, kept across evictions
+        self._node_counts: Dict[str, int] = {}
+        self._node_duration_sums: Dict[str, float] = {}
+        # Sorted durations per node for the retained window, rebuilt lazily
+        self._sorted_durations: Optional[Dict[str, List[float]]] = None
+        self._log_file = None
+        self._logged_before = 0
+        if log_path:
+            if os.path.exists(log_path):
+                with open(log_path, "r", encoding="utf-8") as log:
+                    self._logged_before = sum(1 for line in log if line.strip())
+            os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+            self._log_file = open(log_path, "a", encoding="utf-8")
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def total_events(self) -> int:
+        """Number of events recorded, including those evicted from the buffer."""
+        return self._total
+
+    def _intern(self, name: str) -> int:
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            name_id = len(self._names)
+            self._names.append(name)
+            self._name_ids[name] = name_id
+        return name_id
+
+    def _physical(self, index: int) -> int:
+        return (self._start + index) % self.capacity
+
+    def _record(self, index: int) -> FailoverRecord:
+        pos = self._physical(index)
+        return FailoverRecord(
+            timestamp=self._timestamps[pos],
+            trigger=self._names[self._triggers[pos]],
+            failed_node=self._names[self._failed[pos]],
+            takeover_node=self._names[self._takeover[pos]],
+            duration_ms=self._durations[pos]
+        )
+
+    def append(self, event: FailoverEvent):
+        """Record a failover event."""
+        self.record(
+            timestamp=event.timestamp.timestamp(),
+            trigger=event.trigger,
+            failed_node=event.failed_node,
+            takeover_node=event.takeover_node,
+            duration_ms=event.duration_ms
+        )
+
+    def record(self, timestamp: float, trigger: str, failed_node: str, takeover_node: str, duration_ms: float):
+        """Record a failover event from raw values, skipping model validation."""
+        if self._size < self.capacity:
+            pos = self._physical(self._size)
+            self._size += 1
+        else:
+            pos = self._start
+            self._start = (self._start + 1) % self.capacity
+
+        self._timestamps[pos] = timestamp
+        self._durations[pos] = duration_ms
+        self._triggers[pos] = self._intern(trigger)
+        self._failed[pos] = self._intern(failed_node)
+        self._takeover[pos] = self._intern(takeover_node)
+        self._total += 1
+
+        self._node_counts[failed_node] = self._node_counts.get(failed_node, 0) + 1
+        self._node_duration_sums[failed_node] = self._node_duration_sums.get(failed_node, 0.0) + duration_ms
+        self._sorted_durations = None
+
+        if self._log_file:
+            self._log_file.write(json.dumps([timestamp, trigger, failed_node, takeover_node, duration_ms]) + "\n")
+            self._log_file.flush()
+
+    def _bounds(self, start: Optional[float], end: Optional[float]):
+        """Binary search the retained window for [start, end] in logical indices.
+
+        Events are appended in time order by the monitor loop, so the
+        timestamp column is sorted once unrolled from the ring.
+        """
+        lo = 0 if start is None else self._search(start, inclusive=False)
+        hi = self._size if end is None else self._search(end, inclusive=True)
+        return lo, hi
+
+    def _search(self, timestamp: float, inclusive: bool) -> int:
+        """First logical index whose timestamp is > (inclusive) or >= timestamp."""
+        lo, hi = 0, self._size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = self._timestamps[self._physical(mid)]
+            if value < timestamp or (inclusive and value == timestamp):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _iter_log(self) -> Iterator[FailoverRecord]:
+        if not self.log_path or not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, "r", encoding="utf-8") as log:
+            for line in log:
+                if line.strip():
+                    yield FailoverRecord(*json.loads(line))
+
+    def query(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+              node: Optional[str] = None, trigger: Optional[str] = None,
+              limit: Optional[int] = None, include_log: bool = False) -> List[FailoverRecord]:
+        """Return events matching the filters, oldest first.
+
+        ``node`` matches either the failed or the takeover node. With
+        ``include_log`` events older than the buffer (evicted ones and those
+        from previous runs) are read back from the append log. ``limit``
+        keeps the most recent matches.
+        """
+        start_ts = start.timestamp() if start else None
+        end_ts = end.timestamp() if end else None
+
+        # Filter on interned ids so the scan never touches strings
+        node_id = self._name_ids.get(node, -1) if node else None
+        trigger_id = self._name_ids.get(trigger, -1) if trigger else None
+
+        results = []
+        older = self._logged_before + self._total - self._size
+        if include_log and older > 0:
+            for index, record in enumerate(self._iter_log()):
+                if index >= older:
+                    break
+                if start_ts is not None and record.timestamp < start_ts:
+                    continue
+                if end_ts is not None and record.timestamp > end_ts:
+                    continue
+                if node and node not in (record.failed_node, record.takeover_node):
+                    continue
+                if trigger and record.trigger != trigger:
+                    continue
+                results.append(record)
+
+        lo, hi = self._bounds(start_ts, end_ts)
+        for index in range(lo, hi):
+            pos = self._physical(index)
+            if node_id is not None and node_id not in (self._failed[pos], self._takeover[pos]):
+                continue
+            if trigger_id is not None and self._triggers[pos] != trigger_id:
+                continue
+            results.append(self._record(index))
+
+        if limit is not None:
+            results = results[-limit:] if limit > 0 else []
+        return results
+
+    def recent(self, limit: int) -> List[FailoverRecord]:
+        """Return the most recent ``limit`` events, oldest first."""
+        return [self._record(index) for index in range(max(0, self._size - limit), self._size)]
+
+    def _durations_by_node(self) -> Dict[str, List[float]]:
+        if self._sorted_durations is None:
+            by_node: Dict[str, List[float]] = {}
+            for index in range(self._size):
+                pos = self._physical(index)
+                by_node.setdefault(self._names[self._failed[pos]], []).append(self._durations[pos])
+            for durations in by_node.values():
+                durations.sort()
+            self._sorted_durations = by_node
+        return self._sorted_durations
+
+    def aggregates(self) -> Dict[str, Dict]:
+        """Per failed node: lifetime count and MTTR, plus duration percentiles over the buffer."""
+        durations_by_node = self._durations_by_node()
+        summary = {}
+        for node_name, count in self._node_counts.items():
+            durations = durations_by_node.get(node_name, [])
+            stats = {
+                "count": count,
+                "mttr_ms": self._node_duration_sums[node_name] / count
+            }
+            for pct in PERCENTILES:
+                stats[f"p{pct}_ms"] = percentile(durations, pct)
+            summary[node_name] = stats
+        return summary
+
+    def close(self):
+        if self._log_file:
+            self._log_file.close()
+            self._log_file = None
@@ -5,39 +5,64 @@ from datetime import datetime
 import sys
 import os
 import ctypes
-from typing import Dict, Optional
+from typing import Callable, Dict, Optional
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from models import FailoverEvent, NodeStatus
+from controller.event_store import FailoverEventStore, DEFAULT_CAPACITY, EVENT_LOG_PATH
+from controller.replication import ReplicationScheduler, create_replication_routes
+from diagnostics.aiohttp_app import start_debug_server
+from tracing.clients import aiohttp_trace_config
+from tracing.tracer import NOOP_TRACER, Tracer
+from wire_format import WIRE_ACCEPT, decode_body
 
 # Set console window title
 if os.name == 'nt':  # Windows
     ctypes.windll.kernel32.SetConsoleTitleW("ONTAP HA Pair Simulator - HA Controller")
 
+# Node endpoints and heartbeat interval can be overridden, e.g. by the chaos
+# engine routing controller traffic through its partition proxies
+NODE_A_URL = os.environ.get("ONTAP_NODE_A_URL", "http://localhost:8001")
+NODE_B_URL = os.environ.get("ONTAP_NODE_B_URL", "http://localhost:8002")
+HEARTBEAT_INTERVAL = float(os.environ.get("ONTAP_HEARTBEAT_INTERVAL", "5"))
+HEALTH_CHECK_TIMEOUT = float(os.environ.get("ONTAP_HEALTH_CHECK_TIMEOUT", "2"))
+# Profiling, loop lag and replication endpoints; set to 0 to disable
+ADMIN_PORT = int(os.environ.get("ONTAP_CONTROLLER_ADMIN_PORT", "8004"))
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class HAController:
-    def __init__(self):
-        self.node_a_url = "http://localhost:8001"
-        self.node_b_url = "http://localhost:8002"
+    def __init__(self, event_capacity: int = DEFAULT_CAPACITY, event_log_path: Optional[str] = None,
+                 session_factory: Callable[[], aiohttp.ClientSession] = aiohttp.ClientSession,
+                 tracer: Tracer = NOOP_TRACER):
+        self.node_a_url = NODE_A_URL
+        self.node_b_url = NODE_B_URL
         self.node_states: Dict[str, Dict] = {
             "node-a": {"healthy": True, "last_seen": None, "simulated_failure": False},
             "node-b": {"healthy": True, "last_seen": None, "simulated_failure": False}
         }
-        self.failover_events = []
-        self.heartbeat_interval = 5  # seconds
+        self.failover_events = FailoverEventStore(capacity=event_capacity, log_path=event_log_path)
+        self.heartbeat_interval = HEARTBEAT_INTERVAL  # seconds
         self.failover_timeout = 15  # seconds
+        # A hung node must count as down rather than stall the monitor loop
+        self.health_check_timeout = aiohttp.ClientTimeout(total=HEALTH_CHECK_TIMEOUT)
+        # Replaced by the simulation engine to run the controller against simulated nodes
+        self.session_factory = session_factory
+        # Pair with a session factory whose sessions carry the tracer's trace config
+        self.tracer = tracer
 
     async def check_node_health(self, session: aiohttp.ClientSession, node_url: str, node_name: str) -> bool:
         """Check health status of a node."""
         try:
-            async with session.get(f"{node_url}/health") as response:
+            # Nodes answer in the compact wire format, or JSON if they do not support it
+            async with session.get(f"{node_url}/health", timeout=self.health_check_timeout,
+                                   headers=WIRE_ACCEPT) as response:
                 if response.status == 200:
-                    data = await response.json()
+                    data = decode_body(response.content_type, await response.read())
                     # If node reports it's in FAILED state, it's a simulated failure
                     if data.get("status") == NodeStatus.FAILED:
                         if not self.node_states[node_name]["simulated_failure"]:
@@ -49,10 +74,13 @@ class HAController:
                     self.node_states[node_name]["simulated_failure"] = False
                     return True
                 return False
-        except aiohttp.ClientError:
+        except (aiohttp.ClientError, asyncio.TimeoutError):
             if not self.node_states[node_name]["simulated_failure"]:
                 logger.warning(f"Failed to connect to {node_name}")
             return False
+        except ValueError as e:
+            logger.warning(f"Unreadable health response from {node_name}: {e}")
+            return False
 
     async def handle_simulated_failure(self, session: aiohttp.ClientSession, failed_node: str):
         """Handle a simulated node failure."""
@@ -85,6 +113,8 @@ class HAController:
             return
             
         start_time = datetime.now()
+        # Measured on the loop clock, which is monotonic (and virtual under simulation)
+        start = asyncio.get_running_loop().time()
         
         # Determine the takeover node
         takeover_node = "node-b" if failed_node == "node-a" else "node-a"
@@ -92,20 +122,21 @@ class HAController:
         
         try:
             # Notify the takeover node
-            async with session.post(f"{takeover_url}/takeover") as response:
-                if response.status == 200:
-                    duration = (datetime.now() - start_time).total_seconds() * 1000
-                    event = FailoverEvent(
-                        timestamp=start_time,
-                        trigger="node_failure",
-                        failed_node=failed_node,
-                        takeover_node=takeover_node,
-                        duration_ms=duration
-                    )
-                    self.failover_events.append(event)
-                    logger.info(f"Failover completed: {failed_node} → {takeover_node}")
-                else:
-                    logger.error(f"Failed to initiate takeover on {takeover_node}")
+            with self.tracer.span("failover", attributes={"failed_node": failed_node, "takeover_node": takeover_node}):
+                async with session.post(f"{takeover_url}/takeover") as response:
+                    if response.status == 200:
+                        duration = (asyncio.get_running_loop().time() - start) * 1000
+                        event = FailoverEvent(
+                            timestamp=start_time,
+                            trigger="node_failure",
+                            failed_node=failed_node,
+                            takeover_node=takeover_node,
+                            duration_ms=duration
+                        )
+                        self.failover_events.append(event)
+                        logger.info(f"Failover completed: {failed_node} → {takeover_node}")
+                    else:
+                        logger.error(f"Failed to initiate takeover on {takeover_node}")
         except aiohttp.ClientError as e:
             logger.error(f"Failed to communicate with {takeover_node}: {e}")
 
@@ -113,22 +144,23 @@ class HAController:
         """Main heartbeat monitoring loop."""
         while True:  # Outer loop to ensure monitoring continues even if session fails
             try:
-                async with aiohttp.ClientSession() as session:
+                async with self.session_factory() as session:
                     while True:
                         try:
-                            # Check Node A
-                            node_a_healthy = await self.check_node_health(session, self.node_a_url, "node-a")
-                            if not node_a_healthy and self.node_states["node-a"]["healthy"]:
-                                logger.warning("Node A appears to be down")
-                                await self.initiate_failover(session, "node-a")
-                                self.node_states["node-a"]["healthy"] = False
+                            with self.tracer.span("heartbeat"):
+                                # Check Node A
+                                node_a_healthy = await self.check_node_health(session, self.node_a_url, "node-a")
+                                if not node_a_healthy and self.node_states["node-a"]["healthy"]:
+                                    logger.warning("Node A appears to be down")
+                                    await self.initiate_failover(session, "node-a")
+                                    self.node_states["node-a"]["healthy"] = False
 
-                            # Check Node B
-                            node_b_healthy = await self.check_node_health(session, self.node_b_url, "node-b")
-                            if not node_b_healthy and self.node_states["node-b"]["healthy"]:
-                                logger.warning("Node B appears to be down")
-                                await self.initiate_failover(session, "node-b")
-                                self.node_states["node-b"]["healthy"] = False
+                                # Check Node B
+                                node_b_healthy = await self.check_node_health(session, self.node_b_url, "node-b")
+                                if not node_b_healthy and self.node_states["node-b"]["healthy"]:
+                                    logger.warning("Node B appears to be down")
+                                    await self.initiate_failover(session, "node-b")
+                                    self.node_states["node-b"]["healthy"] = False
 
                             await asyncio.sleep(self.heartbeat_interval)
                         except aiohttp.ClientError as e:
@@ -141,17 +173,42 @@ class HAController:
                 logger.error(f"Session error in monitor_heartbeat: {e}")
                 await asyncio.sleep(1)  # Brief pause before creating new session
 
-    def get_node_status(self) -> Dict:
-        """Return current status of both nodes."""
+    def get_node_status(self, event_limit: int = 50) -> Dict:
+        """Return current status of both nodes with recent failover history."""
         return {
             "node_states": self.node_states,
-            "failover_events": [event.dict() for event in self.failover_events]
+            "failover_events": [record.to_dict() for record in self.failover_events.recent(event_limit)],
+            "failover_summary": self.failover_events.aggregates(),
+            "total_failover_events": self.failover_events.total_events
         }
 
 async def main():
-    controller = HAController()
+    tracer = Tracer("controller")
+    controller = HAController(
+        event_log_path=EVENT_LOG_PATH,
+        session_factory=lambda: aiohttp.ClientSession(trace_configs=[aiohttp_trace_config(tracer)]),
+        tracer=tracer
+    )
+    # Scheduled replication of volumes to their replicas
+    replication = ReplicationScheduler(
+        [NODE_A_URL, NODE_B_URL],
+        session_factory=lambda: aiohttp.ClientSession(auto_decompress=False,
+                                                      trace_configs=[aiohttp_trace_config(tracer)]),
+        tracer=tracer
+    )
     logger.info("Starting HA Controller...")
-    await controller.monitor_heartbeat()
+    if ADMIN_PORT:
+        try:
+            await start_debug_server("localhost", ADMIN_PORT, create_replication_routes(replication))
+            logger.info(f"Admin endpoints on http://localhost:{ADMIN_PORT}/debug")
+        except OSError as e:
+            # Monitoring matters more than the admin endpoints
+            logger.warning(f"Admin endpoints unavailable: {e}")
+    replication_task = asyncio.create_task(replication.run())
+    try:
+        await controller.monitor_heartbeat()
+    finally:
+        replication_task.cancel()
 
 if __name__ == "__main__":
     asyncio.run(main()) 
\ No newline at end of file
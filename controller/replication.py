@@ -0,0 +1,588 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import aiohttp
+from aiohttp import web
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import NodeStatus
+from node_common.qos import MB, TokenBucket
+from tracing.tracer import NOOP_TRACER, Tracer
+
+logger = logging.getLogger(__name__)
+
+# Relationship definitions and transfer history, plus one manifest per
+# destination recording what its last transfer copied
+REPLICATION_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "controller", "replication.json")
+MANIFEST_DIR = os.path.join(os.path.dirname(REPLICATION_PATH), "replication")
+# Transfers running at once across all relationships, and their combined bandwidth (0 = unlimited)
+MAX_TRANSFERS = int(os.environ.get("ONTAP_REPLICATION_MAX_TRANSFERS", "2"))
+REPLICATION_MBPS = float(os.environ.get("ONTAP_REPLICATION_MBPS", "0"))
+# Files per archive request, kept small enough for the names to fit in the URL
+TRANSFER_BATCH = 200
+MAX_QUERY_CHARS = 6000
+LIST_PAGE = 1000
+DISPATCH_INTERVAL_S = 1.0
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=5, sock_read=60)
+DEFAULT_RELATIONSHIPS = [
+    {"source_volume": "vol1", "destination_volume": "vol1-replica", "schedule": "5min", "max_mbps": 0.0}
+]
+
+SCHEDULE_NAMES = {"hourly": 3600, "daily": 86400, "weekly": 7 * 86400}
+SCHEDULE_UNITS = {"s": 1, "sec": 1, "m": 60, "min": 60, "h": 3600, "hour": 3600, "d": 86400, "day": 86400}
+SCHEDULE_PATTERN = re.compile(r"^(\d+)\s*([a-z]+)$")
+# Saved with each relationship; the rest of its entry is rebuilt at start-up
+PERSISTED = ("source_volume", "destination_volume", "schedule", "max_mbps", "last_snapshot",
+             "last_transfer", "totals", "healthy", "last_error")
+
+class TransferError(Exception):
+    pass
+
+def schedule_interval(schedule: str) -> float:
+    """Seconds between runs of a schedule like "5min", "8hour", "hourly" or "30s".
+
+    Raises ValueError for schedules that cannot be parsed.
+    """
+    if not isinstance(schedule, str):
+        raise ValueError(f"Schedule must be a string, not {schedule!r}")
+    schedule = schedule.strip().lower()
+    if schedule in SCHEDULE_NAMES:
+        return float(SCHEDULE_NAMES[schedule])
+    match = SCHEDULE_PATTERN.match(schedule)
+    if not match or match.group(2) not in SCHEDULE_UNITS or int(match.group(1)) <= 0:
+        raise ValueError(f"Unknown schedule {schedule!r}; use e.g. 5min, 8hour, 30s, hourly or daily")
+    return float(int(match.group(1)) * SCHEDULE_UNITS[match.group(2)])
+
+def next_run(schedule: str, after: float) -> float:
+    """First run time strictly after ``after``, aligned to whole multiples of the interval like cron."""
+    interval = schedule_interval(schedule)
+    return (math.floor(after / interval) + 1) * interval
+
+def name_batches(names: List[str], param: str) -> List[List[str]]:
+    """Split names into batches whose query strings stay under the URL length limit."""
+    batches, batch, chars = [], [], 0
+    for name in names:
+        length = len(param) + len(quote(name)) + 2
+        if batch and (len(batch) >= TRANSFER_BATCH or chars + length > MAX_QUERY_CHARS):
+            batches.append(batch)
+            batch, chars = [], 0
+        batch.append(name)
+        chars += length
+    if batch:
+        batches.append(batch)
+    return batches
+
+class ReplicationScheduler:
+    """Runs SnapMirror-style transfers from source volumes to their replicas on schedule.
+
+    Each relationship copies the files in its source volume's folder to
+    its destination volume's folder. A transfer lists the source, compares
+    it with the manifest left by the last transfer and copies only files
+    added or changed since, then deletes those removed. The listing time is
+    the transfer's snapshot time, and a relationship's lag is how long ago
+    its last complete snapshot was taken.
+
+    Due relationships are queued and at most ``max_transfers`` run at once,
+    the one lagging furthest behind first. File data is streamed through
+    the controller from one bulk archive request to another, paced by a
+    token bucket shared by all transfers and one per relationship. Archives
+    are requested gzip encoded and relayed as they are, so the buckets meter
+    compressed bytes; sessions should not decompress responses.
+    """
+
+    def __init__(self, node_urls: List[str], path: str = REPLICATION_PATH, manifest_dir: str = MANIFEST_DIR,
+                 max_transfers: int = MAX_TRANSFERS, max_mbps: float = REPLICATION_MBPS,
+                 session_factory: Callable[[], aiohttp.ClientSession] = lambda: aiohttp.ClientSession(auto_decompress=False),
+                 tracer: Tracer = NOOP_TRACER):
+        self.node_urls = node_urls
+        self.path = path
+        self.manifest_dir = manifest_dir
+        self.max_transfers = max_transfers
+        self.session_factory = session_factory
+        self.tracer = tracer
+        self.relationships: Dict[str, Dict] = {}
+        self._queue: List[str] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.max_mbps = 0.0
+        self._global_bucket: Optional[TokenBucket] = None
+        self.set_max_mbps(max_mbps)
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            saved = DEFAULT_RELATIONSHIPS
+        except ValueError as e:
+            logger.warning(f"Could not read replication relationships, starting with the defaults: {e}")
+            saved = DEFAULT_RELATIONSHIPS
+        now = time.time()
+        for entry in saved:
+            try:
+                schedule_interval(entry["schedule"])
+                relationship = self._new_relationship(entry["source_volume"], entry["destination_volume"],
+                                                      entry["schedule"], float(entry.get("max_mbps", 0.0)))
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"Skipping replication relationship {entry!r}: {type(e).__name__}: {e}")
+                continue
+            relationship.update({key: entry[key] for key in PERSISTED if key in entry})
+            # A run missed while the controller was down is made up straight away
+            last = relationship["last_snapshot"]
+            relationship["next_run"] = next_run(relationship["schedule"], last) if last else now
+            if relationship["next_run"] < now:
+                relationship["next_run"] = now
+            self.relationships[relationship["destination_volume"]] = relationship
+            self._set_bucket(relationship)
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump([{key: relationship[key] for key in PERSISTED} for relationship in self.relationships.values()], f)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _new_relationship(source: str, destination: str, schedule: str, max_mbps: float) -> Dict:
+        return {
+            "source_volume": source,
+            "destination_volume": destination,
+            "schedule": schedule,
+            "max_mbps": max_mbps,
+            "state": "idle",
+            "healthy": True,
+            "last_error": None,
+            "last_snapshot": None,
+            "next_run": time.time(),
+            "transfer": None,
+            "last_transfer": None,
+            "totals": {"transfers": 0, "failures": 0, "files": 0, "bytes": 0, "logical_bytes": 0, "deleted": 0}
+        }
+
+    def _set_bucket(self, relationship: Dict):
+        if relationship["max_mbps"] > 0:
+            self._buckets[relationship["destination_volume"]] = TokenBucket(relationship["max_mbps"] * MB)
+        else:
+            self._buckets.pop(relationship["destination_volume"], None)
+
+    def set_max_mbps(self, max_mbps: float):
+        """Change the bandwidth shared by all transfers; 0 removes the limit."""
+        self.max_mbps = max_mbps
+        self._global_bucket = TokenBucket(max_mbps * MB) if max_mbps > 0 else None
+
+    def set_max_transfers(self, max_transfers: int):
+        """Change how many transfers may run at once. Transfers over a lowered limit run to completion."""
+        self.max_transfers = max_transfers
+        self._dispatch()
+
+    def _manifest_path(self, destination: str) -> str:
+        return os.path.join(self.manifest_dir, f"{quote(destination, safe='')}.json")
+
+    def _load_manifest(self, destination: str) -> Dict[str, List]:
+        try:
+            with open(self._manifest_path(destination), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_manifest(self, destination: str, manifest: Dict[str, List]):
+        os.makedirs(self.manifest_dir, exist_ok=True)
+        manifest_path = self._manifest_path(destination)
+        tmp_path = manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+
+    def configure(self, destination: str, source: Optional[str] = None, schedule: Optional[str] = None,
+                  max_mbps: Optional[float] = None) -> Dict:
+        """Create a relationship or change an existing one's schedule or bandwidth limit.
+
+        Raises ValueError for a bad schedule, limit or volume pairing.
+        """
+        if schedule is not None:
+            schedule_interval(schedule)
+        if max_mbps is not None and max_mbps < 0:
+            raise ValueError("max_mbps must not be negative")
+        relationship = self.relationships.get(destination)
+        if relationship is None:
+            if not source:
+                raise ValueError("A new relationship needs a source volume")
+            if source == destination or source in self.relationships:
+                raise ValueError("The source volume must not be a replication destination")
+            if any(existing["source_volume"] == destination for existing in self.relationships.values()):
+                raise ValueError("The destination volume is already the source of another relationship")
+            relationship = self._new_relationship(source, destination, schedule or "hourly", max_mbps or 0.0)
+            self.relationships[destination] = relationship
+        elif source and source != relationship["source_volume"]:
+            raise ValueError("The source of an existing relationship cannot be changed; delete it first")
+        else:
+            if schedule is not None:
+                relationship["schedule"] = schedule
+                if relationship["state"] == "idle":
+                    relationship["next_run"] = next_run(schedule, time.time())
+            if max_mbps is not None:
+                relationship["max_mbps"] = max_mbps
+        self._set_bucket(relationship)
+        self._save()
+        return self._describe(relationship)
+
+    def delete(self, destination: str) -> bool:
+        """Remove a relationship, stopping any transfer it has under way. The replica's files are kept."""
+        relationship = self.relationships.pop(destination, None)
+        if relationship is None:
+            return False
+        if destination in self._queue:
+            self._queue.remove(destination)
+        task = self._running.get(destination)
+        if task is not None:
+            task.cancel()
+        self._buckets.pop(destination, None)
+        try:
+            os.remove(self._manifest_path(destination))
+        except FileNotFoundError:
+            pass
+        self._save()
+        return True
+
+    def request_update(self, destination: str) -> bool:
+        """Queue a transfer now rather than waiting for the schedule."""
+        relationship = self.relationships.get(destination)
+        if relationship is None:
+            return False
+        self._enqueue(relationship)
+        self._dispatch()
+        return True
+
+    def lag(self, relationship: Dict, now: Optional[float] = None) -> float:
+        """Seconds since the last complete snapshot; infinite before the first transfer."""
+        if relationship["last_snapshot"] is None:
+            return math.inf
+        return (now or time.time()) - relationship["last_snapshot"]
+
+    def _enqueue(self, relationship: Dict):
+        destination = relationship["destination_volume"]
+        if destination in self._running or destination in self._queue:
+            return
+        relationship["state"] = "queued"
+        relationship["queued_at"] = time.time()
+        self._queue.append(destination)
+
+    def _dispatch(self):
+        """Start queued transfers while there are free slots, the one lagging most first."""
+        now = time.time()
+        self._queue.sort(key=lambda destination: self.lag(self.relationships[destination], now), reverse=True)
+        while self._queue and len(self._running) < self.max_transfers:
+            destination = self._queue.pop(0)
+            relationship = self.relationships[destination]
+            task = asyncio.create_task(self._run(relationship))
+            self._running[destination] = task
+            task.add_done_callback(lambda _, destination=destination: self._finished(destination))
+
+    def _finished(self, destination: str):
+        self._running.pop(destination, None)
+        self._dispatch()
+
+    async def run(self):
+        """Background loop queueing relationships as they fall due and starting their transfers."""
+        while True:
+            now = time.time()
+            for relationship in list(self.relationships.values()):
+                if relationship["next_run"] <= now:
+                    # A run that falls due while the last one is still going is skipped
+                    relationship["next_run"] = next_run(relationship["schedule"], now)
+                    self._enqueue(relationship)
+            self._dispatch()
+            await asyncio.sleep(DISPATCH_INTERVAL_S)
+
+    async def _run(self, relationship: Dict):
+        destination = relationship["destination_volume"]
+        relationship["state"] = "transferring"
+        waited = time.time() - relationship.pop("queued_at", time.time())
+        try:
+            with self.tracer.span("replication_transfer", attributes={
+                    "source": relationship["source_volume"], "destination": destination}):
+                result = await self._transfer(relationship)
+            result["queued_s"] = waited
+            relationship["last_transfer"] = result
+            relationship["last_snapshot"] = result["snapshot"]
+            relationship["healthy"] = True
+            relationship["last_error"] = None
+            totals = relationship["totals"]
+            totals["transfers"] += 1
+            for key in ("files", "bytes", "logical_bytes", "deleted"):
+                totals[key] = totals.get(key, 0) + result[key]
+            logger.info(f"Replicated {relationship['source_volume']} → {destination}: {result['files']} files, "
+                        f"{result['logical_bytes'] / MB:.1f}MB ({result['bytes'] / MB:.1f}MB sent), {result['deleted']} deleted in {result['duration_s']:.1f}s")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            relationship["healthy"] = False
+            relationship["last_error"] = f"{type(e).__name__}: {e}"
+            relationship["totals"]["failures"] += 1
+            if isinstance(e, (aiohttp.ClientError, asyncio.TimeoutError, TransferError, OSError)):
+                logger.warning(f"Replication to {destination} failed: {relationship['last_error']}")
+            else:
+                # Not a failure a transfer expects, such as a malformed node response
+                logger.exception(f"Replication to {destination} failed: {relationship['last_error']}")
+        finally:
+            relationship["state"] = "idle"
+            relationship["transfer"] = None
+            if destination in self.relationships:
+                self._save()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = self.session_factory()
+        return self._session
+
+    async def _writer_url(self, session: aiohttp.ClientSession) -> str:
+        """The node that currently owns the shared storage and so may write the replica."""
+        for url in self.node_urls:
+            try:
+                async with session.get(f"{url}/status", timeout=aiohttp.ClientTimeout(total=2)) as response:
+                    if response.status != 200:
+                        continue
+                    data = await response.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                continue
+            if data["node"]["status"] != NodeStatus.FAILED and data["fencing"]["owns_storage"]:
+                return url
+        raise TransferError("No node owns the shared storage")
+
+    async def _list_source(self, session: aiohttp.ClientSession, url: str, source: str) -> Dict[str, List]:
+        files: Dict[str, List] = {}
+        after = None
+        while True:
+            params = {"folder": source, "recursive": "true", "limit": str(LIST_PAGE)}
+            if after:
+                params["after"] = after
+            async with session.get(f"{url}/files", params=params, headers={"X-Volume": source},
+                                   timeout=REQUEST_TIMEOUT) as response:
+                if response.status == 404:
+                    return files  # Nothing has been written to the volume yet
+                if response.status != 200:
+                    raise TransferError(f"Listing {source} failed with HTTP {response.status}")
+                page = await response.json()
+            for entry in page["files"]:
+                files[entry["name"][len(source) + 1:]] = [entry["size"], entry["modified"]]
+            after = page["next"]
+            if not after:
+                return files
+
+    async def _throttled(self, response: aiohttp.ClientResponse, bucket: Optional[TokenBucket],
+                         progress: Dict) -> AsyncIterator[bytes]:
+        buckets = [b for b in (self._global_bucket, bucket) if b is not None]
+        async for chunk in response.content.iter_any():
+            # Tokens are taken from both buckets; the chunk goes once both have paid for it
+            wait = max((b.reserve(len(chunk)) for b in buckets), default=0.0)
+            if wait:
+                await asyncio.sleep(wait)
+            progress["bytes"] += len(chunk)
+            yield chunk
+
+    async def _copy_batch(self, session: aiohttp.ClientSession, url: str, relationship: Dict,
+                          params: List[Tuple[str, str]], progress: Dict) -> List[str]:
+        """Stream one archive of source files into the destination folder.
+
+        Returns the names written, relative to the volume's folder.
+        """
+        source = relationship["source_volume"]
+        destination = relationship["destination_volume"]
+        # The destination unpacks gzip-compressed archives itself
+        async with session.get(f"{url}/bulk/archive", params=params + [("base", source)],
+                               headers={"X-Volume": source, "Accept-Encoding": "gzip"},
+                               timeout=REQUEST_TIMEOUT) as archive:
+            if archive.status == 404:
+                return []  # Every file in the batch was deleted after the listing
+            if archive.status != 200:
+                raise TransferError(f"Reading {source} failed with HTTP {archive.status}")
+            body = self._throttled(archive, self._buckets.get(destination), progress)
+            async with session.post(f"{url}/bulk/archive", params={"folder": destination}, data=body,
+                                    headers={"X-Volume": destination, "Content-Type": "application/x-tar"},
+                                    timeout=REQUEST_TIMEOUT) as response:
+                if response.status != 200:
+                    raise TransferError(f"Writing {destination} failed with HTTP {response.status}: "
+                                        f"{await response.text()}")
+                result = await response.json()
+        written = [name[len(destination) + 1:] for name in result["files"]]
+        progress["files"] += len(written)
+        progress["logical_bytes"] += result["bytes"]
+        return written
+
+    async def _transfer(self, relationship: Dict) -> Dict:
+        source = relationship["source_volume"]
+        destination = relationship["destination_volume"]
+        session = await self._get_session()
+        url = await self._writer_url(session)
+
+        started = time.perf_counter()
+        snapshot = time.time()
+        current = await self._list_source(session, url, source)
+        manifest = self._load_manifest(destination)
+        changed = sorted(name for name, entry in current.items() if manifest.get(name) != entry)
+        deleted = sorted(name for name in manifest if name not in current)
+        # Bytes on the wire, and the size of the files they carried
+        progress = {"started": snapshot, "files_total": len(changed), "files": 0, "bytes": 0, "logical_bytes": 0,
+                    "deleted_total": len(deleted), "deleted": 0, "node": url}
+        relationship["transfer"] = progress
+
+        try:
+            if changed and not manifest:
+                # Baseline: the whole volume in one archive
+                written = await self._copy_batch(session, url, relationship, [("prefix", f"{source}/")], progress)
+                self._record_copied(manifest, current, written)
+            else:
+                for batch in name_batches(changed, "name"):
+                    params = [("name", f"{source}/{name}") for name in batch]
+                    written = await self._copy_batch(session, url, relationship, params, progress)
+                    self._record_copied(manifest, current, written)
+            for batch in name_batches(deleted, "names"):
+                async with session.post(f"{url}/bulk/delete", json={"names": [f"{destination}/{name}" for name in batch]},
+                                        headers={"X-Volume": destination}, timeout=REQUEST_TIMEOUT) as response:
+                    if response.status != 200:
+                        raise TransferError(f"Deleting from {destination} failed with HTTP {response.status}")
+                for name in batch:
+                    manifest.pop(name, None)
+                progress["deleted"] += len(batch)
+        finally:
+            # Progress made before a failure is kept, so the retry resumes from it
+            self._save_manifest(destination, manifest)
+
+        await self._mark_synced(session, destination, snapshot)
+        duration = time.perf_counter() - started
+        return {
+            "snapshot": snapshot,
+            "finished": time.time(),
+            "files": progress["files"],
+            "bytes": progress["bytes"],
+            "logical_bytes": progress["logical_bytes"],
+            "compression_ratio": progress["logical_bytes"] / progress["bytes"] if progress["bytes"] else 0.0,
+            "deleted": progress["deleted"],
+            "duration_s": duration,
+            "throughput_mbps": progress["bytes"] / MB / duration if duration else 0.0
+        }
+
+    @staticmethod
+    def _record_copied(manifest: Dict[str, List], current: Dict[str, List], written: List[str]):
+        # Entries come from the listing, so a file changed again since is copied again next time;
+        # files created after the listing went out in a prefix archive are left for the next transfer too
+        for name in written:
+            if name in current:
+                manifest[name] = current[name]
+
+    async def _mark_synced(self, session: aiohttp.ClientSession, destination: str, snapshot: float):
+        """Tell whichever node holds the replica volume when it was last brought up to date."""
+        at = datetime.fromtimestamp(snapshot).isoformat()
+        for url in self.node_urls:
+            try:
+                async with session.put(f"{url}/volumes/{quote(destination, safe='')}/last-sync", params={"at": at},
+                                       timeout=aiohttp.ClientTimeout(total=2)):
+                    pass
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                continue
+
+    def _describe(self, relationship: Dict, now: Optional[float] = None) -> Dict:
+        now = now or time.time()
+        lag = self.lag(relationship, now)
+        transfer = relationship["transfer"]
+        if transfer is not None:
+            elapsed = now - transfer["started"]
+            transfer = dict(transfer, elapsed_s=elapsed,
+                            rate_mbps=transfer["bytes"] / MB / elapsed if elapsed > 0 else 0.0)
+        return {
+            "source_volume": relationship["source_volume"],
+            "destination_volume": relationship["destination_volume"],
+            "schedule": relationship["schedule"],
+            "max_mbps": relationship["max_mbps"],
+            "state": relationship["state"],
+            "healthy": relationship["healthy"],
+            "last_error": relationship["last_error"],
+            "lag_s": None if math.isinf(lag) else lag,
+            "last_snapshot": relationship["last_snapshot"],
+            "next_run": relationship["next_run"],
+            "transfer": transfer,
+            "last_transfer": relationship["last_transfer"],
+            "totals": relationship["totals"]
+        }
+
+    def status(self) -> Dict:
+        now = time.time()
+        return {
+            "max_transfers": self.max_transfers,
+            "max_mbps": self.max_mbps,
+            "running": list(self._running),
+            "queued": list(self._queue),
+            "relationships": [self._describe(relationship, now) for relationship in self.relationships.values()]
+        }
+
+def create_replication_routes(scheduler: ReplicationScheduler) -> web.RouteTableDef:
+    """Admin endpoints for replication relationships, served by the controller."""
+    routes = web.RouteTableDef()
+
+    def query_float(request: web.Request, key: str) -> Optional[float]:
+        value = request.query.get(key)
+        return float(value) if value not in (None, "") else None
+
+    @routes.get("/replication")
+    async def replication_status(request: web.Request) -> web.Response:
+        """Every relationship's lag, transfer progress and history, plus the transfer queue."""
+        return web.json_response(scheduler.status())
+
+    @routes.put("/replication/settings")
+    async def replication_settings(request: web.Request) -> web.Response:
+        """Change how many transfers run at once and the bandwidth they share."""
+        try:
+            max_transfers = request.query.get("max_transfers")
+            max_mbps = query_float(request, "max_mbps")
+            if max_transfers is not None:
+                if int(max_transfers) < 1:
+                    raise ValueError("max_transfers must be at least 1")
+            if max_mbps is not None and max_mbps < 0:
+                raise ValueError("max_mbps must not be negative")
+        except ValueError as e:
+            return web.json_response({"detail": str(e)}, status=400)
+        if max_transfers is not None:
+            scheduler.set_max_transfers(int(max_transfers))
+        if max_mbps is not None:
+            scheduler.set_max_mbps(max_mbps)
+        return web.json_response({"max_transfers": scheduler.max_transfers, "max_mbps": scheduler.max_mbps})
+
+    @routes.put("/replication/relationships/{destination}")
+    async def configure_relationship(request: web.Request) -> web.Response:
+        """Create a relationship, or change its schedule or bandwidth limit."""
+        try:
+            relationship = scheduler.configure(request.match_info["destination"], request.query.get("source"),
+                                               request.query.get("schedule"), query_float(request, "max_mbps"))
+        except ValueError as e:
+            return web.json_response({"detail": str(e)}, status=400)
+        return web.json_response(relationship)
+
+    @routes.delete("/replication/relationships/{destination}")
+    async def delete_relationship(request: web.Request) -> web.Response:
+        destination = request.match_info["destination"]
+        if not scheduler.delete(destination):
+            return web.json_response({"detail": "Relationship not found"}, status=404)
+        return web.json_response({"message": f"Relationship to {destination} deleted"})
+
+    @routes.post("/replication/relationships/{destination}/update")
+    async def update_relationship(request: web.Request) -> web.Response:
+        """Start a transfer now, or as soon as a slot is free."""
+        destination = request.match_info["destination"]
+        if not scheduler.request_update(destination):
+            return web.json_response({"detail": "Relationship not found"}, status=404)
+        return web.json_response({"message": f"Transfer to {destination} queued"})
+
+    return routes
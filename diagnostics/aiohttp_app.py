@@ -0,0 +1,51 @@
+import asyncio
+from typing import Optional
+
+from aiohttp import web
+
+from diagnostics.loop_lag import DEFAULT_PROBE_INTERVAL_MS, measure_loop_lag
+from diagnostics.profiler import DEFAULT_INTERVAL_MS, ProfilerBusy, StackSampler
+
+def create_debug_app(extra_routes: Optional[web.RouteTableDef] = None) -> web.Application:
+    """Admin endpoints for processes that have no HTTP server of their own, like the HA controller.
+
+    ``extra_routes`` adds the process's own admin endpoints alongside the diagnostics.
+    """
+    sampler = StackSampler()
+    routes = web.RouteTableDef()
+
+    @routes.post("/debug/profile")
+    async def profile(request: web.Request) -> web.Response:
+        """Sample all threads for a window and return collapsed stacks or speedscope JSON."""
+        seconds = float(request.query.get("seconds", 10.0))
+        interval_ms = float(request.query.get("interval_ms", DEFAULT_INTERVAL_MS))
+        output = request.query.get("format", "collapsed")
+        if output not in ("collapsed", "speedscope"):
+            return web.json_response({"detail": "format must be collapsed or speedscope"}, status=400)
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(None, sampler.profile, seconds, interval_ms)
+        except ProfilerBusy as e:
+            return web.json_response({"detail": str(e)}, status=409)
+        if output == "speedscope":
+            return web.json_response(result.speedscope())
+        return web.Response(text=result.collapsed())
+
+    @routes.post("/debug/loop-lag")
+    async def loop_lag(request: web.Request) -> web.Response:
+        """Measure event-loop scheduling lag over a window."""
+        seconds = float(request.query.get("seconds", 5.0))
+        interval_ms = float(request.query.get("interval_ms", DEFAULT_PROBE_INTERVAL_MS))
+        return web.json_response(await measure_loop_lag(seconds, interval_ms))
+
+    app = web.Application()
+    app.add_routes(routes)
+    if extra_routes is not None:
+        app.add_routes(extra_routes)
+    return app
+
+async def start_debug_server(host: str, port: int, extra_routes: Optional[web.RouteTableDef] = None) -> web.AppRunner:
+    """Serve the admin endpoints on the running event loop."""
+    runner = web.AppRunner(create_debug_app(extra_routes), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+from fastapi import APIRouter, FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from diagnostics.loop_lag import DEFAULT_PROBE_INTERVAL_MS, measure_loop_lag
+from diagnostics.profiler import DEFAULT_INTERVAL_MS, ProfilerBusy, StackSampler
+from diagnostics.timing import RequestTimings
+
+class TimingMiddleware:
+    """Pure ASGI middleware feeding ``RequestTimings`` while a window is open."""
+
+    def __init__(self, app, timings: RequestTimings, fastapi_app: FastAPI):
+        self.app = app
+        self.timings = timings
+        self.fastapi_app = fastapi_app
+        self._route_paths = None
+
+    def _route_for(self, scope) -> str:
+        if self._route_paths is None:
+            self._route_paths = {
+                route.endpoint: route.path for route in self.fastapi_app.routes if hasattr(route, "endpoint")
+            }
+        return self._route_paths.get(scope.get("endpoint"), scope["path"])
+
+    async def __call__(self, scope, receive, send):
+        if not self.timings.active or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Includes streaming the body, which is what a client waits for
+            self.timings.record(scope["method"], self._route_for(scope), scope["path"], status,
+                                (time.perf_counter() - start) * 1000)
+
+def create_debug_router(sampler: StackSampler, timings: RequestTimings) -> APIRouter:
+    router = APIRouter(prefix="/debug")
+
+    @router.post("/profile")
+    async def profile(seconds: float = 10.0, interval_ms: float = DEFAULT_INTERVAL_MS, format: str = "collapsed"):
+        """Sample all threads for a window and return collapsed stacks or speedscope JSON."""
+        if format not in ("collapsed", "speedscope"):
+            raise HTTPException(status_code=400, detail="format must be collapsed or speedscope")
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(None, sampler.profile, seconds, interval_ms)
+        except ProfilerBusy as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        if format == "speedscope":
+            return result.speedscope()
+        return PlainTextResponse(result.collapsed())
+
+    @router.post("/requests")
+    async def request_timings(seconds: float = 10.0, limit: int = 20):
+        """Time every request during a window and return per-route stats and the slowest requests."""
+        if timings.active:
+            raise HTTPException(status_code=409, detail="A timing window is already open")
+        timings.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            timings.stop()
+        return timings.report(limit)
+
+    @router.post("/loop-lag")
+    async def loop_lag(seconds: float = 5.0, interval_ms: float = DEFAULT_PROBE_INTERVAL_MS):
+        """Measure event-loop scheduling lag over a window."""
+        return await measure_loop_lag(seconds, interval_ms)
+
+    return router
+
+def install_diagnostics(app: FastAPI):
+    """Add the /debug endpoints and the (idle by default) request timing hook to an app."""
+    sampler = StackSampler()
+    timings = RequestTimings()
+    app.add_middleware(TimingMiddleware, timings=timings, fastapi_app=app)
+    app.include_router(create_debug_router(sampler, timings))
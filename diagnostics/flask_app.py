@@ -0,0 +1,61 @@
+import time
+
+from flask import Blueprint, Flask, Response, g, jsonify, request
+
+from diagnostics.profiler import DEFAULT_INTERVAL_MS, ProfilerBusy, StackSampler
+from diagnostics.timing import RequestTimings
+
+def install_diagnostics(app: Flask):
+    """Flask counterpart of ``diagnostics.asgi.install_diagnostics``.
+
+    There is no event loop to measure, so only profiling and request
+    timing are exposed.
+    """
+    sampler = StackSampler()
+    timings = RequestTimings()
+    debug = Blueprint("debug", __name__, url_prefix="/debug")
+
+    @app.before_request
+    def start_timer():
+        if timings.active:
+            g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_timing(response):
+        started = g.pop("request_started", None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else request.path
+            timings.record(request.method, route, request.path, response.status_code,
+                           (time.perf_counter() - started) * 1000)
+        return response
+
+    @debug.route("/profile", methods=["POST"])
+    def profile():
+        """Sample all threads for a window and return collapsed stacks or speedscope JSON."""
+        seconds = request.args.get("seconds", 10.0, type=float)
+        interval_ms = request.args.get("interval_ms", DEFAULT_INTERVAL_MS, type=float)
+        output = request.args.get("format", "collapsed")
+        if output not in ("collapsed", "speedscope"):
+            return jsonify({"detail": "format must be collapsed or speedscope"}), 400
+        try:
+            result = sampler.profile(seconds, interval_ms)
+        except ProfilerBusy as e:
+            return jsonify({"detail": str(e)}), 409
+        if output == "speedscope":
+            return jsonify(result.speedscope())
+        return Response(result.collapsed(), mimetype="text/plain")
+
+    @debug.route("/requests", methods=["POST"])
+    def request_timings():
+        """Time every request during a window and return per-route stats and the slowest requests."""
+        if timings.active:
+            return jsonify({"detail": "A timing window is already open"}), 409
+        seconds = request.args.get("seconds", 10.0, type=float)
+        timings.start()
+        try:
+            time.sleep(seconds)
+        finally:
+            timings.stop()
+        return jsonify(timings.report(request.args.get("limit", 20, type=int)))
+
+    app.register_blueprint(debug)
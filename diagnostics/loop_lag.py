@@ -0,0 +1,42 @@
+import asyncio
+import time
+from typing import Dict
+
+from stats import percentile
+
+DEFAULT_PROBE_INTERVAL_MS = 10.0
+# Lags above this are listed individually
+SPIKE_MS = 50.0
+
+async def measure_loop_lag(seconds: float, interval_ms: float = DEFAULT_PROBE_INTERVAL_MS) -> Dict:
+    """Sleep repeatedly on the running loop and report how late each wake-up was.
+
+    Lag is time the loop spent running other callbacks (or blocked in
+    synchronous code) past the requested wake-up. The probe only exists for
+    the measurement window.
+    """
+    interval = interval_ms / 1000
+    lags = []
+    spikes = []
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        before = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag_ms = max(0.0, (time.perf_counter() - before - interval) * 1000)
+        lags.append(lag_ms)
+        if lag_ms >= SPIKE_MS:
+            spikes.append({"at_s": round(before - start, 3), "lag_ms": lag_ms})
+
+    lags.sort()
+    return {
+        "duration_s": time.perf_counter() - start,
+        "probe_interval_ms": interval_ms,
+        "probes": len(lags),
+        "mean_ms": sum(lags) / len(lags) if lags else 0.0,
+        "p50_ms": percentile(lags, 50),
+        "p90_ms": percentile(lags, 90),
+        "p99_ms": percentile(lags, 99),
+        "max_ms": lags[-1] if lags else 0.0,
+        "spikes": spikes
+    }
@@ -0,0 +1,118 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+# A frame as (function, file, first line), so samples anywhere in a function merge
+Frame = Tuple[str, str, int]
+
+DEFAULT_INTERVAL_MS = 5.0
+MAX_PROFILE_SECONDS = 300.0
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+class StackSampler:
+    """Sampling profiler that snapshots every thread's stack from a helper thread.
+
+    Nothing is installed in the profiled code: when no profile is running
+    there is no tracing hook and no extra thread, so the cost is zero. While
+    running, each sample is one ``sys._current_frames()`` call, and asyncio
+    coroutines show up under the event loop frames of the thread running them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.running = False
+
+    def profile(self, seconds: float, interval_ms: float = DEFAULT_INTERVAL_MS) -> "Profile":
+        """Sample for ``seconds``; blocks the calling thread, so run it off the event loop."""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already running")
+        try:
+            self.running = True
+            return self._sample(min(seconds, MAX_PROFILE_SECONDS), interval_ms / 1000)
+        finally:
+            self.running = False
+            self._lock.release()
+
+    def _sample(self, seconds: float, interval: float) -> "Profile":
+        me = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks: Dict[int, Counter] = {}
+        samples = 0
+        start = time.perf_counter()
+        deadline = start + seconds
+        while time.perf_counter() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                stack.reverse()
+                stacks.setdefault(ident, Counter())[tuple(stack)] += 1
+            samples += 1
+            time.sleep(interval)
+        threads = {names.get(ident, f"thread-{ident}"): counts for ident, counts in stacks.items()}
+        return Profile(threads, samples, time.perf_counter() - start, interval)
+
+class Profile:
+    """Stack sample counts per thread, convertible to flamegraph formats."""
+
+    def __init__(self, threads: Dict[str, Counter], samples: int, duration_s: float, interval_s: float):
+        self.threads = threads
+        self.samples = samples
+        self.duration_s = duration_s
+        self.interval_s = interval_s
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed stack format, one ``thread;frame;... count`` line per stack."""
+        lines = []
+        for thread, counts in self.threads.items():
+            for stack, count in counts.most_common():
+                frames = ";".join(_frame_label(frame) for frame in stack)
+                lines.append(f"{thread};{frames} {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self, name: Optional[str] = None) -> Dict:
+        """Speedscope's file format with one sampled profile per thread."""
+        frame_index: Dict[Frame, int] = {}
+        frames: List[Dict] = []
+        profiles = []
+        for thread, counts in self.threads.items():
+            samples = []
+            weights = []
+            for stack, count in counts.most_common():
+                indexes = []
+                for frame in stack:
+                    if frame not in frame_index:
+                        frame_index[frame] = len(frames)
+                        frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                    indexes.append(frame_index[frame])
+                samples.append(indexes)
+                weights.append(count * self.interval_s)
+            profiles.append({
+                "type": "sampled",
+                "name": thread,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name or f"pid {os.getpid()}",
+            "exporter": "ontap-dr-simulator",
+            "shared": {"frames": frames},
+            "profiles": profiles
+        }
+
+def _frame_label(frame: Frame) -> str:
+    function, filename, line = frame
+    return f"{function} ({os.path.basename(filename)}:{line})"
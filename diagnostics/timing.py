@@ -0,0 +1,73 @@
+import heapq
+import threading
+import time
+from typing import Dict, List, Optional
+
+from stats import percentile
+
+DEFAULT_SLOWEST = 20
+
+class RequestTimings:
+    """Per-route latencies recorded only while a timing window is open.
+
+    Request hooks check ``active`` and return immediately otherwise, so
+    timing costs one attribute read per request when it is off.
+    """
+
+    def __init__(self, keep_slowest: int = DEFAULT_SLOWEST):
+        self.keep_slowest = keep_slowest
+        self.active = False
+        self._lock = threading.Lock()
+        self._routes: Dict[str, List[float]] = {}
+        # Min-heap of (duration, seq, request) holding the slowest requests
+        self._slowest: List = []
+        self._seq = 0
+        self._started = 0.0
+
+    def start(self):
+        with self._lock:
+            self._routes = {}
+            self._slowest = []
+            self._started = time.time()
+            self.active = True
+
+    def stop(self):
+        self.active = False
+
+    def record(self, method: str, route: str, path: str, status: int, duration_ms: float):
+        with self._lock:
+            if not self.active:
+                return
+            self._routes.setdefault(f"{method} {route}", []).append(duration_ms)
+            self._seq += 1
+            entry = (duration_ms, self._seq, {
+                "method": method,
+                "route": route,
+                "path": path,
+                "status": status,
+                "duration_ms": duration_ms,
+                "at": time.time()
+            })
+            if len(self._slowest) < self.keep_slowest:
+                heapq.heappush(self._slowest, entry)
+            elif duration_ms > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def report(self, limit: Optional[int] = None) -> Dict:
+        with self._lock:
+            routes = {}
+            for route, durations in self._routes.items():
+                durations = sorted(durations)
+                routes[route] = {
+                    "count": len(durations),
+                    "mean_ms": sum(durations) / len(durations),
+                    "p50_ms": percentile(durations, 50),
+                    "p99_ms": percentile(durations, 99),
+                    "max_ms": durations[-1]
+                }
+            slowest = [request for _, _, request in sorted(self._slowest, reverse=True)]
+        return {
+            "started": self._started,
+            "routes": dict(sorted(routes.items(), key=lambda item: item[1]["p99_ms"], reverse=True)),
+            "slowest": slowest[:limit] if limit else slowest
+        }
@@ -1,47 +1,72 @@
-from flask import Flask, render_template, request, send_file, jsonify, redirect, url_for
+from flask import Flask, Response, render_template, request, send_file, jsonify, redirect, url_for, stream_with_context
 import requests
 import os
+import sys
 import tempfile
+import time
 from datetime import datetime
 
-app = Flask(__name__)
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client.uploads import UploadFailed, resumable_upload
+from diagnostics.flask_app import install_diagnostics
+from fileapp.config import ACTIVE_NODE_TTL, NODES, PORT
+from tracing.clients import TracingSession
+from tracing.flask_app import install_tracing
 
-# Node configurations
-NODES = {
-    'node_a': {
-        'url': 'http://localhost:8001',
-    },
-    'node_b': {
-        'url': 'http://localhost:8002',
-    }
-}
+app = Flask(__name__)
+install_diagnostics(app)
+tracer = install_tracing(app, "fileapp")
 
 # Shared storage path
 STORAGE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "shared_storage")
 os.makedirs(STORAGE_PATH, exist_ok=True)
 
+# Keep-alive connections to the nodes
+http = TracingSession(tracer)
+
+_active_node = {"name": None, "checked_at": 0.0}
+
 def get_active_node():
-    """Get the first available node."""
+    """Get the first available node.
+
+    The result is reused for ACTIVE_NODE_TTL seconds so requests don't each
+    pay for a round of health checks.
+    """
+    cached = _active_node["name"]
+    if cached and time.monotonic() - _active_node["checked_at"] < ACTIVE_NODE_TTL:
+        return cached, NODES[cached]
+
     for node_name, node_info in NODES.items():
         try:
-            response = requests.get(f"{node_info['url']}/health")
+            response = http.get(f"{node_info['url']}/health", timeout=2)
             if response.status_code == 200:
+                _active_node.update(name=node_name, checked_at=time.monotonic())
                 return node_name, node_info
         except requests.RequestException:
             continue
+    _active_node["name"] = None
     return None, None
 
 @app.route('/')
 def index():
-    """Display file list and upload form."""
+    """Display a folder's files and subfolders and the upload form."""
     node_name, node_info = get_active_node()
     if not node_info:
         return render_template('error.html', message="No active nodes available")
 
+    folder = request.args.get('folder', '').strip('/')
     try:
-        response = requests.get(f"{node_info['url']}/files")
-        files = response.json()['files']
-        return render_template('index.html', files=files, active_node=node_name)
+        response = http.get(f"{node_info['url']}/files", params={'folder': folder})
+        if response.status_code == 404 and folder:
+            # Folders disappear with their last file
+            return redirect(url_for('index', folder=os.path.dirname(folder)))
+        if response.status_code != 200:
+            return render_template('error.html', message=f"Cannot list {folder or 'files'}: {response.text}")
+        listing = response.json()
+        return render_template('index.html', files=listing['files'], folders=listing['folders'],
+                               folder=folder, active_node=node_name)
     except requests.RequestException as e:
         return render_template('error.html', message=str(e))
 
@@ -56,20 +81,20 @@ def upload_file():
         return redirect(url_for('index'))
     
     file = request.files['file']
+    folder = request.form.get('folder', '').strip('/')
     if file.filename == '':
-        return redirect(url_for('index'))
+        return redirect(url_for('index', folder=folder))
 
+    # Sent in resumable chunks so a failover mid-upload continues on the partner
+    node_urls = [node_info['url']] + [info['url'] for name, info in NODES.items() if name != node_name]
+    name = f"{folder}/{os.path.basename(file.filename)}" if folder else file.filename
     try:
-        files = {'file': (file.filename, file.stream, file.content_type)}
-        response = requests.post(f"{node_info['url']}/files/upload", files=files)
-        if response.status_code == 200:
-            return redirect(url_for('index'))
-        else:
-            return render_template('error.html', message="Upload failed")
-    except requests.RequestException as e:
-        return render_template('error.html', message=str(e))
+        resumable_upload(node_urls, file.stream, name, session=http)
+        return redirect(url_for('index', folder=folder))
+    except UploadFailed as e:
+        return render_template('error.html', message=f"Upload failed: {e}")
 
-@app.route('/download/<filename>')
+@app.route('/download/<path:filename>')
 def download_file(filename):
     """Handle file download."""
     node_name, node_info = get_active_node()
@@ -77,19 +102,19 @@ def download_file(filename):
         return jsonify({"error": "No active nodes available"}), 503
 
     try:
-        response = requests.get(f"{node_info['url']}/files/{filename}", stream=True)
+        response = http.get(f"{node_info['url']}/files/{filename}", stream=True)
         if response.status_code == 200:
             temp = tempfile.NamedTemporaryFile(delete=False)
             for chunk in response.iter_content(chunk_size=8192):
                 temp.write(chunk)
             temp.close()
-            return send_file(temp.name, download_name=filename, as_attachment=True)
+            return send_file(temp.name, download_name=os.path.basename(filename), as_attachment=True)
         else:
             return render_template('error.html', message="Download failed")
     except requests.RequestException as e:
         return render_template('error.html', message=str(e))
 
-@app.route('/delete/<filename>')
+@app.route('/delete/<path:filename>')
 def delete_file(filename):
     """Handle file deletion."""
     node_name, node_info = get_active_node()
@@ -97,10 +122,75 @@ def delete_file(filename):
         return jsonify({"error": "No active nodes available"}), 503
 
     try:
-        response = requests.delete(f"{node_info['url']}/files/{filename}")
+        response = http.delete(f"{node_info['url']}/files/{filename}")
+        # Back to the folder the file was in, or its nearest remaining parent
+        return redirect(url_for('index', folder=os.path.dirname(filename)))
+    except requests.RequestException as e:
+        return render_template('error.html', message=str(e))
+
+@app.route('/upload-archive', methods=['POST'])
+def upload_archive():
+    """Upload a tar archive that the node unpacks into storage."""
+    node_name, node_info = get_active_node()
+    if not node_info:
+        return jsonify({"error": "No active nodes available"}), 503
+
+    archive = request.files.get('archive')
+    if archive is None or archive.filename == '':
+        return redirect(url_for('index'))
+
+    try:
+        response = http.post(
+            f"{node_info['url']}/bulk/archive",
+            data=archive.stream,
+            headers={'Content-Type': archive.content_type or 'application/x-tar'}
+        )
+        if response.status_code == 200:
+            return redirect(url_for('index'))
+        else:
+            return render_template('error.html', message="Archive upload failed")
+    except requests.RequestException as e:
+        return render_template('error.html', message=str(e))
+
+@app.route('/download-archive', methods=['POST'])
+def download_archive():
+    """Stream a tar archive of the selected files, or of files matching a prefix."""
+    node_name, node_info = get_active_node()
+    if not node_info:
+        return jsonify({"error": "No active nodes available"}), 503
+
+    params = [('name', name) for name in request.form.getlist('names')]
+    if request.form.get('prefix'):
+        params.append(('prefix', request.form['prefix']))
+
+    try:
+        response = http.get(f"{node_info['url']}/bulk/archive", params=params, stream=True)
+        if response.status_code != 200:
+            response.close()
+            return render_template('error.html', message="Archive download failed")
+        # Passed through chunk by chunk, never buffered in a temp file
+        return Response(
+            stream_with_context(response.iter_content(chunk_size=64 * 1024)),
+            mimetype='application/x-tar',
+            headers={'Content-Disposition': 'attachment; filename="files.tar"'}
+        )
+    except requests.RequestException as e:
+        return render_template('error.html', message=str(e))
+
+@app.route('/delete-selected', methods=['POST'])
+def delete_selected():
+    """Delete the selected files, or files matching a prefix, in one request."""
+    node_name, node_info = get_active_node()
+    if not node_info:
+        return jsonify({"error": "No active nodes available"}), 503
+
+    body = {'names': request.form.getlist('names'), 'prefix': request.form.get('prefix') or None}
+    try:
+        http.post(f"{node_info['url']}/bulk/delete", json=body)
         return redirect(url_for('index'))
     except requests.RequestException as e:
         return render_template('error.html', message=str(e))
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True) 
\ No newline at end of file
+    # The debug reloader runs a second copy of the app, so it is opt-in
+    app.run(host='0.0.0.0', port=PORT, debug=os.environ.get('ONTAP_FILEAPP_DEBUG') == '1') 
\ No newline at end of file
@@ -0,0 +1,239 @@
+import asyncio
+import os
+import sys
+import time
+from typing import Optional
+
+import aiohttp
+import uvicorn
+from fastapi import FastAPI, File, Form, Request, UploadFile
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse
+from fastapi.templating import Jinja2Templates
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client.uploads import UploadFailed, async_resumable_upload
+from diagnostics.asgi import install_diagnostics
+from fileapp.config import ACTIVE_NODE_TTL, NODES, PORT
+from tracing.asgi import install_tracing
+from tracing.clients import aiohttp_trace_config
+
+# Connections to the nodes shared by all requests; excess requests wait for one
+NODE_CONNECTIONS = int(os.environ.get("ONTAP_FILEAPP_NODE_CONNECTIONS", "100"))
+STREAM_CHUNK_SIZE = 64 * 1024
+
+app = FastAPI(title="ONTAP File Access")
+install_diagnostics(app)
+tracer = install_tracing(app, "fileapp")
+templates = Jinja2Templates(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates"))
+
+http: Optional[aiohttp.ClientSession] = None
+_active_node = {"name": None, "checked_at": 0.0}
+
+@app.on_event("startup")
+async def open_client():
+    global http
+    # Compressed downloads are passed on to the browser still compressed
+    http = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=NODE_CONNECTIONS), auto_decompress=False,
+                                 trace_configs=[aiohttp_trace_config(tracer)])
+
+@app.on_event("shutdown")
+async def close_client():
+    await http.close()
+
+async def get_active_node():
+    """Get the first available node, reusing the answer for ACTIVE_NODE_TTL seconds."""
+    cached = _active_node["name"]
+    if cached and time.monotonic() - _active_node["checked_at"] < ACTIVE_NODE_TTL:
+        return cached, NODES[cached]
+
+    for node_name, node_info in NODES.items():
+        try:
+            async with http.get(f"{node_info['url']}/health", timeout=aiohttp.ClientTimeout(total=2)) as response:
+                if response.status == 200:
+                    _active_node.update(name=node_name, checked_at=time.monotonic())
+                    return node_name, node_info
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            continue
+    _active_node["name"] = None
+    return None, None
+
+def no_active_nodes() -> JSONResponse:
+    return JSONResponse({"error": "No active nodes available"}, status_code=503)
+
+def error_page(request: Request, message: str):
+    return templates.TemplateResponse("error.html", {"request": request, "message": message})
+
+def to_index(request: Request, folder: str = "") -> RedirectResponse:
+    url = request.url_for("index")
+    if folder:
+        url = url.include_query_params(folder=folder)
+    return RedirectResponse(url, status_code=302)
+
+async def stream_from_node(request: Request, url: str, params=None, media_type: Optional[str] = None,
+                           headers: Optional[dict] = None, failure: str = "Download failed"):
+    """Pass a node response through chunk by chunk, holding one chunk at a time.
+
+    The node compresses the body only with an encoding the browser accepts.
+    """
+    try:
+        response = await http.get(url, params=params,
+                                  headers={"Accept-Encoding": request.headers.get("accept-encoding", "identity")})
+    except aiohttp.ClientError as e:
+        return error_page(request, str(e))
+    if response.status != 200:
+        response.release()
+        return error_page(request, failure)
+
+    async def body():
+        try:
+            async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                yield chunk
+        finally:
+            response.release()
+
+    headers = dict(headers or {})
+    if "Content-Encoding" in response.headers:
+        headers["Content-Encoding"] = response.headers["Content-Encoding"]
+        headers["Vary"] = "Accept-Encoding"
+    return StreamingResponse(body(), media_type=media_type or response.content_type, headers=headers)
+
+@app.get("/")
+async def index(request: Request, folder: str = ""):
+    """Display a folder's files and subfolders and the upload form."""
+    node_name, node_info = await get_active_node()
+    if not node_info:
+        return error_page(request, "No active nodes available")
+
+    folder = folder.strip("/")
+    try:
+        async with http.get(f"{node_info['url']}/files", params={"folder": folder}) as response:
+            if response.status == 404 and folder:
+                # Folders disappear with their last file
+                return to_index(request, os.path.dirname(folder))
+            if response.status != 200:
+                return error_page(request, f"Cannot list {folder or 'files'}: {await response.text()}")
+            listing = await response.json()
+        return templates.TemplateResponse("index.html", {
+            "request": request,
+            "files": listing['files'],
+            "folders": listing['folders'],
+            "folder": folder,
+            "active_node": node_name
+        })
+    except aiohttp.ClientError as e:
+        return error_page(request, str(e))
+
+@app.post("/upload")
+async def upload_file(request: Request, file: UploadFile = File(...), folder: str = Form("")):
+    """Handle file upload."""
+    node_name, node_info = await get_active_node()
+    if not node_info:
+        return no_active_nodes()
+    folder = folder.strip("/")
+    if not file.filename:
+        return to_index(request, folder)
+
+    # The form upload is spooled to disk past 1MB, and sent on in resumable chunks
+    node_urls = [node_info['url']] + [info['url'] for name, info in NODES.items() if name != node_name]
+    name = f"{folder}/{os.path.basename(file.filename)}" if folder else file.filename
+    try:
+        await async_resumable_upload(http, node_urls, file.file, name)
+        return to_index(request, folder)
+    except UploadFailed as e:
+        return error_page(request, f"Upload failed: {e}")
+
+@app.get("/download/{filename:path}")
+async def download_file(request: Request, filename: str):
+    """Handle file download."""
+    node_name, node_info = await get_active_node()
+    if not node_info:
+        return no_active_nodes()
+
+    return await stream_from_node(
+        request,
+        f"{node_info['url']}/files/{filename}",
+        headers={"Content-Disposition": f'attachment; filename="{os.path.basename(filename)}"'}
+    )
+
+@app.get("/delete/{filename:path}")
+async def delete_file(request: Request, filename: str):
+    """Handle file deletion."""
+    node_name, node_info = await get_active_node()
+    if not node_info:
+        return no_active_nodes()
+
+    try:
+        async with http.delete(f"{node_info['url']}/files/{filename}") as response:
+            await response.read()
+        # Back to the folder the file was in, or its nearest remaining parent
+        return to_index(request, os.path.dirname(filename))
+    except aiohttp.ClientError as e:
+        return error_page(request, str(e))
+
+@app.post("/upload-archive")
+async def upload_archive(request: Request, archive: UploadFile = File(...)):
+    """Upload a tar archive that the node unpacks into storage."""
+    node_name, node_info = await get_active_node()
+    if not node_info:
+        return no_active_nodes()
+    if not archive.filename:
+        return to_index(request)
+
+    try:
+        async with http.post(
+            f"{node_info['url']}/bulk/archive",
+            data=archive.file,
+            headers={"Content-Type": archive.content_type or "application/x-tar"}
+        ) as response:
+            await response.read()
+            if response.status == 200:
+                return to_index(request)
+            return error_page(request, "Archive upload failed")
+    except aiohttp.ClientError as e:
+        return error_page(request, str(e))
+
+@app.post("/download-archive")
+async def download_archive(request: Request):
+    """Stream a tar archive of the selected files, or of files matching a prefix."""
+    node_name, node_info = await get_active_node()
+    if not node_info:
+        return no_active_nodes()
+
+    form = await request.form()
+    params = [('name', name) for name in form.getlist('names')]
+    if form.get('prefix'):
+        params.append(('prefix', form['prefix']))
+    return await stream_from_node(
+        request,
+        f"{node_info['url']}/bulk/archive",
+        params=params,
+        media_type="application/x-tar",
+        headers={"Content-Disposition": 'attachment; filename="files.tar"'},
+        failure="Archive download failed"
+    )
+
+@app.post("/delete-selected")
+async def delete_selected(request: Request):
+    """Delete the selected files, or files matching a prefix, in one request."""
+    node_name, node_info = await get_active_node()
+    if not node_info:
+        return no_active_nodes()
+
+    form = await request.form()
+    body = {'names': form.getlist('names'), 'prefix': form.get('prefix') or None}
+    try:
+        async with http.post(f"{node_info['url']}/bulk/delete", json=body) as response:
+            await response.read()
+        return to_index(request)
+    except aiohttp.ClientError as e:
+        return error_page(request, str(e))
+
+if __name__ == "__main__":
+    workers = int(os.environ.get("ONTAP_FILEAPP_WORKERS", "1"))
+    if workers > 1:
+        uvicorn.run("asgi_app:app", app_dir=os.path.dirname(os.path.abspath(__file__)),
+                    host="0.0.0.0", port=PORT, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=PORT)
@@ -0,0 +1,16 @@
+import os
+
+# Node configurations
+NODES = {
+    'node_a': {
+        'url': os.environ.get('ONTAP_NODE_A_URL', 'http://localhost:8001'),
+    },
+    'node_b': {
+        'url': os.environ.get('ONTAP_NODE_B_URL', 'http://localhost:8002'),
+    }
+}
+
+PORT = int(os.environ.get('ONTAP_FILEAPP_PORT', '5000'))
+
+# Seconds a healthy node is reused before its health is checked again
+ACTIVE_NODE_TTL = float(os.environ.get("ONTAP_ACTIVE_NODE_TTL", "2"))
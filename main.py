@@ -12,9 +12,12 @@ import signal
 import psutil
 import asyncio
 
+from diagnostics.asgi import install_diagnostics
+
 console = Console()
 processes = []
 app = FastAPI()
+install_diagnostics(app)
 shutdown_event = Event()
 
 def kill_proc_tree(pid, include_parent=True):
@@ -52,11 +55,12 @@ def kill_proc_tree(pid, include_parent=True):
     except psutil.NoSuchProcess:
         pass
 
-def start_component(command, name, new_console=True):
+def start_component(command, name, new_console=True, env=None):
     """Start a component and return its process."""
     try:
         process = subprocess.Popen(
             command,
+            env=dict(os.environ, **env) if env else None,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True,
@@ -112,11 +116,19 @@ def set_window_title(title):
 
 @click.command()
 @click.option('--debug/--no-debug', default=False, help='Run in debug mode')
-def main(debug):
+@click.option('--node-workers', default=1, help='uvicorn worker processes per node')
+@click.option('--fileapp-mode', type=click.Choice(['async', 'flask']), default='async',
+              help='Serve the file application with uvicorn (async) or the Flask development server')
+@click.option('--trace/--no-trace', default=False, help='Record request traces under data/traces')
+def main(debug, node_workers, fileapp_mode, trace):
     """Start the ONTAP HA Pair Simulator"""
     set_window_title("ONTAP HA Pair Simulator - Main Controller")
     console.print("[bold blue]Starting ONTAP HA Pair Simulator...[/bold blue]")
 
+    # Inherited by every component started below
+    if trace:
+        os.environ["ONTAP_TRACING"] = "1"
+
     # Start control server in a separate thread
     control_thread = Thread(target=run_control_server, daemon=True)
     control_thread.start()
@@ -124,16 +136,25 @@ def main(debug):
     # Give the control server a moment to start
     time.sleep(1)
 
+    # Start Mediator first so Node A can take ownership of shared storage
+    mediator = start_component(
+        ["python", "mediator/mediator.py"],
+        "Mediator"
+    )
+
     # Start Node A
+    node_env = {"ONTAP_NODE_WORKERS": str(node_workers)}
     node_a = start_component(
         ["python", "node_a/node.py"],
-        "Node A"
+        "Node A",
+        env=node_env
     )
 
     # Start Node B
     node_b = start_component(
         ["python", "node_b/node.py"],
-        "Node B"
+        "Node B",
+        env=node_env
     )
 
     # Start HA Controller
@@ -144,12 +165,13 @@ def main(debug):
 
     # Start File Application (without new console)
     fileapp = start_component(
-        ["python", "fileapp/app.py"],
+        ["python", "fileapp/asgi_app.py" if fileapp_mode == 'async' else "fileapp/app.py"],
         "File Application",
-        new_console=False
+        new_console=False,
+        env={"ONTAP_FILEAPP_DEBUG": "1" if debug else "0"}
     )
 
-    if not all([node_a, node_b, controller, fileapp]):
+    if not all([mediator, node_a, node_b, controller, fileapp]):
         console.print("[red]Failed to start all components. Shutting down...[/red]")
         cleanup_processes()
         sys.exit(1)
@@ -158,7 +180,10 @@ def main(debug):
     console.print("\nAvailable endpoints:")
     console.print("- Node A: http://localhost:8001")
     console.print("- Node B: http://localhost:8002")
+    console.print("- Mediator: http://localhost:8003")
     console.print("- File Application: http://localhost:5000")
+    console.print("- Control server: http://localhost:8000 (/debug endpoints)")
+    console.print("- HA Controller admin: http://localhost:8004 (/debug and /replication endpoints)")
     console.print("\nUse the CLI to interact with the simulator:")
     console.print("python client/cli.py --help")
 
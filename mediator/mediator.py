@@ -0,0 +1,143 @@
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+import uvicorn
+import json
+import os
+import ctypes
+import sys
+import time
+from typing import Optional
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tracing.asgi import install_tracing
+
+# Set console window title
+if os.name == 'nt':  # Windows
+    ctypes.windll.kernel32.SetConsoleTitleW("ONTAP HA Pair Simulator - Mediator")
+
+# Epochs are persisted so a restarted mediator never reissues an old one
+STATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "mediator", "epoch.json")
+LEASE_SECONDS = float(os.environ.get("ONTAP_LEASE_SECONDS", "2"))
+
+app = FastAPI(title="ONTAP Mediator")
+# Lease renewals are untraced background traffic; only record calls made within a trace
+install_tracing(app, "mediator", traced_only=True)
+
+class Mediator:
+    """Tie-breaker issuing ownership epochs for the shared storage.
+
+    Only one node holds a lease at a time. A node that wants to take over
+    while another holds the lease can preempt it: the owner's renewals are
+    refused from then on and the new epoch is granted once the old lease has
+    expired, so the old owner has stopped writing before the new one starts.
+    """
+
+    def __init__(self, state_path: str = STATE_PATH, lease_s: float = LEASE_SECONDS):
+        self.state_path = state_path
+        self.lease_s = lease_s
+        self.epoch = 0
+        self.owner: Optional[str] = None
+        self.pending: Optional[str] = None
+        self.pending_expires = 0.0
+        self.lease_expires = 0.0
+        if os.path.exists(state_path):
+            with open(state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.epoch = state["epoch"]
+            self.owner = state["owner"]
+            # The previous owner may still hold a lease issued before the restart
+            self.lease_expires = time.monotonic() + lease_s
+
+    def _persist(self):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"epoch": self.epoch, "owner": self.owner}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.state_path)
+
+    def _pending(self) -> Optional[str]:
+        """Node waiting to take over, forgotten if it stops asking."""
+        if self.pending and time.monotonic() >= self.pending_expires:
+            self.pending = None
+        return self.pending
+
+    def _grant(self):
+        self.lease_expires = time.monotonic() + self.lease_s
+        return {"epoch": self.epoch, "owner": self.owner, "lease_s": self.lease_s}
+
+    def _refuse(self):
+        return JSONResponse(status_code=409, content={
+            "epoch": self.epoch,
+            "owner": self.owner,
+            "pending": self._pending(),
+            "retry_after": max(0.0, self.lease_expires - time.monotonic())
+        })
+
+    def acquire(self, node: str, preempt: bool):
+        now = time.monotonic()
+        pending = self._pending()
+        if self.owner == node and now < self.lease_expires and pending in (None, node):
+            self.pending = None
+            return self._grant()
+        if self.owner is None or now >= self.lease_expires:
+            if pending not in (None, node):
+                # Another node is already waiting to take over
+                return self._refuse()
+            self.epoch += 1
+            self.owner = node
+            self.pending = None
+            self._persist()
+            return self._grant()
+        if preempt and pending in (None, node):
+            self.pending = node
+            self.pending_expires = now + 2 * self.lease_s
+        return self._refuse()
+
+    def renew(self, node: str, epoch: int):
+        if self.owner == node and self.epoch == epoch and self._pending() is None:
+            return self._grant()
+        return self._refuse()
+
+    def release(self, node: str, epoch: int):
+        if self.owner == node and self.epoch == epoch:
+            self.owner = None
+            self.lease_expires = 0.0
+            self._persist()
+        return {"epoch": self.epoch, "owner": self.owner}
+
+    def status(self):
+        return {
+            "epoch": self.epoch,
+            "owner": self.owner,
+            "pending": self._pending(),
+            "lease_remaining_s": max(0.0, self.lease_expires - time.monotonic())
+        }
+
+mediator = Mediator()
+
+@app.get("/status")
+async def get_status():
+    """Current ownership of the shared storage."""
+    return mediator.status()
+
+@app.post("/lease/acquire")
+async def acquire_lease(node: str, preempt: bool = False):
+    """Grant ownership to a node, or refuse while another node's lease is valid."""
+    return mediator.acquire(node, preempt)
+
+@app.post("/lease/renew")
+async def renew_lease(node: str, epoch: int):
+    """Extend the owner's lease unless a takeover is pending."""
+    return mediator.renew(node, epoch)
+
+@app.post("/lease/release")
+async def release_lease(node: str, epoch: int):
+    """Give up ownership voluntarily, e.g. on failover or giveback."""
+    return mediator.release(node, epoch)
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="0.0.0.0", port=8003)
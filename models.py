@@ -23,6 +23,14 @@ class LogicalInterface(BaseModel):
     protocol: str
     port: int
 
+class QoSPolicy(BaseModel):
+    """Throughput limits shared by the volumes attached to the policy group."""
+    name: str
+    max_iops: Optional[int] = None
+    max_mbps: Optional[float] = None
+    min_iops: Optional[int] = None
+    min_mbps: Optional[float] = None
+
 class Volume(BaseModel):
     name: str
     size_gb: int
@@ -31,6 +39,7 @@ class Volume(BaseModel):
     owner_node: str
     is_replica: bool = False
     last_sync: Optional[datetime] = None
+    qos_policy: Optional[str] = None
 
 class NVRAMEntry(BaseModel):
     timestamp: datetime
@@ -46,6 +55,7 @@ class Node(BaseModel):
     volumes: List[Volume] = []
     lifs: List[LogicalInterface] = []
     nvram_log: List[NVRAMEntry] = []
+    qos_policies: List[QoSPolicy] = []
     last_heartbeat: Optional[datetime] = None
 
 class FailoverEvent(BaseModel):
@@ -1,27 +1,65 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File, Header, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
 import uvicorn
 from datetime import datetime
 import sys
 import os
 import ctypes
-from pathlib import Path
 import shutil
+import asyncio
+from typing import Optional
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from diagnostics.asgi import install_diagnostics
+from tracing.asgi import install_tracing
 from models import Node, NodeStatus, Volume, LogicalInterface, NVRAMEntry, LIFStatus
+from wire_format import AckRecord, HealthRecord, NodeRecord, NVRAMSyncRecord, StatusRecord
+from node_common.bulk import create_bulk_router
+from node_common.compression import CompressionManager, create_compression_router
+from node_common.faults import FaultInjector, create_fault_router
+from node_common.giveback import ChangeLog, create_giveback_router, install_request_drain, resync_changes
+from node_common.fencing import FencingGuard
+from node_common.namespace import Namespace, create_namespace_router, join
+from node_common.negotiate import read_message, wire_response
+from node_common.qos import QoSManager, create_qos_router
+from node_common.read_cache import ReadCache, create_cache_router
+from node_common.shared_state import STATE_PATH_ENV, create_node_state, reset_shared_state
+from node_common.uploads import UPLOAD_PATH, UploadSessionStore, create_upload_router
+from node_common.volume_move import VolumeMover, create_volume_router
 
 # Set console window title
 if os.name == 'nt':  # Windows
     ctypes.windll.kernel32.SetConsoleTitleW("ONTAP HA Pair Simulator - Node A")
 
-# Define storage path
-STORAGE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "shared_storage")
+# Define storage path, overridable so benchmarks can run against scratch storage
+STORAGE_PATH = os.environ.get(
+    "ONTAP_STORAGE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "shared_storage")
+)
 os.makedirs(STORAGE_PATH, exist_ok=True)
 
+# Files live in hashed shard directories under the storage path, found through a shared index
+namespace = Namespace(STORAGE_PATH)
+
+# State file shared by the workers when running with ONTAP_NODE_WORKERS > 1
+NODE_STATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "node_a", "node_state.mmap")
+
+# Names of this node's hot files, and the partner's to warm from on takeover
+HOT_SET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "node_a", "hot_files.json")
+PARTNER_HOT_SET_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "node_b", "hot_files.json")
+
+# Records of volume moves started on this node
+VOLUME_MOVES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "node_a", "volume_moves")
+
+# Partner node, told when a volume moved to it changes hands
+PARTNER_URL = os.environ.get("ONTAP_PARTNER_URL", "http://localhost:8002")
+
+# Files changed while serving for the partner, read by the partner on giveback
+CHANGE_LOG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "node_a", "takeover_changes.log")
+PARTNER_CHANGE_LOG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "node_b", "takeover_changes.log")
+
 app = FastAPI(title="ONTAP Node A")
 
 # Enable CORS
@@ -33,8 +71,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize node state
-node = Node(
+# Profiling, request timing and loop lag under /debug, idle until asked
+install_diagnostics(app)
+
+# Server spans for requests, continuing the caller's traceparent
+tracer = install_tracing(app, "node-a")
+
+# Fault injection hooks for chaos testing
+faults = FaultInjector()
+app.include_router(create_fault_router(faults))
+
+# Inline compression for volumes that ask for it, and compressed downloads
+compression = CompressionManager(namespace)
+app.include_router(create_compression_router(namespace, compression))
+
+# In-memory cache for hot files in the read path, holding them decompressed
+read_cache = ReadCache(open_file=compression.open)
+app.include_router(create_cache_router(read_cache))
+
+# Initialize node state, shared between workers when running with several
+state = create_node_state(Node(
     name="node-a",
     role="primary",
     partner_node="node-b",
@@ -57,124 +113,245 @@ node = Node(
             port=2049
         )
     ]
-)
+))
+
+# Ownership of shared storage, granted by the mediator
+fencing = FencingGuard(state.node.name, lease_store=state, tracer=tracer)
+
+# Per-volume QoS policy groups throttling the file paths below
+qos = QoSManager(state)
+app.include_router(create_qos_router(state, qos))
+
+# Namespace stats, migration progress and index repair
+app.include_router(create_namespace_router(namespace))
+
+# Change log kept during a takeover, and draining of file writes before a giveback
+changes = ChangeLog(CHANGE_LOG_PATH, state, fencing)
+namespace.watch(changes.record)
+drain = install_request_drain(app, state)
+app.include_router(create_giveback_router(changes, drain))
+
+# Non-disruptive volume moves to the partner
+mover = VolumeMover(VOLUME_MOVES_PATH, namespace, state, fencing, PARTNER_URL, tracer)
+app.include_router(create_volume_router(mover, state, fencing))
+
+# Archive download and upload and batch delete for moving many files at once
+app.include_router(create_bulk_router(namespace, state, fencing, faults, read_cache, qos, compression))
+
+# Resumable uploads; sessions live on shared storage so the partner can finish them
+uploads = UploadSessionStore(UPLOAD_PATH, namespace)
+app.include_router(create_upload_router(uploads, state, fencing, faults, read_cache, qos))
+
+@app.on_event("startup")
+async def start_background_tasks():
+    """Keep the storage lease renewed and the hot set saved in the background."""
+    asyncio.create_task(fencing.maintain())
+    asyncio.create_task(read_cache.persist_hot_set(HOT_SET_PATH, namespace.name_of))
+    # Moves files left in the old flat layout into shards while this node owns the storage
+    asyncio.create_task(namespace.migrate(
+        lambda: fencing.owns_storage() and state.node.status != NodeStatus.FAILED
+    ))
+    # The primary owns the shared storage until a takeover
+    asyncio.create_task(fencing.acquire(timeout=30))
 
 @app.get("/health")
-async def health_check():
+async def health_check(request: Request):
     """Health check endpoint for the node."""
+    node = state.node
     if node.status == NodeStatus.FAILED:
         raise HTTPException(status_code=503, detail="Node is in failed state")
-    return {
-        "status": node.status,
-        "last_heartbeat": node.last_heartbeat,
-        "role": node.role
-    }
+    return wire_response(request, HealthRecord(node.status, node.last_heartbeat, node.role))
 
 @app.get("/status")
-async def get_status():
+async def get_status(request: Request):
     """Get detailed node status."""
-    return {
-        "node": node.dict(),
-        "volumes": [vol.dict() for vol in node.volumes],
-        "lifs": [lif.dict() for lif in node.lifs],
-        "nvram_entries": len(node.nvram_log)
-    }
+    node = state.node
+    return wire_response(request, StatusRecord(NodeRecord.from_model(node), len(node.nvram_log), fencing.status()))
 
 @app.post("/failover")
-async def initiate_failover():
+async def initiate_failover(request: Request):
     """Simulate node failure and initiate failover."""
-    node.status = NodeStatus.FAILED
-    # Move all LIFs to partner node
-    for lif in node.lifs:
-        lif.status = LIFStatus.MIGRATING
-        lif.current_node = node.partner_node
-    return {"message": "Failover initiated", "timestamp": datetime.now()}
+    with state.update() as node:
+        node.status = NodeStatus.FAILED
+        # Move all LIFs to partner node
+        for lif in node.lifs:
+            lif.status = LIFStatus.MIGRATING
+            lif.current_node = node.partner_node
+    # Let the partner take ownership of the storage without waiting for the lease
+    await fencing.release()
+    return wire_response(request, AckRecord("Failover initiated", datetime.now()))
 
 @app.post("/nvram/sync")
-async def sync_nvram(entry: NVRAMEntry):
+async def sync_nvram(request: Request, epoch: Optional[int] = Header(None, alias="X-Fencing-Epoch")):
     """Simulate NVRAM synchronization with partner node."""
-    node.nvram_log.append(entry)
-    return {"message": "NVRAM entry synchronized", "sequence_no": entry.sequence_no}
+    fencing.check_epoch(epoch)
+    entry = await read_message(request, NVRAMSyncRecord, NVRAMEntry)
+    with state.update() as node:
+        node.nvram_log.append(entry)
+    return wire_response(request, AckRecord("NVRAM entry synchronized", sequence_no=entry.sequence_no))
 
 @app.post("/giveback")
-async def initiate_giveback():
+async def initiate_giveback(request: Request):
     """Initiate giveback to restore normal operations."""
-    if node.status != NodeStatus.FAILED:
+    if state.node.status != NodeStatus.FAILED:
         raise HTTPException(status_code=400, detail="Node must be in failed state for giveback")
     
-    node.status = NodeStatus.GIVEBACK
-    # Move LIFs back to home node
-    for lif in node.lifs:
-        if lif.home_node == node.name:
-            lif.status = LIFStatus.MIGRATING
-            lif.current_node = node.name
+    # The partner is fenced off before this node resumes writing
+    if not await fencing.acquire(preempt=True):
+        raise HTTPException(status_code=503, detail="Could not reacquire shared storage ownership")
+    
+    with state.update() as node:
+        node.status = NodeStatus.GIVEBACK
+        # Move LIFs back to home node
+        for lif in node.lifs:
+            if lif.home_node == node.name:
+                lif.status = LIFStatus.MIGRATING
+                lif.current_node = node.name
+    
+    # Catch up on only the files the partner changed while serving for this node
+    try:
+        changes.last_resync = await resync_changes(PARTNER_CHANGE_LOG_PATH, namespace, read_cache)
+    except OSError as e:
+        with state.update() as node:
+            node.status = NodeStatus.FAILED
+        await fencing.release()
+        raise HTTPException(status_code=500, detail=f"Resync after takeover failed: {e}")
     
-    node.status = NodeStatus.HEALTHY
-    return {"message": "Giveback completed", "timestamp": datetime.now()}
+    with state.update() as node:
+        for lif in node.lifs:
+            if lif.home_node == node.name:
+                lif.status = LIFStatus.ONLINE
+        node.status = NodeStatus.HEALTHY
+    
+    # Preload what the partner served while it owned the storage
+    asyncio.create_task(read_cache.warm(namespace.locate, PARTNER_HOT_SET_PATH))
+    resync = changes.last_resync
+    return wire_response(request, AckRecord(
+        f"Giveback completed: resynced {resync['changes']} changed files in {resync['resync_ms']:.1f}ms",
+        datetime.now()
+    ))
 
 @app.get("/files")
-async def list_files():
-    """List all files in storage."""
-    if node.status == NodeStatus.FAILED:
+async def list_files(folder: str = "", recursive: bool = False, limit: Optional[int] = Query(None, gt=0),
+                     after: Optional[str] = None, volume: Optional[str] = Header(None, alias="X-Volume")):
+    """List the files and subfolders of a folder (the top level by default).
+
+    With ``limit`` files are returned a page at a time; pass the returned
+    ``next`` as ``after`` for the following page.
+    """
+    if state.node.status == NodeStatus.FAILED:
         raise HTTPException(status_code=503, detail="Node is in failed state")
     
-    try:
-        files = []
-        for file_path in Path(STORAGE_PATH).glob("*"):
-            if file_path.is_file():
-                files.append({
-                    "name": file_path.name,
-                    "size": file_path.stat().st_size,
-                    "modified": datetime.fromtimestamp(file_path.stat().st_mtime)
-                })
-        return {"files": files}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    async with qos.throttle(volume):
+        try:
+            faults.storage_delay()
+            listing = namespace.list(folder, recursive, limit, after)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Folder not found")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        files = [
+            {"name": name, "size": size, "modified": datetime.fromtimestamp(mtime)}
+            for name, size, mtime in listing["files"]
+        ]
+        return {"files": files, "folders": listing["folders"], "next": listing["next"]}
 
 @app.post("/files/upload")
-async def upload_file(file: UploadFile = File(...)):
-    """Upload a file to storage."""
-    if node.status == NodeStatus.FAILED:
+async def upload_file(file: UploadFile = File(...), folder: str = "",
+                      volume: Optional[str] = Header(None, alias="X-Volume")):
+    """Upload a file to storage, into ``folder`` if given."""
+    if state.node.status == NodeStatus.FAILED:
         raise HTTPException(status_code=503, detail="Node is in failed state")
     
+    fencing.check_write()
     try:
-        file_path = os.path.join(STORAGE_PATH, file.filename)
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        return {"message": f"File {file.filename} uploaded successfully"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-@app.get("/files/{filename}")
-async def download_file(filename: str):
-    """Download a file from storage."""
-    if node.status == NodeStatus.FAILED:
+        name = namespace.validate(join(folder, os.path.basename(file.filename or "")))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    async with qos.throttle(volume, nbytes=file.size or 0):
+        # Partner may have taken over while the request was queued
+        fencing.check_write()
+        tmp_path = namespace.temp_file()
+        try:
+            faults.storage_delay()
+            with open(tmp_path, "wb") as buffer:
+                shutil.copyfileobj(file.file, buffer)
+            # Committing compresses the file for volumes that ask for it, which must not stall the loop
+            file_path = await asyncio.get_running_loop().run_in_executor(None, namespace.commit, name, tmp_path)
+            read_cache.invalidate(file_path)
+            return {"message": f"File {name} uploaded successfully"}
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/files/{filename:path}")
+async def download_file(request: Request, filename: str, volume: Optional[str] = Header(None, alias="X-Volume")):
+    """Download a file from storage, or a single byte range of it.
+
+    Sent gzip or zstd encoded to clients that accept it, unless the file looks incompressible.
+    """
+    if state.node.status == NodeStatus.FAILED:
         raise HTTPException(status_code=503, detail="Node is in failed state")
     
-    file_path = os.path.join(STORAGE_PATH, filename)
-    if not os.path.exists(file_path):
+    try:
+        file_path = namespace.locate(filename)
+        # Hot files are served from memory after a single stat
+        cached = read_cache.get(file_path)
+        size = len(cached.data) if cached is not None else compression.size(file_path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="File not found")
     
-    try:
-        return FileResponse(file_path, filename=filename)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    async with qos.throttle(volume, nbytes=size):
+        try:
+            if cached is None:
+                faults.storage_delay()
+                cached = read_cache.load(file_path)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="File not found")
+        
+        filename = os.path.basename(filename.rstrip("/"))
+        try:
+            return compression.file_response(file_path, filename, cached, request.headers)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="File not found")
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
-@app.delete("/files/{filename}")
-async def delete_file(filename: str):
+@app.delete("/files/{filename:path}")
+async def delete_file(filename: str, volume: Optional[str] = Header(None, alias="X-Volume")):
     """Delete a file from storage."""
-    if node.status == NodeStatus.FAILED:
+    if state.node.status == NodeStatus.FAILED:
         raise HTTPException(status_code=503, detail="Node is in failed state")
     
-    file_path = os.path.join(STORAGE_PATH, filename)
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="File not found")
-    
-    try:
-        os.remove(file_path)
+    fencing.check_write()
+    async with qos.throttle(volume):
+        fencing.check_write()
+        faults.storage_delay()
+        try:
+            file_path = namespace.remove(filename)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        if file_path is None:
+            raise HTTPException(status_code=404, detail="File not found")
+        read_cache.invalidate(file_path)
         return {"message": f"File {filename} deleted successfully"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8001) 
\ No newline at end of file
+    workers = int(os.environ.get("ONTAP_NODE_WORKERS", "1"))
+    if workers > 1:
+        # Workers are separate processes, so they share node state through a file
+        reset_shared_state(os.environ.setdefault(STATE_PATH_ENV, NODE_STATE_PATH))
+        uvicorn.run("node:app", app_dir=os.path.dirname(os.path.abspath(__file__)),
+                    host="0.0.0.0", port=8001, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8001)
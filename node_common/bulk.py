@@ -0,0 +1,296 @@
+import asyncio
+import os
+import queue
+import tarfile
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from pydantic import BaseModel
+
+from models import NodeStatus
+from node_common.compression import CompressionManager, open_stored
+from node_common.namespace import Namespace, join, normalize
+
+ARCHIVE_CHUNK_SIZE = 256 * 1024
+# Request body chunks buffered between the event loop and the extracting thread
+UPLOAD_QUEUE_CHUNKS = 64
+
+class BulkDeleteRequest(BaseModel):
+    names: List[str] = []
+    prefix: Optional[str] = None
+
+def iter_tar(namespace: Namespace, names: List[str], before_read: Callable[[], None] = lambda: None,
+             base: str = "", open_file: Callable[[str], Tuple[BinaryIO, int]] = open_stored) -> Iterator[bytes]:
+    """Stream a tar archive of ``names`` without building it on disk.
+
+    Headers are generated per member and file contents are read in chunks,
+    so memory use does not depend on the archive size. Files deleted after
+    selection are skipped. Member names are relative to the ``base`` folder
+    when one is given. Compressed files are archived decompressed.
+    """
+    written = 0
+    for name in names:
+        try:
+            f, size = open_file(namespace.locate(name))
+        except (FileNotFoundError, IsADirectoryError):
+            continue
+        with f:
+            before_read()
+            stat = os.fstat(f.fileno())
+            info = tarfile.TarInfo(name[len(base) + 1:] if base else name)
+            info.size = size
+            info.mtime = int(stat.st_mtime)
+            info.mode = 0o644
+            header = info.tobuf(format=tarfile.PAX_FORMAT)
+            yield header
+            remaining = size
+            while remaining > 0:
+                chunk = f.read(min(ARCHIVE_CHUNK_SIZE, remaining))
+                if not chunk:
+                    # Truncated while streaming; the size in the header is already sent
+                    chunk = b"\0" * remaining
+                remaining -= len(chunk)
+                yield chunk
+            padding = -size % tarfile.BLOCKSIZE
+            if padding:
+                yield b"\0" * padding
+            written += len(header) + size + padding
+
+    # End-of-archive marker, padded to a whole record like tar(1) does
+    end = 2 * tarfile.BLOCKSIZE
+    end += -(written + end) % tarfile.RECORDSIZE
+    yield b"\0" * end
+
+class ArchiveBodyReader:
+    """File-like view of a request body being received on the event loop.
+
+    ``tarfile`` reads from it in a worker thread while the handler feeds it
+    chunks, so an archive is unpacked as it arrives. The queue is bounded so
+    a slow disk applies backpressure to the client instead of buffering the
+    whole upload in memory. The handler waits for room on the event loop,
+    woken by the reading thread, so feeding never takes an executor thread
+    that a blocked reader may be waiting on.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_chunks: int = UPLOAD_QUEUE_CHUNKS):
+        self._loop = loop
+        self._queue: "queue.Queue[Optional[bytes]]" = queue.Queue(maxsize=max_chunks)
+        self._space = asyncio.Event()
+        self._buffer = b""
+        self._eof = False
+        self.abandoned = False
+
+    def _wake(self):
+        try:
+            self._loop.call_soon_threadsafe(self._space.set)
+        except RuntimeError:
+            pass  # Loop closed; nobody is waiting
+
+    async def put(self, chunk: Optional[bytes]) -> bool:
+        """Queue a chunk (None marks the end), waiting while the queue is full.
+
+        Returns False if the reader was abandoned and the chunk was dropped.
+        """
+        while not self.abandoned:
+            if self.try_put(chunk):
+                return True
+            self._space.clear()
+            # The reader may have made room between the attempt and the clear
+            if self.try_put(chunk):
+                return True
+            await self._space.wait()
+        return False
+
+    def try_put(self, chunk: Optional[bytes]) -> bool:
+        try:
+            self._queue.put_nowait(chunk)
+            return True
+        except queue.Full:
+            return False
+
+    def abandon(self):
+        """Stop feeding or consuming; the reading side sees end of stream."""
+        self.abandoned = True
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        self._queue.put_nowait(None)
+        self._wake()
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            chunk = self._queue.get()
+            self._wake()
+            if chunk is None:
+                self._eof = True
+            else:
+                self._buffer += chunk
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+def extract_archive(reader: ArchiveBodyReader, namespace: Namespace,
+                    before_write: Callable[[], None] = lambda: None, folder: str = "") -> Dict:
+    """Unpack regular files from a (optionally compressed) tar stream into their folders, under ``folder`` if given.
+
+    Runs in a worker thread; ``before_write`` is called before each file so
+    fencing and fault hooks apply per file. Each file is written aside and
+    moved into place once complete.
+    """
+    written: List[str] = []
+    skipped: List[str] = []
+    total_bytes = 0
+    try:
+        with tarfile.open(fileobj=reader, mode="r|*") as archive:
+            for member in archive:
+                try:
+                    name = namespace.validate(join(folder, member.name)) if member.isfile() else None
+                except ValueError:
+                    name = None
+                if name is None:
+                    skipped.append(member.name)
+                    continue
+                before_write()
+                source = archive.extractfile(member)
+                tmp_path = namespace.temp_file()
+                try:
+                    with open(tmp_path, "wb") as target:
+                        while True:
+                            chunk = source.read(ARCHIVE_CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            target.write(chunk)
+                    namespace.commit(name, tmp_path)
+                except BaseException:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    raise
+                written.append(name)
+                total_bytes += member.size
+    finally:
+        # Unblock the handler if we stopped before the end of the body
+        reader.abandon()
+    return {"files": written, "skipped": skipped, "bytes": total_bytes}
+
+def create_bulk_router(namespace: Namespace, state, fencing, faults, read_cache, qos,
+                       compression: CompressionManager) -> APIRouter:
+    """Multi-file endpoints that move many files in a single request."""
+    router = APIRouter(prefix="/bulk")
+
+    def check_available():
+        if state.node.status == NodeStatus.FAILED:
+            raise HTTPException(status_code=503, detail="Node is in failed state")
+
+    @router.get("/archive")
+    async def download_archive(request: Request, name: List[str] = Query([]), prefix: Optional[str] = None,
+                               base: str = "", volume: Optional[str] = Header(None, alias="X-Volume")):
+        """Stream a tar archive of the named files and/or files matching a prefix.
+
+        With ``base`` only files in that folder are included, named relative
+        to it. The archive is gzip or zstd encoded for clients that accept
+        it, unless a sample of the selected files, weighted by size, looks
+        mostly incompressible.
+        """
+        check_available()
+        try:
+            base = normalize(base)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        names = namespace.select(name, prefix)
+        if base:
+            names = [selected for selected in names if selected.startswith(base + "/")]
+        if (name or prefix) and not names:
+            raise HTTPException(status_code=404, detail="No matching files")
+        # The archive is streamed from a worker thread, so it is admitted up front as one read per file
+        size = 0
+        paths = []
+        for selected in names:
+            try:
+                paths.append(namespace.locate(selected))
+                size += compression.size(paths[-1])
+            except FileNotFoundError:
+                continue
+        async with qos.throttle(volume, ops=len(names), nbytes=size):
+            accept_encoding = request.headers.get("accept-encoding")
+            worthwhile = False
+            if compression.transfer_encoding(accept_encoding):
+                worthwhile = await asyncio.get_running_loop().run_in_executor(
+                    None, compression.files_compressible, paths)
+            return compression.encoded_response(
+                iter_tar(namespace, names, faults.storage_delay, base, compression.open),
+                accept_encoding, worthwhile,
+                media_type="application/x-tar",
+                headers={"content-disposition": 'attachment; filename="files.tar"'}
+            )
+
+    @router.post("/archive")
+    async def upload_archive(request: Request, folder: str = "",
+                             volume: Optional[str] = Header(None, alias="X-Volume")):
+        """Unpack a tar (or gzip/bzip2/xz compressed tar) body into storage as it arrives, under ``folder`` if given."""
+        check_available()
+        fencing.check_write()
+        try:
+            folder = normalize(folder)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        def before_write():
+            # Re-checked per file so a takeover mid-upload stops further writes
+            fencing.check_write()
+            faults.storage_delay()
+
+        loop = asyncio.get_running_loop()
+        reader = ArchiveBodyReader(loop)
+        extraction = loop.run_in_executor(None, extract_archive, reader, namespace, before_write, folder)
+        try:
+            async with qos.throttle(volume) as throttle:
+                async for chunk in request.stream():
+                    if not chunk:
+                        continue
+                    await throttle.admit(nbytes=len(chunk))
+                    if not await reader.put(chunk):
+                        break  # Extraction stopped early; its error is raised below
+                await reader.put(None)
+                result = await extraction
+        except tarfile.TarError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid archive: {e}")
+        except HTTPException:
+            raise
+        except Exception as e:
+            reader.abandon()
+            raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            if not extraction.done():
+                reader.abandon()
+                await asyncio.wait([extraction])
+
+        for written in result["files"]:
+            read_cache.invalidate(namespace.path(written))
+        return result
+
+    @router.post("/delete")
+    async def delete_files(body: BulkDeleteRequest, volume: Optional[str] = Header(None, alias="X-Volume")):
+        """Delete the named files and/or files matching a prefix."""
+        check_available()
+        fencing.check_write()
+        names = namespace.select(body.names, body.prefix) if body.names or body.prefix else []
+        deleted = []
+        async with qos.throttle(volume, ops=0) as throttle:
+            for name in names:
+                # One operation per file, so a large batch cannot starve other volumes
+                await throttle.admit(ops=1)
+                fencing.check_write()
+                faults.storage_delay()
+                file_path = namespace.remove(name)
+                if file_path is None:
+                    continue
+                read_cache.invalidate(file_path)
+                deleted.append(name)
+        deleted_names = set(deleted)
+        missing = sorted(name for name in body.names if name.strip("/") not in deleted_names)
+        return {"deleted": deleted, "missing": missing}
+
+    return router
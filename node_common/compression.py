@@ -0,0 +1,567 @@
+import math
+import mimetypes
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from collections import Counter
+from email.utils import formatdate
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+try:
+    import zstandard
+except ImportError:  # Optional; zlib is used without it
+    zstandard = None
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # Optional
+    lz4_frame = None
+
+MB = 1024 * 1024
+
+# Files are compressed in independent chunks, so reading part of a file only
+# decompresses the chunks it touches
+COMPRESSION_CHUNK_SIZE = int(os.environ.get("ONTAP_COMPRESSION_CHUNK_BYTES", str(64 * 1024)))
+# Bits per byte above which data is taken to be compressed already (random data is ~8)
+ENTROPY_THRESHOLD = float(os.environ.get("ONTAP_COMPRESSION_ENTROPY", "7.5"))
+ENTROPY_SAMPLE_BYTES = 4096
+# A chunk is stored as is unless compressing saves at least this fraction of it
+MIN_SAVING = 0.05
+# A file whose first chunks are all incompressible is stored as is without reading the rest
+SKIP_AFTER_CHUNKS = 2
+# Responses smaller than this are never transfer-encoded
+MIN_TRANSFER_BYTES = 1024
+# Files sampled to decide whether an archive of many is worth encoding
+ARCHIVE_SAMPLE_FILES = 8
+
+# Stored layout: header, chunks, then an index of the chunks' stored lengths
+# (the top bit marks a chunk kept uncompressed) and a trailer
+MAGIC = b"\x89ONTZ"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<5sBBI")      # magic, version, codec id, chunk size
+TRAILER = struct.Struct("<QI5s")      # logical size, chunk count, magic
+RAW_CHUNK = 1 << 31
+
+class Codec:
+    __slots__ = ("name", "id", "compress", "decompress")
+
+    def __init__(self, name: str, codec_id: int, compress: Callable[[bytes], bytes],
+                 decompress: Callable[[bytes], bytes]):
+        self.name = name
+        self.id = codec_id
+        self.compress = compress
+        self.decompress = decompress
+
+# Fastest settings: inline compression is on the write path
+CODECS: Dict[str, Codec] = {"zlib": Codec("zlib", 1, lambda data: zlib.compress(data, 1), zlib.decompress)}
+if zstandard is not None:
+    # zstandard contexts must not be used by two threads at once, and files
+    # are compressed and read from executor and threadpool threads
+    _zstd = threading.local()
+
+    def _zstd_compress(data: bytes) -> bytes:
+        if not hasattr(_zstd, "compressor"):
+            _zstd.compressor = zstandard.ZstdCompressor(level=3)
+        return _zstd.compressor.compress(data)
+
+    def _zstd_decompress(data: bytes) -> bytes:
+        if not hasattr(_zstd, "decompressor"):
+            _zstd.decompressor = zstandard.ZstdDecompressor()
+        return _zstd.decompressor.decompress(data)
+
+    CODECS["zstd"] = Codec("zstd", 2, _zstd_compress, _zstd_decompress)
+if lz4_frame is not None:
+    CODECS["lz4"] = Codec("lz4", 3, lz4_frame.compress, lz4_frame.decompress)
+CODECS_BY_ID = {codec.id: codec for codec in CODECS.values()}
+# Used when a volume is switched on without naming a codec
+DEFAULT_CODEC = next(name for name in ("zstd", "lz4", "zlib") if name in CODECS)
+
+class CompressedFileError(OSError):
+    pass
+
+def entropy(data: bytes) -> float:
+    """Shannon entropy of a sample of ``data`` in bits per byte."""
+    sample = data[:ENTROPY_SAMPLE_BYTES]
+    if not sample:
+        return 0.0
+    n = len(sample)
+    return -sum(count / n * math.log2(count / n) for count in Counter(sample).values())
+
+def compressible(data: bytes) -> bool:
+    return entropy(data) < ENTROPY_THRESHOLD
+
+def compress_file(source_path: str, target_path: str, codec: Codec,
+                  chunk_size: int = COMPRESSION_CHUNK_SIZE) -> Optional[Tuple[int, int]]:
+    """Write a chunked, compressed copy of a file. Returns its (logical, stored) sizes.
+
+    Chunks that look compressed already, or do not shrink, are stored as
+    they are. Returns None, leaving no copy, if the file would not get
+    meaningfully smaller; a file whose first chunks are incompressible is
+    given up on without reading the rest.
+    """
+    lengths: List[int] = []
+    logical = 0
+    stored = HEADER.size
+    with open(source_path, "rb") as source, open(target_path, "wb") as target:
+        target.write(HEADER.pack(MAGIC, FORMAT_VERSION, codec.id, chunk_size))
+        for chunk in iter(lambda: source.read(chunk_size), b""):
+            logical += len(chunk)
+            packed = codec.compress(chunk) if compressible(chunk) else None
+            if packed is not None and len(packed) <= len(chunk) * (1 - MIN_SAVING):
+                target.write(packed)
+                lengths.append(len(packed))
+                stored += len(packed)
+                continue
+            target.write(chunk)
+            lengths.append(len(chunk) | RAW_CHUNK)
+            stored += len(chunk)
+            if len(lengths) == SKIP_AFTER_CHUNKS and all(length & RAW_CHUNK for length in lengths):
+                logical = -1
+                break
+        stored += 4 * len(lengths) + TRAILER.size
+        worthwhile = logical > 0 and stored <= logical * (1 - MIN_SAVING)
+        if worthwhile:
+            target.write(struct.pack(f"<{len(lengths)}I", *lengths))
+            target.write(TRAILER.pack(logical, len(lengths), MAGIC))
+    if not worthwhile:
+        os.remove(target_path)
+        return None
+    return logical, stored
+
+class ChunkedReader:
+    """Read-only, seekable file object over a compressed file, decompressing a chunk at a time."""
+
+    def __init__(self, f: BinaryIO, stats: Optional["ReadStats"] = None):
+        self._file = f
+        self._stats = stats
+        f.seek(0)
+        magic, version, codec_id, self.chunk_size = HEADER.unpack(f.read(HEADER.size))
+        f.seek(-TRAILER.size, os.SEEK_END)
+        self.size, count, trailer_magic = TRAILER.unpack(f.read(TRAILER.size))
+        if magic != MAGIC or trailer_magic != MAGIC or version != FORMAT_VERSION:
+            raise CompressedFileError(f"{f.name} is not a compressed file this version can read")
+        self.codec = CODECS_BY_ID.get(codec_id)
+        if self.codec is None:
+            raise CompressedFileError(f"{f.name} needs a codec that is not installed (id {codec_id})")
+        f.seek(-TRAILER.size - 4 * count, os.SEEK_END)
+        self._lengths = struct.unpack(f"<{count}I", f.read(4 * count))
+        self._offsets = []
+        offset = HEADER.size
+        for length in self._lengths:
+            self._offsets.append(offset)
+            offset += length & ~RAW_CHUNK
+        self._position = 0
+        self._chunk_index = -1
+        self._chunk = b""
+
+    @property
+    def name(self) -> str:
+        return self._file.name
+
+    def fileno(self) -> int:
+        return self._file.fileno()
+
+    def _load(self, index: int) -> bytes:
+        if index != self._chunk_index:
+            length = self._lengths[index]
+            self._file.seek(self._offsets[index])
+            data = self._file.read(length & ~RAW_CHUNK)
+            if not length & RAW_CHUNK:
+                start = time.thread_time()
+                data = self.codec.decompress(data)
+                if self._stats is not None:
+                    self._stats.record(len(data), time.thread_time() - start)
+            self._chunk_index = index
+            self._chunk = data
+        return self._chunk
+
+    def read(self, size: int = -1) -> bytes:
+        end = self.size if size is None or size < 0 else min(self.size, self._position + size)
+        parts = []
+        while self._position < end:
+            index, offset = divmod(self._position, self.chunk_size)
+            part = self._load(index)[offset:offset + end - self._position]
+            if not part:
+                raise CompressedFileError(f"{self.name} is truncated")
+            parts.append(part)
+            self._position += len(part)
+        return b"".join(parts)
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self._position, os.SEEK_END: self.size}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self) -> "ChunkedReader":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def open_stored(path: str, encoding_of: Optional[Callable[[str, float], str]] = None,
+                stats: Optional["ReadStats"] = None) -> Tuple[BinaryIO, int]:
+    """Open a stored file for reading its original contents. Returns the file object and the contents' size.
+
+    ``encoding_of(path, mtime)`` says whether the file was stored
+    compressed, in which case it is decompressed as it is read; other files
+    are returned as plain file objects. The contents never decide it.
+    """
+    f = open(path, "rb")
+    try:
+        if encoding_of is not None and encoding_of(path, os.fstat(f.fileno()).st_mtime):
+            reader = ChunkedReader(f, stats)
+            return reader, reader.size
+        return f, os.fstat(f.fileno()).st_size
+    except BaseException:
+        f.close()
+        raise
+
+def logical_size(path: str, encoding_of: Optional[Callable[[str, float], str]] = None) -> int:
+    """Size of a stored file's original contents, read from the trailer if it was stored compressed."""
+    with open(path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        if encoding_of is None or not encoding_of(path, stat.st_mtime):
+            return stat.st_size
+        f.seek(-TRAILER.size, os.SEEK_END)
+        size, _, trailer_magic = TRAILER.unpack(f.read(TRAILER.size))
+    if trailer_magic != MAGIC:
+        raise CompressedFileError(f"{path} is not a compressed file this version can read")
+    return size
+
+class ReadStats:
+    __slots__ = ("bytes", "cpu_s")
+
+    def __init__(self):
+        self.bytes = 0
+        self.cpu_s = 0.0
+
+    def record(self, nbytes: int, cpu_s: float):
+        self.bytes += nbytes
+        self.cpu_s += cpu_s
+
+def cpu_ms_per_mb(cpu_s: float, nbytes: int) -> float:
+    return cpu_s * 1000 / (nbytes / MB) if nbytes else 0.0
+
+class CodecStats:
+    """Bytes in and out of a compressor and the CPU time it took."""
+
+    def __init__(self):
+        self.compressed = 0
+        self.skipped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_s = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, bytes_in: int, bytes_out: int, cpu_s: float):
+        with self._lock:
+            self.compressed += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            self.cpu_s += cpu_s
+
+    def record_skip(self, cpu_s: float = 0.0):
+        with self._lock:
+            self.skipped += 1
+            self.cpu_s += cpu_s
+
+    def to_dict(self) -> Dict:
+        return {
+            "compressed": self.compressed,
+            "skipped": self.skipped,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": self.bytes_in / self.bytes_out if self.bytes_out else 0.0,
+            "cpu_ms_per_mb": cpu_ms_per_mb(self.cpu_s, self.bytes_in)
+        }
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """First and last byte of a single ``bytes=`` range, or None to send the whole file.
+
+    Raises ValueError if the range lies outside the file.
+    """
+    match = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", header or "")
+    if not match or match.groups() == ("", ""):
+        return None  # Absent, or several ranges, which are answered with the whole file
+    first, last = match.groups()
+    if first:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    else:
+        start, end = max(0, size - int(last)), size - 1
+    if start > end or start >= size:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+def download_headers(filename: str, mtime: float) -> Dict[str, str]:
+    """The attachment headers FileResponse would send for ``filename``."""
+    quoted = quote(filename)
+    if quoted != filename:
+        disposition = f"attachment; filename*=utf-8''{quoted}"
+    else:
+        disposition = f'attachment; filename="{filename}"'
+    return {"content-disposition": disposition, "last-modified": formatdate(mtime, usegmt=True)}
+
+class _Encoder:
+    """Incremental compressor for a ``Content-Encoding``."""
+
+    def __init__(self, encoding: str):
+        if encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=3).compressobj()
+        else:
+            self._compressor = zlib.compressobj(1, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+class CompressionManager:
+    """Inline compression of volumes' files and compressed transfer encoding of downloads.
+
+    A volume with compression switched on has each file compressed as it
+    is committed, in independent chunks so reads of part of a file stay
+    cheap; data that already looks compressed is stored as it is. Every
+    read path sees the original contents. Downloads, including the bulk
+    archives replication is built on, are compressed on the wire for
+    clients that accept gzip or zstd, unless they look incompressible.
+    Counters are per worker.
+    """
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self.volumes: Dict[str, CodecStats] = {}
+        self.transfers: Dict[str, CodecStats] = {}
+        self.reads = ReadStats()
+        self._lock = threading.Lock()
+        namespace.encode_with(self.encode)
+
+    def _stats(self, table: Dict[str, CodecStats], key: str) -> CodecStats:
+        with self._lock:
+            if key not in table:
+                table[key] = CodecStats()
+            return table[key]
+
+    def encode(self, name: str, path: str) -> Optional[Tuple[str, int]]:
+        """Compress a file about to be committed as ``name`` in place, if its volume asks for it.
+
+        Returns the codec and original size when the file was compressed,
+        otherwise None.
+        """
+        volume = name.partition("/")[0] if "/" in name else ""
+        codec = CODECS.get(self.namespace.compression_of(volume)) if volume else None
+        if codec is None:
+            return None
+        stats = self._stats(self.volumes, volume)
+        target_path = self.namespace.temp_file()
+        start = time.thread_time()
+        try:
+            sizes = compress_file(path, target_path, codec)
+        except BaseException:
+            if os.path.exists(target_path):
+                os.remove(target_path)
+            raise
+        cpu_s = time.thread_time() - start
+        if sizes is None:
+            stats.record_skip(cpu_s)
+            return None
+        os.replace(target_path, path)
+        stats.record(*sizes, cpu_s)
+        return codec.name, sizes[0]
+
+    def open(self, path: str) -> Tuple[BinaryIO, int]:
+        return open_stored(path, self.namespace.encoding_of, self.reads)
+
+    def size(self, path: str) -> int:
+        return logical_size(path, self.namespace.encoding_of)
+
+    def transfer_encoding(self, accept_encoding: Optional[str]) -> Optional[str]:
+        """The best encoding a client accepts: zstd when installed, otherwise gzip."""
+        accepted = set()
+        for item in (accept_encoding or "").lower().split(","):
+            coding, _, params = item.strip().partition(";")
+            if params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                accepted.add(coding.strip())
+        if "zstd" in accepted and zstandard is not None:
+            return "zstd"
+        if "gzip" in accepted or "*" in accepted:
+            return "gzip"
+        return None
+
+    def encode_stream(self, chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+        """Compress a response body on the fly with a transfer encoding."""
+        stats = self._stats(self.transfers, encoding)
+        encoder = _Encoder(encoding)
+        bytes_in = bytes_out = 0
+        cpu_s = 0.0
+        try:
+            for chunk in chunks:
+                start = time.thread_time()
+                out = encoder.compress(chunk)
+                cpu_s += time.thread_time() - start
+                bytes_in += len(chunk)
+                if out:
+                    bytes_out += len(out)
+                    yield out
+            start = time.thread_time()
+            out = encoder.flush()
+            cpu_s += time.thread_time() - start
+            bytes_out += len(out)
+            yield out
+        finally:
+            stats.record(bytes_in, bytes_out, cpu_s)
+
+    def files_compressible(self, paths: List[str]) -> bool:
+        """Whether most of the data in a set of stored files looks compressible, judged from a few of them.
+
+        Each sampled file counts in proportion to its size; files stored
+        compressed count as compressible.
+        """
+        step = max(1, len(paths) // ARCHIVE_SAMPLE_FILES)
+        compressible_bytes = total_bytes = 0
+        for path in paths[::step][:ARCHIVE_SAMPLE_FILES]:
+            try:
+                f, size = self.open(path)
+            except OSError:
+                continue
+            with f:
+                if isinstance(f, ChunkedReader) or compressible(f.read(ENTROPY_SAMPLE_BYTES)):
+                    compressible_bytes += size
+            total_bytes += size
+        return total_bytes >= MIN_TRANSFER_BYTES and compressible_bytes * 2 >= total_bytes
+
+    def encoded_response(self, chunks: Iterable[bytes], accept_encoding: Optional[str], worthwhile: bool,
+                         **kwargs) -> StreamingResponse:
+        """Stream ``chunks``, compressed if the client accepts an encoding and compressing is ``worthwhile``."""
+        encoding = self.transfer_encoding(accept_encoding)
+        headers = dict(kwargs.pop("headers", None) or {})
+        if encoding is not None:
+            if worthwhile:
+                chunks = self.encode_stream(chunks, encoding)
+                headers["content-encoding"] = encoding
+                headers.pop("content-length", None)
+            else:
+                self._stats(self.transfers, encoding).record_skip()
+        headers["vary"] = "Accept-Encoding"
+        return StreamingResponse(chunks, headers=headers, **kwargs)
+
+    def file_response(self, path: str, filename: str, cached, request_headers) -> Response:
+        """Serve a stored file, or its cached contents, honouring a byte range or a transfer encoding."""
+        if cached is not None:
+            data, mtime = cached.data, cached.mtime_ns / 1e9
+            f, size = None, len(data)
+        else:
+            f, size = self.open(path)
+            data, mtime = None, os.fstat(f.fileno()).st_mtime
+        headers = download_headers(filename, mtime)
+        headers["accept-ranges"] = "bytes"
+        media_type = _media_type(filename)
+        try:
+            byte_range = parse_range(request_headers.get("range"), size)
+        except ValueError:
+            if f is not None:
+                f.close()
+            raise HTTPException(status_code=416, detail="Range not satisfiable",
+                                headers={"content-range": f"bytes */{size}"})
+
+        if byte_range is not None:
+            start, end = byte_range
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+            headers["content-length"] = str(end - start + 1)
+            if data is not None:
+                return Response(data[start:end + 1], status_code=206, media_type=media_type, headers=headers)
+            f.seek(start)
+            return StreamingResponse(_read_chunks(f, end - start + 1), status_code=206,
+                                     media_type=media_type, headers=headers)
+
+        accept_encoding = request_headers.get("accept-encoding")
+        if data is not None:
+            if self.transfer_encoding(accept_encoding) is None or size < MIN_TRANSFER_BYTES:
+                return Response(data, media_type=media_type, headers=headers)
+            chunks, worthwhile = iter((data,)), compressible(data)
+        elif isinstance(f, ChunkedReader) or self.transfer_encoding(accept_encoding):
+            head = f.read(COMPRESSION_CHUNK_SIZE)
+            chunks = _chain(head, _read_chunks(f, size - len(head)))
+            worthwhile = size >= MIN_TRANSFER_BYTES and (isinstance(f, ChunkedReader) or compressible(head))
+        else:
+            # Plain files without an encoding go out with sendfile
+            f.close()
+            return FileResponse(path, filename=filename)
+        headers["content-length"] = str(size)
+        return self.encoded_response(chunks, accept_encoding, worthwhile, media_type=media_type, headers=headers)
+
+    def stats(self) -> Dict:
+        return {
+            "pid": os.getpid(),
+            "codecs": sorted(CODECS),
+            "default_codec": DEFAULT_CODEC,
+            "chunk_bytes": COMPRESSION_CHUNK_SIZE,
+            "entropy_threshold": ENTROPY_THRESHOLD,
+            "volumes": {volume: stats.to_dict() for volume, stats in self.volumes.items()},
+            "transfers": {encoding: stats.to_dict() for encoding, stats in self.transfers.items()},
+            "reads": {
+                "bytes": self.reads.bytes,
+                "cpu_ms_per_mb": cpu_ms_per_mb(self.reads.cpu_s, self.reads.bytes)
+            }
+        }
+
+def _media_type(filename: str) -> str:
+    return mimetypes.guess_type(filename)[0] or "text/plain"
+
+def _chain(head: bytes, chunks: Iterable[bytes]) -> Iterator[bytes]:
+    if head:
+        yield head
+    yield from chunks
+
+def _read_chunks(f: BinaryIO, length: int, chunk_size: int = COMPRESSION_CHUNK_SIZE) -> Iterator[bytes]:
+    """Up to ``length`` bytes from the current position, closing the file at the end."""
+    try:
+        while length > 0:
+            data = f.read(min(chunk_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        f.close()
+
+def create_compression_router(namespace, compression: CompressionManager) -> APIRouter:
+    router = APIRouter(prefix="/compression")
+
+    @router.get("/stats")
+    async def compression_stats():
+        """Compression ratio and CPU cost per MB of inline and transfer compression, and of reads."""
+        return compression.stats()
+
+    @router.get("/volumes")
+    async def volume_compression():
+        """Volumes with inline compression switched on and their codecs."""
+        return {"volumes": namespace.compression_settings()}
+
+    @router.put("/volumes/{volume}")
+    async def set_volume_compression(volume: str, codec: str = Query(DEFAULT_CODEC)):
+        """Compress files written to a volume from now on with ``codec``, or stop with ``off``.
+
+        Files already stored keep their current form; reads handle both.
+        """
+        if codec != "off" and codec not in CODECS:
+            raise HTTPException(status_code=400, detail=f"Unknown or uninstalled codec {codec!r}; "
+                                                        f"available: {', '.join(sorted(CODECS))} or off")
+        if not volume or "/" in volume:
+            raise HTTPException(status_code=400, detail="Invalid volume name")
+        namespace.set_compression(volume, "" if codec == "off" else codec)
+        return {"volume": volume, "codec": codec}
+
+    return router
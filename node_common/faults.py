@@ -0,0 +1,81 @@
+import asyncio
+import os
+import time
+from typing import Dict
+
+from fastapi import APIRouter, HTTPException
+
+class FaultInjector:
+    """Node-side fault hooks driven by the chaos engine.
+
+    Hangs stall the whole event loop. Slow disk delays are injected with a
+    blocking sleep because the node performs its file I/O synchronously
+    inside the request handlers, so a slow disk stalls the loop the same way.
+    When no fault is active the storage hook is a single float comparison.
+    """
+
+    def __init__(self):
+        self.disk_delay_s = 0.0
+        self.disk_delay_until = 0.0
+        self.hang_until = 0.0
+
+    def hang(self, seconds: float):
+        """Stall the event loop for ``seconds`` once the current request returns."""
+        self.hang_until = time.monotonic() + seconds
+        asyncio.get_running_loop().call_soon(time.sleep, seconds)
+
+    def slow_disk(self, delay_ms: float, seconds: float):
+        """Delay every storage operation by ``delay_ms`` for ``seconds``."""
+        self.disk_delay_s = delay_ms / 1000
+        self.disk_delay_until = time.monotonic() + seconds
+
+    def storage_delay(self):
+        """Apply the slow disk delay, if one is active."""
+        if self.disk_delay_until and time.monotonic() < self.disk_delay_until:
+            time.sleep(self.disk_delay_s)
+
+    def clear(self):
+        self.disk_delay_s = 0.0
+        self.disk_delay_until = 0.0
+
+    def status(self) -> Dict:
+        now = time.monotonic()
+        return {
+            "pid": os.getpid(),
+            "slow_disk_ms": self.disk_delay_s * 1000 if now < self.disk_delay_until else 0,
+            "slow_disk_remaining_s": max(0.0, self.disk_delay_until - now),
+            "hang_remaining_s": max(0.0, self.hang_until - now)
+        }
+
+def create_fault_router(injector: FaultInjector) -> APIRouter:
+    """Admin endpoints used by the chaos engine to inject faults."""
+    router = APIRouter(prefix="/fault")
+
+    @router.get("")
+    async def fault_status():
+        """Report active faults and the node's process id."""
+        return injector.status()
+
+    @router.post("/hang")
+    async def inject_hang(seconds: float):
+        """Stall the node's event loop."""
+        if seconds <= 0:
+            raise HTTPException(status_code=400, detail="seconds must be positive")
+        injector.hang(seconds)
+        return {"message": f"Hanging for {seconds}s"}
+
+    @router.post("/slow-disk")
+    async def inject_slow_disk(delay_ms: float, seconds: float):
+        """Delay storage I/O for a while."""
+        if delay_ms < 0 or seconds <= 0:
+            raise HTTPException(status_code=400, detail="delay_ms must be >= 0 and seconds positive")
+        injector.slow_disk(delay_ms, seconds)
+        return {"message": f"Storage delayed by {delay_ms}ms for {seconds}s"}
+
+    @router.post("/clear")
+    async def clear_faults():
+        """Remove any active slow disk fault."""
+        injector.clear()
+        return {"message": "Faults cleared"}
+
+    return router
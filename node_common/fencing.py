@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+import aiohttp
+from fastapi import HTTPException
+
+from tracing.clients import aiohttp_trace_config
+from tracing.tracer import NOOP_TRACER, Tracer
+
+logger = logging.getLogger(__name__)
+
+# An empty URL disables fencing, e.g. when running a single node on its own
+MEDIATOR_URL = os.environ.get("ONTAP_MEDIATOR_URL", "http://localhost:8003")
+
+class LeaseStore:
+    """Where the current epoch, lease deadline and lease intent are kept.
+
+    Multi-worker nodes pass their shared node state instead, so every
+    worker sees the lease obtained or released by any one of them.
+    """
+    __slots__ = ("epoch", "lease_deadline", "highest_epoch", "wants_lease")
+
+    def __init__(self):
+        self.epoch = 0
+        self.lease_deadline = 0.0
+        self.highest_epoch = 0
+        self.wants_lease = False
+
+class FencingGuard:
+    """Tracks this node's ownership of shared storage.
+
+    Ownership is a lease on an epoch issued by the mediator. The node renews
+    the lease in the background and only accepts writes while it is valid,
+    so checking a write is an in-memory clock comparison. The local deadline
+    is measured from when the renewal was sent, so it always expires before
+    the mediator's copy and a partner can never be granted a newer epoch
+    while this node still believes it owns the storage.
+    """
+
+    def __init__(self, node_name: str, mediator_url: str = MEDIATOR_URL, lease_store=None,
+                 tracer: Tracer = NOOP_TRACER):
+        self.node_name = node_name
+        self.mediator_url = mediator_url
+        self._lease = lease_store if lease_store is not None else LeaseStore()
+        self.lease_s = 2.0
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.tracer = tracer
+
+    @property
+    def epoch(self) -> int:
+        return self._lease.epoch
+
+    @epoch.setter
+    def epoch(self, value: int):
+        self._lease.epoch = value
+
+    @property
+    def lease_deadline(self) -> float:
+        return self._lease.lease_deadline
+
+    @lease_deadline.setter
+    def lease_deadline(self, value: float):
+        self._lease.lease_deadline = value
+
+    @property
+    def highest_epoch(self) -> int:
+        """Highest epoch seen in partner traffic, used to reject stale senders."""
+        return self._lease.highest_epoch
+
+    @highest_epoch.setter
+    def highest_epoch(self, value: int):
+        self._lease.highest_epoch = value
+
+    @property
+    def wants_lease(self) -> bool:
+        """Set while this node is meant to own the storage, so a lease lost
+        to a mediator outage is re-acquired rather than silently dropped."""
+        return self._lease.wants_lease
+
+    @wants_lease.setter
+    def wants_lease(self, value: bool):
+        self._lease.wants_lease = value
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.mediator_url)
+
+    def owns_storage(self) -> bool:
+        return not self.enabled or time.monotonic() < self.lease_deadline
+
+    def check_write(self):
+        """Reject a write if this node does not hold a valid lease."""
+        if self.enabled and time.monotonic() >= self.lease_deadline:
+            raise HTTPException(status_code=409, detail=f"Stale fencing epoch {self.epoch}: node does not own shared storage")
+
+    def check_epoch(self, epoch: Optional[int]):
+        """Reject partner traffic stamped with an epoch older than one already seen."""
+        if not self.enabled:
+            return
+        if epoch is None or epoch < max(self.highest_epoch, self.epoch):
+            raise HTTPException(status_code=409, detail=f"Stale fencing epoch {epoch}")
+        self.highest_epoch = epoch
+
+    async def _post(self, path: str, params: Dict) -> aiohttp.ClientResponse:
+        if self._session is None:
+            # Renewals are only traced when a request, such as a takeover, waits on them
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=1),
+                                                  trace_configs=[aiohttp_trace_config(self.tracer, traced_only=True)])
+        async with self._session.post(f"{self.mediator_url}{path}", params=params) as response:
+            await response.read()
+            return response
+
+    async def _request_lease(self, path: str, params: Dict) -> Optional[Dict]:
+        sent_at = time.monotonic()
+        try:
+            response = await self._post(path, params)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Mediator unreachable: {e}")
+            return None
+        try:
+            data = await response.json()
+        except (aiohttp.ContentTypeError, ValueError):
+            # e.g. a proxy's 502 or a server error page rather than the mediator's answer
+            logger.warning(f"Mediator unreachable: unreadable HTTP {response.status} response")
+            return None
+        if response.status not in (200, 409):
+            logger.warning(f"Mediator unreachable: HTTP {response.status}")
+            return None
+        if response.status == 200:
+            self.epoch = data["epoch"]
+            self.highest_epoch = max(self.highest_epoch, self.epoch)
+            self.lease_s = data["lease_s"]
+            self.lease_deadline = sent_at + self.lease_s
+            return data
+        # Another node holds or is taking over the storage
+        self.lease_deadline = 0.0
+        self.wants_lease = False
+        self.highest_epoch = max(self.highest_epoch, data.get("epoch", 0))
+        return data
+
+    async def acquire(self, preempt: bool = False, timeout: float = 10.0) -> bool:
+        """Obtain ownership, waiting for the current owner's lease to lapse.
+
+        With ``preempt`` the mediator stops renewing the current owner's lease
+        so it is fenced off once it expires.
+        """
+        if not self.enabled:
+            return True
+        deadline = time.monotonic() + timeout
+        while True:
+            data = await self._request_lease("/lease/acquire", {"node": self.node_name, "preempt": str(preempt).lower()})
+            if self.owns_storage():
+                self.wants_lease = True
+                logger.info(f"{self.node_name} owns shared storage at epoch {self.epoch}")
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            retry_after = data.get("retry_after", 0.1) if data else 0.5
+            await asyncio.sleep(min(max(retry_after, 0.05), remaining))
+
+    async def release(self):
+        """Give up ownership so the partner can acquire it without waiting."""
+        self.wants_lease = False
+        if not self.enabled or self.epoch == 0:
+            return
+        self.lease_deadline = 0.0
+        try:
+            await self._post("/lease/release", {"node": self.node_name, "epoch": self.epoch})
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Mediator unreachable, lease will expire on its own: {e}")
+
+    async def maintain(self):
+        """Background loop renewing the lease while this node should own the storage."""
+        if not self.enabled:
+            return
+        while True:
+            if self.owns_storage():
+                data = await self._request_lease("/lease/renew", {"node": self.node_name, "epoch": self.epoch})
+                if data is not None and not self.owns_storage():
+                    logger.warning(f"{self.node_name} fenced off at epoch {self.epoch}")
+            elif self.wants_lease:
+                await self._request_lease("/lease/acquire", {"node": self.node_name, "preempt": "false"})
+            await asyncio.sleep(self.lease_s / 4)
+
+    def status(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "epoch": self.epoch,
+            "owns_storage": self.owns_storage(),
+            "lease_remaining_s": max(0.0, self.lease_deadline - time.monotonic())
+        }
@@ -0,0 +1,197 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, FastAPI
+from fastapi.responses import JSONResponse
+
+from models import NodeStatus
+
+logger = logging.getLogger(__name__)
+
+# How long a giveback waits for writes already under way on the partner
+DRAIN_TIMEOUT_S = float(os.environ.get("ONTAP_GIVEBACK_DRAIN_TIMEOUT", "10"))
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+DATA_PATHS = ("/files", "/bulk", "/uploads")
+
+class ChangeLog:
+    """Names of the files written or deleted while this node serves for its partner.
+
+    Recording starts at takeover and lasts while the node hosts LIFs homed
+    on the partner. Each name is appended once per takeover to a log the
+    partner reads on giveback, so it resyncs only what changed while it was
+    down rather than the whole volume. Every worker appends to the same
+    file, a single short write per name.
+    """
+
+    def __init__(self, path: str, state, fencing):
+        self.path = path
+        self.state = state
+        self.fencing = fencing
+        self._lock = threading.Lock()
+        self._seen = set()
+        # Names are logged once per takeover, which is identified by its epoch
+        self._epoch: Optional[int] = None
+        # Result of the last resync from the partner's log
+        self.last_resync: Optional[Dict] = None
+
+    def start(self):
+        """Begin an empty log at takeover, discarding the one from any earlier takeover."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "wb"):
+            pass
+        with self._lock:
+            self._seen.clear()
+            self._epoch = self.fencing.epoch
+
+    def recording(self) -> bool:
+        node = self.state.node
+        return any(lif.home_node == node.partner_node for lif in node.lifs)
+
+    def record(self, name: str):
+        if not self.recording():
+            return
+        with self._lock:
+            if self._epoch != self.fencing.epoch:
+                self._seen.clear()
+                self._epoch = self.fencing.epoch
+            if name in self._seen:
+                return
+            self._seen.add(name)
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, (json.dumps(name) + "\n").encode("utf-8"))
+            finally:
+                os.close(fd)
+
+def read_changes(path: str) -> List[str]:
+    """Distinct names in a change log, in the order they were first changed."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return []
+    names = {}
+    for line in lines:
+        try:
+            names[json.loads(line)] = None
+        except ValueError:
+            continue  # Torn by a crash mid-append
+    return list(names)
+
+async def resync_changes(log_path: str, namespace, read_cache) -> Dict:
+    """Check the files the partner changed during a takeover and warm the cache with them.
+
+    The index is shared, so the partner's completed writes are already in
+    it; re-indexing the logged names repairs only the entries of writes and
+    deletes it was interrupted in, e.g. by crashing between moving a file
+    into place and committing its index update. Reads validate cached files
+    against the disk, so re-reading the logged files this node had cached
+    only saves the first reads after giveback a trip to disk. The time
+    taken follows the number of changes rather than the number of files.
+    The log is removed once applied.
+    """
+    start = time.perf_counter()
+    names = read_changes(log_path)
+    index = await asyncio.get_running_loop().run_in_executor(None, namespace.refresh, names)
+    reloaded = 0
+    for name in names:
+        try:
+            if read_cache.reload(namespace.path(name)):
+                reloaded += 1
+        except (OSError, ValueError):
+            continue
+        await asyncio.sleep(0)
+    try:
+        os.remove(log_path)
+    except FileNotFoundError:
+        pass
+    result = {
+        "changes": len(names),
+        "present": index["present"],
+        "removed": index["removed"],
+        "cache_reloaded": reloaded,
+        "resync_ms": (time.perf_counter() - start) * 1000,
+        "finished": time.time()
+    }
+    logger.info(f"Resynced {len(names)} files changed by the partner in {result['resync_ms']:.1f}ms")
+    return result
+
+class RequestDrain:
+    """Counts file writes in progress and turns new ones away while a giveback is under way.
+
+    Counts are per worker; writes still running on other workers are cut
+    off by fencing once the lease is released.
+    """
+
+    def __init__(self, state):
+        self.state = state
+        self.in_flight = 0
+        self.rejected = 0
+        self.last_drain: Optional[Dict] = None
+
+    def accepting(self) -> bool:
+        return self.state.node.status != NodeStatus.GIVEBACK
+
+    async def wait(self, timeout: float = DRAIN_TIMEOUT_S) -> Dict:
+        """Wait for the writes in progress to finish, up to ``timeout`` seconds."""
+        start = time.perf_counter()
+        waited_for = self.in_flight
+        while self.in_flight and time.perf_counter() - start < timeout:
+            await asyncio.sleep(0.01)
+        if self.in_flight:
+            logger.warning(f"Giveback drain timed out with {self.in_flight} writes still in progress")
+        self.last_drain = {
+            "waited_for": waited_for,
+            "remaining": self.in_flight,
+            "drain_ms": (time.perf_counter() - start) * 1000
+        }
+        return self.last_drain
+
+class DrainMiddleware:
+    """Pure ASGI middleware feeding ``RequestDrain`` for requests that write files."""
+
+    def __init__(self, app, drain: RequestDrain):
+        self.app = app
+        self.drain = drain
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] not in WRITE_METHODS
+                or not scope["path"].startswith(DATA_PATHS)):
+            return await self.app(scope, receive, send)
+        if not self.drain.accepting():
+            self.drain.rejected += 1
+            response = JSONResponse({"detail": "Giveback in progress"}, status_code=503, headers={"Retry-After": "1"})
+            return await response(scope, receive, send)
+        self.drain.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.drain.in_flight -= 1
+
+def install_request_drain(app: FastAPI, state) -> RequestDrain:
+    """Track file writes to ``app`` so a giveback can wait for them to finish."""
+    drain = RequestDrain(state)
+    app.add_middleware(DrainMiddleware, drain=drain)
+    return drain
+
+def create_giveback_router(changes: ChangeLog, drain: RequestDrain) -> APIRouter:
+    router = APIRouter(prefix="/giveback")
+
+    @router.get("/stats")
+    async def giveback_stats():
+        """Changes logged during a takeover, writes in progress and the last drain and resync."""
+        return {
+            "recording": changes.recording(),
+            "changes_logged": len(read_changes(changes.path)),
+            "writes_in_flight": drain.in_flight,
+            "writes_rejected": drain.rejected,
+            "last_drain": drain.last_drain,
+            "last_resync": changes.last_resync
+        }
+
+    return router
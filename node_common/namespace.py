@@ -0,0 +1,662 @@
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote, unquote
+
+from fastapi import APIRouter, HTTPException
+
+logger = logging.getLogger(__name__)
+
+# Everything the namespace keeps is under this directory of the storage root;
+# anything else directly in the root is a file from the old flat layout
+NAMESPACE_DIR = ".namespace"
+# Two levels of 256 directories keep ~15 files per directory at a million files
+SHARD_LEVELS = 2
+MAX_NAME_BYTES = 1024
+# Physical file names are the quoted logical name, which must fit a directory entry
+MAX_LEAF_BYTES = 255
+MIGRATION_BATCH = int(os.environ.get("ONTAP_NAMESPACE_MIGRATION_BATCH", "1000"))
+# Pause between migration batches, leaving the disk to client I/O
+MIGRATION_PAUSE_S = float(os.environ.get("ONTAP_NAMESPACE_MIGRATION_PAUSE_S", "0.05"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    name TEXT PRIMARY KEY,
+    folder TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    encoding TEXT NOT NULL DEFAULT ''
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS files_by_folder ON files (folder, name);
+CREATE TABLE IF NOT EXISTS folders (
+    path TEXT PRIMARY KEY,
+    parent TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS folders_by_parent ON folders (parent, path);
+CREATE TABLE IF NOT EXISTS placements (
+    volume TEXT PRIMARY KEY,
+    location TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS volume_compression (
+    volume TEXT PRIMARY KEY,
+    codec TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+def normalize(name: str) -> str:
+    """Canonical form of a logical file or folder name, "/"-separated without leading or trailing slashes.
+
+    Raises ValueError for names that could escape the namespace.
+    """
+    parts = [part for part in name.split("/") if part not in ("", ".")]
+    if any(part == ".." or "\\" in part or "\0" in part for part in parts):
+        raise ValueError(f"Invalid name: {name}")
+    normalized = "/".join(parts)
+    if len(normalized.encode()) > MAX_NAME_BYTES:
+        raise ValueError(f"Name is longer than {MAX_NAME_BYTES} bytes")
+    return normalized
+
+def parent_of(name: str) -> str:
+    return name.rpartition("/")[0]
+
+def join(folder: str, name: str) -> str:
+    return normalize(f"{folder}/{name}") if folder else normalize(name)
+
+class Namespace:
+    """Logical file names mapped onto a hashed, sharded directory tree.
+
+    A file's physical path is ``.namespace/shards/ab/cd/<quoted name>``,
+    where ``abcd`` comes from a hash of its full logical name, so no
+    directory grows large whatever the file count and looking a file up is
+    a single ``stat``. Folders exist only in the names; listing them is
+    served by a SQLite index of names, sizes and modification times on the
+    same storage, which every worker and the partner node share.
+
+    Files from the older flat layout stay readable in place while a
+    background migration indexes them and then hard-links each one into
+    its shard before unlinking the original. Linking fails if a newer copy
+    was written to the shard in the meantime, so a migration never
+    overwrites fresh data. Writes always go to the shard.
+
+    A volume's files are those under the top-level folder named after it.
+    They start out in the shared shards; once a volume has been moved they
+    live in the shards of the aggregate it was moved to, recorded in the
+    index. Writes look the location up with the index locked for writing,
+    so a move can hold every writer off while it switches locations; reads
+    and listings go through per-thread connections that never take that
+    lock, so they carry on meanwhile.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.base = os.path.join(root, NAMESPACE_DIR)
+        self.shard_root = os.path.join(self.base, "shards")
+        self.tmp_path = os.path.join(self.base, "tmp")
+        self.marker_path = os.path.join(self.base, "migrated")
+        os.makedirs(self.shard_root, exist_ok=True)
+        os.makedirs(self.tmp_path, exist_ok=True)
+        self.aggregate_root = os.path.join(self.base, "aggregates")
+        # Reentrant so index queries can run inside a write transaction on the same thread
+        self._lock = threading.RLock()
+        self._db_path = os.path.join(self.base, "index.db")
+        self._db = sqlite3.connect(self._db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SCHEMA)
+            with self._transaction():
+                # Indexes created before encodings were recorded
+                if "encoding" not in {column[1] for column in self._db.execute("PRAGMA table_info(files)")}:
+                    self._db.execute("ALTER TABLE files ADD COLUMN encoding TEXT NOT NULL DEFAULT ''")
+        # Per-thread connections for lookups on the read path, which must not wait on writers
+        self._readers = threading.local()
+        # Flat files may remain until a migration has found none left
+        self.legacy = not os.path.exists(self.marker_path)
+        self.migration = {
+            "state": "pending" if self.legacy else "done",
+            "indexed": 0,
+            "moved": 0,
+            "skipped": 0,
+            "started": None,
+            "finished": None
+        }
+        self._skipped = set()
+        self._watchers: List[Callable[[str], None]] = []
+        self._encoder: Optional[Callable[[str, str], Optional[Tuple[str, int]]]] = None
+
+    def _shard_root(self, location: str) -> str:
+        if not location:
+            return self.shard_root
+        return os.path.join(self.aggregate_root, location, "shards")
+
+    def _reader(self) -> sqlite3.Connection:
+        db = getattr(self._readers, "db", None)
+        if db is None:
+            db = self._readers.db = sqlite3.connect(self._db_path, timeout=30, isolation_level=None)
+            self._readers.data_version = None
+        return db
+
+    def _volume_settings(self) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """Placements and codecs by volume, as last committed.
+
+        Kept per thread and reloaded only when the thread's connection sees
+        another connection's commit, without taking the namespace lock, so
+        reads never wait on a move's cutover.
+        """
+        db = self._reader()
+        (version,) = db.execute("PRAGMA data_version").fetchone()
+        if version != self._readers.data_version:
+            self._readers.placements = dict(db.execute("SELECT volume, location FROM placements"))
+            self._readers.compression = dict(db.execute("SELECT volume, codec FROM volume_compression"))
+            self._readers.data_version = version
+        return self._readers.placements, self._readers.compression
+
+    def location_of(self, volume: str) -> str:
+        """Aggregate a volume's files are stored in, or "" for the shared shards."""
+        return self._volume_settings()[0].get(volume, "")
+
+    def compression_of(self, volume: str) -> str:
+        """Codec new files in a volume are compressed with, or "" if they are stored as written."""
+        return self._volume_settings()[1].get(volume, "")
+
+    def compression_settings(self) -> Dict[str, str]:
+        return dict(self._volume_settings()[1])
+
+    def set_compression(self, volume: str, codec: str):
+        """Compress files committed to ``volume`` from now on with ``codec``, or stop with ""."""
+        with self._transaction():
+            if codec:
+                self._db.execute("INSERT OR REPLACE INTO volume_compression (volume, codec) VALUES (?, ?)",
+                                 (volume, codec))
+            else:
+                self._db.execute("DELETE FROM volume_compression WHERE volume = ?", (volume,))
+
+    def encode_with(self, encoder: Callable[[str, str], Optional[Tuple[str, int]]]):
+        """Have ``encoder(name, path)`` rewrite each file's contents in place before it is committed.
+
+        The encoder returns the encoding and original size of a file it
+        rewrote, or None if it left the file alone. Both are recorded in the
+        index, which is the only place readers learn a file is encoded.
+        """
+        self._encoder = encoder
+
+    def encoding_of(self, path: str, mtime: float) -> str:
+        """Encoding recorded for the file at ``path`` as last modified at ``mtime``, or "" if it is stored as written.
+
+        Looked up without the namespace lock, so reads never wait on
+        writers. A record of another version means a commit has replaced the
+        file but not yet indexed it, and the lookup waits for that commit;
+        files that were never recorded, like those reindexed after a crash,
+        are taken as stored as written.
+        """
+        if os.path.dirname(path) == self.root:
+            return ""  # Flat-layout files predate encoding
+        name = self.name_of(path)
+        db = self._reader()
+        sql = "SELECT encoding, mtime FROM files WHERE name = ?"
+        row = db.execute(sql, (name,)).fetchone()
+        if row is None or row[1] != mtime:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("ROLLBACK")
+            row = db.execute(sql, (name,)).fetchone()
+        return row[0] if row is not None and row[1] == mtime else ""
+
+    def path(self, name: str, location: Optional[str] = None) -> str:
+        """Physical path of ``name`` in the sharded layout, whether or not it exists.
+
+        The path is in the current location of the file's volume unless a
+        ``location`` is given.
+        """
+        leaf = quote(name, safe="")
+        if len(leaf.encode()) > MAX_LEAF_BYTES:
+            raise ValueError(f"Name is too long to store ({len(leaf)} bytes once encoded)")
+        if location is None:
+            location = self.location_of(name.partition("/")[0]) if "/" in name else ""
+        digest = hashlib.blake2b(name.encode(), digest_size=SHARD_LEVELS).hexdigest()
+        shards = [digest[i:i + 2] for i in range(0, 2 * SHARD_LEVELS, 2)]
+        return os.path.join(self._shard_root(location), *shards, leaf)
+
+    def validate(self, name: str) -> str:
+        """Normalize the name of a file about to be created. Raises ValueError if it cannot be stored."""
+        name = normalize(name)
+        if not name:
+            raise ValueError("File name is empty")
+        self.path(name)
+        return name
+
+    def _legacy_path(self, name: str) -> Optional[str]:
+        if not self.legacy or "/" in name:
+            return None
+        return os.path.join(self.root, name)
+
+    def locate(self, name: str) -> str:
+        """Physical path of an existing file. Raises FileNotFoundError, or ValueError for a bad name."""
+        name = normalize(name)
+        path = self.path(name)
+        if os.path.isfile(path):
+            return path
+        legacy = self._legacy_path(name)
+        if legacy is not None:
+            if os.path.isfile(legacy):
+                return legacy
+            # Migrated between the two checks
+            if os.path.isfile(path):
+                return path
+        raise FileNotFoundError(name)
+
+    def exists(self, name: str) -> bool:
+        try:
+            self.locate(name)
+            return True
+        except (FileNotFoundError, ValueError):
+            return False
+
+    def name_of(self, path: str) -> str:
+        """Logical name of a physical path, the inverse of ``path``."""
+        if os.path.dirname(path) == self.root:
+            return os.path.basename(path)
+        return unquote(os.path.basename(path))
+
+    def watch(self, callback: Callable[[str], None]):
+        """Call ``callback`` with the name of every file committed or removed through this namespace.
+
+        Callbacks may run on executor threads.
+        """
+        self._watchers.append(callback)
+
+    def _changed(self, name: str):
+        for callback in self._watchers:
+            callback(name)
+
+    def temp_file(self) -> str:
+        """A path on the same file system as the shards to write new contents to before ``commit``."""
+        return os.path.join(self.tmp_path, uuid.uuid4().hex)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        with self._lock:
+            if self._db.in_transaction:
+                yield
+                return
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def writes_held(self):
+        """Hold off writes from every worker and node for the duration of the block."""
+        return self._transaction()
+
+    def commit(self, name: str, source_path: str) -> str:
+        """Atomically move a fully written file into place as ``name`` and index it."""
+        name = normalize(name)
+        encoded = None
+        if self._encoder is not None:
+            # Before the index is locked, as encoding may take a while
+            encoded = self._encoder(name, source_path)
+        encoding, size = encoded or ("", None)
+        with self._transaction():
+            path = self.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(source_path, path)
+            legacy = self._legacy_path(name)
+            if legacy is not None:
+                # Otherwise the migration would find an older copy to move
+                try:
+                    os.remove(legacy)
+                except FileNotFoundError:
+                    pass
+            stat = os.stat(path)
+            self._index([(name, stat.st_size if size is None else size, stat.st_mtime)], encoding=encoding)
+        self._changed(name)
+        return path
+
+    def remove(self, name: str) -> Optional[str]:
+        """Delete ``name``. Returns the path it was stored at, or None if there was no such file."""
+        with self._transaction():
+            try:
+                path = self.locate(name)
+            except FileNotFoundError:
+                return None
+            name = normalize(name)
+            self._unindex(name)
+            # Legacy copy first: a migration linking it concurrently leaves a shard copy removed below
+            legacy = self._legacy_path(name)
+            for candidate in filter(None, (legacy, self.path(name))):
+                try:
+                    os.remove(candidate)
+                except FileNotFoundError:
+                    pass
+        self._changed(name)
+        return path
+
+    def volume_files(self, volume: str) -> Dict[str, Tuple[int, float]]:
+        """Size and modification time of every file in a volume, by name."""
+        rows = self._query("SELECT name, size, mtime FROM files WHERE name >= ? AND name < ?",
+                           (f"{volume}/", f"{volume}0"))
+        return {name: (size, mtime) for name, size, mtime in rows}
+
+    def copy(self, name: str, source: str, target: str) -> int:
+        """Copy a file between two locations, keeping its modification time. Returns the bytes copied.
+
+        Raises FileNotFoundError if it is not in ``source``.
+        """
+        target_path = self.path(name, target)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        tmp_path = self.temp_file()
+        try:
+            shutil.copy2(self.path(name, source), tmp_path)
+            os.replace(tmp_path, target_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return os.path.getsize(target_path)
+
+    def discard(self, name: str, location: str):
+        """Delete the copy of a file in a location other than its current one."""
+        try:
+            os.remove(self.path(name, location))
+        except FileNotFoundError:
+            pass
+
+    def place(self, volume: str, location: str):
+        """Record a volume's files as being in ``location`` from now on."""
+        with self._transaction():
+            if location:
+                self._db.execute("INSERT OR REPLACE INTO placements (volume, location) VALUES (?, ?)",
+                                 (volume, location))
+            else:
+                self._db.execute("DELETE FROM placements WHERE volume = ?", (volume,))
+
+    def _index(self, entries: List[Tuple[str, int, float]], replace: bool = True, encoding: str = ""):
+        folders = {}
+        for name, _, _ in entries:
+            folder = parent_of(name)
+            while folder and folder not in folders:
+                folders[folder] = parent_of(folder)
+                folder = parent_of(folder)
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        with self._transaction():
+            self._db.executemany("INSERT OR IGNORE INTO folders (path, parent) VALUES (?, ?)", folders.items())
+            self._db.executemany(f"{verb} INTO files (name, folder, size, mtime, encoding) VALUES (?, ?, ?, ?, ?)",
+                                 [(name, parent_of(name), size, mtime, encoding) for name, size, mtime in entries])
+
+    def _unindex(self, name: str):
+        with self._transaction():
+            self._db.execute("DELETE FROM files WHERE name = ?", (name,))
+            # Folders exist while something is in them
+            folder = parent_of(name)
+            while folder and not self._db.execute(
+                "SELECT EXISTS (SELECT 1 FROM files WHERE folder = ?) OR EXISTS (SELECT 1 FROM folders WHERE parent = ?)",
+                (folder, folder)
+            ).fetchone()[0]:
+                self._db.execute("DELETE FROM folders WHERE path = ?", (folder,))
+                folder = parent_of(folder)
+
+    def _query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        # Committed rows only: a write transaction's own changes are not seen until it commits
+        return self._reader().execute(sql, params).fetchall()
+
+    def list(self, folder: str = "", recursive: bool = False, limit: Optional[int] = None,
+             after: Optional[str] = None) -> Dict:
+        """Files in ``folder`` (and its subfolders if ``recursive``) in name order, plus its subfolders.
+
+        Pages of ``limit`` files continue from the ``next`` name of the
+        previous page, passed as ``after``. Raises FileNotFoundError for a
+        folder that does not exist.
+        """
+        folder = normalize(folder)
+        if folder and not self._query("SELECT 1 FROM folders WHERE path = ?", (folder,)):
+            raise FileNotFoundError(folder)
+        page = -1 if limit is None else limit
+        if recursive:
+            # Every name under "folder/" sorts between "folder/" and "folder0"
+            low, high = (f"{folder}/", f"{folder}0") if folder else ("", "\U0010ffff")
+            rows = self._query(
+                "SELECT name, size, mtime FROM files WHERE name >= ? AND name < ? AND name > ? ORDER BY name LIMIT ?",
+                (low, high, after or "", page)
+            )
+        else:
+            rows = self._query(
+                "SELECT name, size, mtime FROM files WHERE folder = ? AND name > ? ORDER BY name LIMIT ?",
+                (folder, after or "", page)
+            )
+        folders = []
+        if after is None and not recursive:
+            folders = [path for (path,) in self._query(
+                "SELECT path FROM folders WHERE parent = ? ORDER BY path", (folder,)
+            )]
+        return {
+            "files": rows,
+            "folders": folders,
+            "next": rows[-1][0] if limit is not None and len(rows) == limit else None
+        }
+
+    def select(self, names: Optional[List[str]] = None, prefix: Optional[str] = None) -> List[str]:
+        """Existing file names from an explicit list and/or starting with a prefix, sorted.
+
+        With neither a list nor a prefix every file is selected.
+        """
+        selected = set()
+        for name in names or []:
+            try:
+                name = normalize(name)
+            except ValueError:
+                continue
+            if self.exists(name):
+                selected.add(name)
+        if prefix is not None or not names:
+            prefix = (prefix or "").lstrip("/")
+            selected.update(name for (name,) in self._query(
+                "SELECT name FROM files WHERE name >= ? AND name < ?", (prefix, prefix + "\U0010ffff")
+            ))
+        return sorted(selected)
+
+    def stats(self) -> Dict:
+        files, size = self._query("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files")[0]
+        (folders,) = self._query("SELECT COUNT(*) FROM folders")[0]
+        return {
+            "files": files,
+            "bytes": size,
+            "folders": folders,
+            "shard_levels": SHARD_LEVELS,
+            "migration": dict(self.migration)
+        }
+
+    def reindex(self) -> Dict:
+        """Reconcile the index with the files on disk after a crash between a write and its index update.
+
+        Walks every shard, so it takes time proportional to the file count.
+        Files found without an index entry are recorded as stored as written.
+        """
+        on_disk = {}
+        locations = [""]
+        if os.path.isdir(self.aggregate_root):
+            locations += sorted(os.listdir(self.aggregate_root))
+        for location in locations:
+            for directory, _, leaves in os.walk(self._shard_root(location)):
+                for leaf in leaves:
+                    name = unquote(leaf)
+                    current = self.location_of(name.partition("/")[0]) if "/" in name else ""
+                    if current != location:
+                        continue  # Left behind in a volume's previous location by a move
+                    on_disk[name] = os.path.join(directory, leaf)
+        if self.legacy:
+            for entry in self._flat_entries():
+                on_disk.setdefault(entry.name, entry.path)
+        indexed = {name for (name,) in self._query("SELECT name FROM files")}
+        missing = []
+        for name, path in on_disk.items():
+            if name in indexed:
+                continue
+            try:
+                stat = os.stat(path)
+                missing.append((name, stat.st_size, stat.st_mtime))
+            except FileNotFoundError:
+                continue
+        stale = [name for name in indexed if name not in on_disk]
+        if missing:
+            self._index(missing)
+        for name in stale:
+            self._unindex(name)
+        return {"added": len(missing), "removed": len(stale)}
+
+    def refresh(self, names: List[str]) -> Dict:
+        """Reconcile the index entries of just ``names`` with the disk.
+
+        The counterpart of ``reindex`` when the changed names are known, so
+        it takes time proportional to the number of names. Entries that
+        still match their file are left alone, keeping any recorded encoding.
+        """
+        present = 0
+        changed = []
+        gone = []
+        for name in names:
+            try:
+                name = normalize(name)
+                stat = os.stat(self.locate(name))
+            except FileNotFoundError:
+                gone.append(name)
+                continue
+            except ValueError:
+                continue
+            present += 1
+            if self._query("SELECT 1 FROM files WHERE name = ? AND mtime = ?", (name, stat.st_mtime)):
+                continue
+            changed.append((name, stat.st_size, stat.st_mtime))
+        if changed:
+            self._index(changed)
+        removed = 0
+        for name in gone:
+            if self._query("SELECT 1 FROM files WHERE name = ?", (name,)):
+                self._unindex(name)
+                removed += 1
+        return {"present": present, "removed": removed}
+
+    def _flat_entries(self) -> Iterator[os.DirEntry]:
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.name != NAMESPACE_DIR and entry.is_file(follow_symlinks=False):
+                    yield entry
+
+    def index_legacy(self, batch: int = MIGRATION_BATCH) -> int:
+        """Index every flat file so listings are complete before they are moved."""
+        total = 0
+        pending = []
+        for entry in self._flat_entries():
+            stat = entry.stat()
+            pending.append((entry.name, stat.st_size, stat.st_mtime))
+            if len(pending) >= batch:
+                self._index(pending, replace=False)
+                total += len(pending)
+                pending = []
+        if pending:
+            self._index(pending, replace=False)
+            total += len(pending)
+        return total
+
+    def migrate_batch(self, batch: int = MIGRATION_BATCH) -> int:
+        """Move up to ``batch`` flat files into their shards. Returns how many were looked at.
+
+        Once a pass finds nothing left to move the layout is marked as
+        migrated and flat paths are no longer checked, unless some files
+        could not be moved.
+        """
+        candidates = []
+        for entry in self._flat_entries():
+            if entry.name in self._skipped:
+                continue
+            candidates.append(entry)
+            if len(candidates) >= batch:
+                break
+        if not candidates:
+            if not self._skipped:
+                with open(self.marker_path, "w") as f:
+                    f.write(str(time.time()))
+                self.legacy = False
+            return 0
+
+        # Indexed before moving: a crash in between leaves an indexed file still found at its flat path
+        self._index([(e.name, e.stat().st_size, e.stat().st_mtime) for e in candidates], replace=False)
+        moved = 0
+        for entry in candidates:
+            try:
+                path = self.path(entry.name)
+            except ValueError:
+                self._skipped.add(entry.name)
+                self.migration["skipped"] += 1
+                logger.warning(f"Leaving {entry.name} in the flat layout: its name is too long for a shard")
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                os.link(entry.path, path)
+            except FileExistsError:
+                pass  # Rewritten since; the shard copy is newer
+            except FileNotFoundError:
+                continue  # Deleted or moved by another worker
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+            moved += 1
+        self.migration["moved"] += moved
+        return len(candidates)
+
+    async def migrate(self, can_write: Callable[[], bool], pause: float = MIGRATION_PAUSE_S):
+        """Background task moving flat files into shards while the node keeps serving.
+
+        Only runs while ``can_write`` allows, so a node that does not own the
+        storage never moves files.
+        """
+        if not self.legacy:
+            return
+        loop = asyncio.get_running_loop()
+        while not can_write():
+            await asyncio.sleep(1)
+        self.migration.update(state="indexing", started=time.time())
+        try:
+            self.migration["indexed"] = await loop.run_in_executor(None, self.index_legacy)
+            self.migration["state"] = "moving"
+            while True:
+                if not can_write():
+                    await asyncio.sleep(1)
+                    continue
+                if not await loop.run_in_executor(None, self.migrate_batch):
+                    break
+                await asyncio.sleep(pause)
+        except OSError as e:
+            self.migration["state"] = f"failed: {e}"
+            logger.error(f"Namespace migration failed: {e}")
+            return
+        self.migration.update(state="done", finished=time.time())
+        logger.info(f"Migrated {self.migration['moved']} files into the sharded layout")
+
+def create_namespace_router(namespace: Namespace) -> APIRouter:
+    """Admin endpoints for the sharded namespace."""
+    router = APIRouter(prefix="/namespace")
+
+    @router.get("")
+    async def namespace_stats():
+        """File and folder counts and the flat-layout migration's progress."""
+        return namespace.stats()
+
+    @router.post("/reindex")
+    async def reindex():
+        """Rebuild index entries that disagree with the files in the shards."""
+        try:
+            return await asyncio.get_running_loop().run_in_executor(None, namespace.reindex)
+        except OSError as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    return router
@@ -0,0 +1,35 @@
+from fastapi import HTTPException, Request, Response
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+
+from wire_format import WIRE_CONTENT_TYPE, WireFormatError, decode, encode, is_wire
+
+def accepts_wire(request: Request) -> bool:
+    return WIRE_CONTENT_TYPE in request.headers.get("accept", "")
+
+def wire_response(request: Request, message):
+    """Reply with the wire format when the caller accepts it, otherwise with the message's JSON shape."""
+    if accepts_wire(request):
+        return Response(encode(message), media_type=WIRE_CONTENT_TYPE)
+    return message.to_json()
+
+async def read_message(request: Request, record_class, model_class):
+    """Parse a request body sent either as JSON or in the wire format.
+
+    JSON bodies are validated into ``model_class`` as before; wire format
+    bodies come from the partner and are converted without validation.
+    """
+    body = await request.body()
+    if is_wire(request.headers.get("content-type")):
+        try:
+            message = decode(body)
+        except WireFormatError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if not isinstance(message, record_class):
+            raise HTTPException(status_code=400, detail=f"Expected a {record_class.__name__}")
+        return message.to_model()
+    try:
+        return model_class.parse_raw(body)
+    except ValidationError as e:
+        # Located under "body" as FastAPI reports errors in declared body parameters
+        raise RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in e.errors()])
@@ -0,0 +1,325 @@
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from models import QoSPolicy
+from stats import percentile
+
+MB = 1024 * 1024
+
+# Node throughput shared by traffic without a guaranteed minimum; unset means
+# unlimited, in which case minimums are met trivially and only maximums apply
+QOS_NODE_IOPS = float(os.environ.get("ONTAP_QOS_NODE_IOPS", "0"))
+QOS_NODE_MBPS = float(os.environ.get("ONTAP_QOS_NODE_MBPS", "0"))
+# Seconds of throughput a bucket may accumulate while idle
+QOS_BURST_S = float(os.environ.get("ONTAP_QOS_BURST_S", "0.5"))
+# Seconds of recent requests behind the rates and percentiles in the stats
+QOS_STATS_WINDOW_S = 10.0
+QOS_STATS_MAX_SAMPLES = 100_000
+# Traffic for volumes without a policy, and for volumes this node does not hold
+DEFAULT_GROUP = "default"
+
+class TokenBucket:
+    """Token bucket that queues callers instead of rejecting them.
+
+    Tokens may go negative: a caller takes what it needs and sleeps until
+    the debt it leaves is paid off by the refill, so callers that arrive
+    while the bucket is in debt wait behind the earlier ones in arrival
+    order, and a request larger than the burst is admitted at the rate.
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst_s: float = QOS_BURST_S):
+        self.rate = rate
+        self.burst = rate * burst_s
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Take ``amount`` tokens and return how long to wait before using them."""
+        if not amount:
+            return 0.0
+        self._refill()
+        self.tokens -= amount
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def try_take(self, amount: float) -> bool:
+        """Take ``amount`` tokens only if they are available now."""
+        if not amount:
+            return True
+        self._refill()
+        if self.tokens < amount:
+            return False
+        self.tokens -= amount
+        return True
+
+class QoSStats:
+    """Lifetime totals plus a window of recent requests for rates and percentiles."""
+
+    def __init__(self):
+        self.ops = 0
+        self.bytes = 0
+        self.requests = 0
+        self.throttled = 0
+        self.queued_s = 0.0
+        # (finished, ops, bytes, queued seconds, latency seconds)
+        self._recent = deque(maxlen=QOS_STATS_MAX_SAMPLES)
+
+    def record(self, ops: int, nbytes: int, queued_s: float, latency_s: float):
+        self.ops += ops
+        self.bytes += nbytes
+        self.requests += 1
+        self.queued_s += queued_s
+        if queued_s > 0:
+            self.throttled += 1
+        self._recent.append((time.monotonic(), ops, nbytes, queued_s, latency_s))
+
+    def report(self) -> Dict:
+        cutoff = time.monotonic() - QOS_STATS_WINDOW_S
+        while self._recent and self._recent[0][0] < cutoff:
+            self._recent.popleft()
+        recent = list(self._recent)
+        latencies = sorted(sample[4] * 1000 for sample in recent)
+        queued = sorted(sample[3] * 1000 for sample in recent)
+        return {
+            "requests": self.requests,
+            "ops": self.ops,
+            "bytes": self.bytes,
+            "throttled": self.throttled,
+            "queued_s": round(self.queued_s, 3),
+            "iops": sum(sample[1] for sample in recent) / QOS_STATS_WINDOW_S,
+            "mbps": sum(sample[2] for sample in recent) / QOS_STATS_WINDOW_S / MB,
+            "latency_p50_ms": percentile(latencies, 50),
+            "latency_p99_ms": percentile(latencies, 99),
+            "queue_p50_ms": percentile(queued, 50),
+            "queue_p99_ms": percentile(queued, 99)
+        }
+
+class PolicyGroup:
+    """Buckets enforcing one policy's limits, shared by all its volumes.
+
+    The maximum caps the group's throughput. The minimum is a reserved
+    share of the node: while the group is within it, requests skip the
+    node-wide buckets that everything else competes for.
+    """
+
+    def __init__(self, policy: Optional[QoSPolicy], workers: int):
+        self.policy = policy
+        self.max_iops = self.max_bytes = self.min_iops = self.min_bytes = None
+        if policy is not None:
+            # Each worker process enforces its share of the limits
+            if policy.max_iops:
+                self.max_iops = TokenBucket(policy.max_iops / workers)
+            if policy.max_mbps:
+                self.max_bytes = TokenBucket(policy.max_mbps * MB / workers)
+            if policy.min_iops:
+                self.min_iops = TokenBucket(policy.min_iops / workers)
+            if policy.min_mbps:
+                self.min_bytes = TokenBucket(policy.min_mbps * MB / workers)
+
+    def reserve(self, ops: int, nbytes: int, node_iops: Optional[TokenBucket],
+                node_bytes: Optional[TokenBucket]) -> float:
+        wait = 0.0
+        if self.max_iops is not None:
+            wait = max(wait, self.max_iops.reserve(ops))
+        if self.max_bytes is not None:
+            wait = max(wait, self.max_bytes.reserve(nbytes))
+        if node_iops is not None and not (self.min_iops is not None and self.min_iops.try_take(ops)):
+            wait = max(wait, node_iops.reserve(ops))
+        if node_bytes is not None and not (self.min_bytes is not None and self.min_bytes.try_take(nbytes)):
+            wait = max(wait, node_bytes.reserve(nbytes))
+        return wait
+
+class Throttle:
+    """A request's passage through its policy group, admitted in one or more parts."""
+
+    __slots__ = ("_qos", "group", "name", "ops", "bytes", "queued_s")
+
+    def __init__(self, qos: "QoSManager", group: PolicyGroup, name: str):
+        self._qos = qos
+        self.group = group
+        self.name = name
+        self.ops = 0
+        self.bytes = 0
+        self.queued_s = 0.0
+
+    async def admit(self, ops: int = 0, nbytes: int = 0):
+        """Wait until the policy and the node allow ``ops`` operations moving ``nbytes``."""
+        self.ops += ops
+        self.bytes += nbytes
+        wait = self.group.reserve(ops, nbytes, self._qos.node_iops, self._qos.node_bytes)
+        if wait > 0:
+            self.queued_s += wait
+            await asyncio.sleep(wait)
+
+class QoSManager:
+    """Per-volume QoS enforced in the node's read and write paths.
+
+    Policies and their volume attachments live in the node state, so every
+    worker sees changes; each worker rebuilds its buckets when they differ
+    from the ones it built last. Throttled requests are delayed, never
+    rejected. Stats are per worker process.
+    """
+
+    def __init__(self, state, workers: Optional[int] = None,
+                 node_iops: float = QOS_NODE_IOPS, node_mbps: float = QOS_NODE_MBPS):
+        self.state = state
+        self.workers = workers or int(os.environ.get("ONTAP_NODE_WORKERS", "1"))
+        self.node_iops_limit = node_iops
+        self.node_mbps_limit = node_mbps
+        self.node_iops: Optional[TokenBucket] = None
+        self.node_bytes: Optional[TokenBucket] = None
+        self._signature = None
+        self._groups: Dict[str, PolicyGroup] = {}
+        self._volume_groups: Dict[str, str] = {}
+        self._default_volume: Optional[str] = None
+        self._stats: Dict[str, QoSStats] = {}
+
+    def _refresh(self):
+        node = self.state.node
+        signature = (
+            tuple((p.name, p.max_iops, p.max_mbps, p.min_iops, p.min_mbps) for p in node.qos_policies),
+            tuple((v.name, v.qos_policy) for v in node.volumes)
+        )
+        if signature == self._signature:
+            return
+        old = {name: group for name, group in self._groups.items() if group.policy is not None}
+        groups = {DEFAULT_GROUP: self._groups.get(DEFAULT_GROUP) or PolicyGroup(None, self.workers)}
+        for policy in node.qos_policies:
+            group = old.get(policy.name)
+            # Unchanged policies keep their buckets, and with them any queue
+            if group is None or group.policy != policy:
+                group = PolicyGroup(policy, self.workers)
+            groups[policy.name] = group
+        self._groups = groups
+        self._volume_groups = {
+            v.name: v.qos_policy if v.qos_policy in groups else DEFAULT_GROUP for v in node.volumes
+        }
+        primary = [v.name for v in node.volumes if not v.is_replica]
+        self._default_volume = (primary or [v.name for v in node.volumes] or [None])[0]
+
+        # Minimums are carved out of the node's capacity before the rest is shared
+        reserved_iops = sum(p.min_iops or 0 for p in node.qos_policies)
+        reserved_mbps = sum(p.min_mbps or 0 for p in node.qos_policies)
+        self.node_iops = self.node_bytes = None
+        if self.node_iops_limit:
+            shared = max(self.node_iops_limit - reserved_iops, self.node_iops_limit * 0.01)
+            self.node_iops = TokenBucket(shared / self.workers)
+        if self.node_mbps_limit:
+            shared = max(self.node_mbps_limit - reserved_mbps, self.node_mbps_limit * 0.01)
+            self.node_bytes = TokenBucket(shared * MB / self.workers)
+        self._signature = signature
+
+    def group_name(self, volume: Optional[str]) -> str:
+        """Policy group for ``volume``, or for the node's default volume when none is named."""
+        self._refresh()
+        if volume is None:
+            volume = self._default_volume
+        return self._volume_groups.get(volume, DEFAULT_GROUP)
+
+    @asynccontextmanager
+    async def throttle(self, volume: Optional[str], ops: int = 1, nbytes: int = 0) -> AsyncIterator[Throttle]:
+        """Admit a request for ``volume`` and record its latency when the block exits.
+
+        Further parts of a streamed request are admitted through the
+        yielded throttle as they arrive.
+        """
+        name = self.group_name(volume)
+        throttle = Throttle(self, self._groups[name], name)
+        started = time.monotonic()
+        await throttle.admit(ops, nbytes)
+        try:
+            yield throttle
+        finally:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = QoSStats()
+            stats.record(throttle.ops, throttle.bytes, throttle.queued_s, time.monotonic() - started)
+
+    def stats(self) -> Dict:
+        self._refresh()
+        policies = {name: self._stats[name].report() if name in self._stats else QoSStats().report()
+                    for name in self._groups}
+        return {
+            "pid": os.getpid(),
+            "window_s": QOS_STATS_WINDOW_S,
+            "node_iops": self.node_iops_limit or None,
+            "node_mbps": self.node_mbps_limit or None,
+            "volumes": dict(self._volume_groups),
+            "policies": policies
+        }
+
+def create_qos_router(state, qos: QoSManager) -> APIRouter:
+    """Endpoints to manage QoS policy groups and read their stats."""
+    router = APIRouter(prefix="/qos")
+
+    @router.get("/policies")
+    async def list_policies():
+        """Policy groups and the volumes attached to each."""
+        node = state.node
+        return {
+            "policies": [
+                {**policy.dict(), "volumes": [v.name for v in node.volumes if v.qos_policy == policy.name]}
+                for policy in node.qos_policies
+            ]
+        }
+
+    @router.put("/policies/{name}")
+    async def put_policy(name: str,
+                         max_iops: Optional[int] = Query(None, gt=0),
+                         max_mbps: Optional[float] = Query(None, gt=0),
+                         min_iops: Optional[int] = Query(None, gt=0),
+                         min_mbps: Optional[float] = Query(None, gt=0)):
+        """Create or replace a policy group; omitted limits are unset."""
+        if name == DEFAULT_GROUP:
+            raise HTTPException(status_code=400, detail=f"'{DEFAULT_GROUP}' is reserved for volumes without a policy")
+        if max_iops and min_iops and min_iops > max_iops:
+            raise HTTPException(status_code=400, detail="min_iops exceeds max_iops")
+        if max_mbps and min_mbps and min_mbps > max_mbps:
+            raise HTTPException(status_code=400, detail="min_mbps exceeds max_mbps")
+        policy = QoSPolicy(name=name, max_iops=max_iops, max_mbps=max_mbps, min_iops=min_iops, min_mbps=min_mbps)
+        with state.update() as node:
+            node.qos_policies = [p for p in node.qos_policies if p.name != name] + [policy]
+        return policy
+
+    @router.delete("/policies/{name}")
+    async def delete_policy(name: str):
+        """Remove a policy group that no volume is attached to."""
+        with state.update() as node:
+            if not any(p.name == name for p in node.qos_policies):
+                raise HTTPException(status_code=404, detail="Policy not found")
+            attached = [v.name for v in node.volumes if v.qos_policy == name]
+            if attached:
+                raise HTTPException(status_code=409, detail=f"Policy is attached to {', '.join(attached)}")
+            node.qos_policies = [p for p in node.qos_policies if p.name != name]
+        return {"message": f"Policy {name} deleted"}
+
+    @router.put("/volumes/{volume}")
+    async def attach_policy(volume: str, policy: Optional[str] = None):
+        """Attach a volume to a policy group, or detach it when no policy is given."""
+        with state.update() as node:
+            target = next((v for v in node.volumes if v.name == volume), None)
+            if target is None:
+                raise HTTPException(status_code=404, detail="Volume not found")
+            if policy is not None and not any(p.name == policy for p in node.qos_policies):
+                raise HTTPException(status_code=404, detail="Policy not found")
+            target.qos_policy = policy
+        return {"volume": volume, "qos_policy": policy}
+
+    @router.get("/stats")
+    async def qos_stats():
+        """Per-policy throughput, throttling and latency over the last few seconds."""
+        return qos.stats()
+
+    return router
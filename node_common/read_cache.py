@@ -0,0 +1,194 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
+
+from fastapi import APIRouter
+
+from node_common.compression import open_stored
+
+logger = logging.getLogger(__name__)
+
+READ_CACHE_BYTES = int(os.environ.get("ONTAP_READ_CACHE_BYTES", str(64 * 1024 * 1024)))
+READ_CACHE_MAX_FILE_BYTES = int(os.environ.get("ONTAP_READ_CACHE_MAX_FILE_BYTES", str(4 * 1024 * 1024)))
+
+class CachedFile:
+    __slots__ = ("data", "mtime_ns", "inode", "stored_size")
+
+    def __init__(self, data: bytes, mtime_ns: int, inode: int, stored_size: int):
+        self.data = data
+        self.mtime_ns = mtime_ns
+        self.inode = inode
+        # Size on disk, which differs from the contents' size for compressed files
+        self.stored_size = stored_size
+
+class ReadCache:
+    """LRU cache of small and medium file contents, capped by total bytes.
+
+    Entries are validated against a single ``stat`` on every hit, so files
+    changed by another worker or by the partner node are never served stale;
+    uploads and deletes on this node also invalidate explicitly. The names
+    of cached files are periodically written to a hot-set file so the
+    partner can warm its own cache from it on takeover. Compressed files
+    are cached decompressed, as read through ``open_file``.
+    """
+
+    def __init__(self, max_bytes: int = READ_CACHE_BYTES, max_file_bytes: int = READ_CACHE_MAX_FILE_BYTES,
+                 open_file: Callable[[str], Tuple[BinaryIO, int]] = open_stored):
+        self.max_bytes = max_bytes
+        self.open_file = open_file
+        self.max_file_bytes = min(max_file_bytes, max_bytes)
+        self._entries: "OrderedDict[str, CachedFile]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._hot_set_dirty = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, path: str) -> Optional[CachedFile]:
+        """Cached contents if still current. Raises FileNotFoundError if the file is gone."""
+        stat = os.stat(path)
+        entry = self._entries.get(path)
+        if entry is not None:
+            if entry.mtime_ns == stat.st_mtime_ns and entry.inode == stat.st_ino and entry.stored_size == stat.st_size:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry
+            self._remove(path)
+        self.misses += 1
+        return None
+
+    def load(self, path: str) -> Optional[CachedFile]:
+        """Read a file into the cache, or return None if it is too large to cache."""
+        if not self.enabled:
+            return None
+        f, size = self.open_file(path)
+        with f:
+            stat = os.fstat(f.fileno())
+            if size > self.max_file_bytes:
+                return None
+            data = f.read()
+        entry = CachedFile(data, stat.st_mtime_ns, stat.st_ino, stat.st_size)
+        self._remove(path)
+        self._entries[path] = entry
+        self.bytes += len(data)
+        self._hot_set_dirty = True
+        while self.bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.bytes -= len(evicted.data)
+            self.evictions += 1
+        return entry
+
+    def _remove(self, path: str):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self.bytes -= len(entry.data)
+            self._hot_set_dirty = True
+
+    def invalidate(self, path: str):
+        if path in self._entries:
+            self._remove(path)
+            self.invalidations += 1
+
+    def reload(self, path: str) -> bool:
+        """Re-read a cached file changed elsewhere, dropping it if it is gone. Returns whether it was cached."""
+        if path not in self._entries:
+            return False
+        self.invalidate(path)
+        try:
+            self.load(path)
+        except FileNotFoundError:
+            pass
+        return True
+
+    def hot_files(self, name_of: Callable[[str], str] = os.path.basename) -> List[str]:
+        """Cached file names, most recently used first."""
+        return [name_of(path) for path in reversed(self._entries)]
+
+    def save_hot_set(self, hot_set_path: str, name_of: Callable[[str], str] = os.path.basename):
+        os.makedirs(os.path.dirname(hot_set_path), exist_ok=True)
+        tmp_path = hot_set_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.hot_files(name_of), f)
+        os.replace(tmp_path, hot_set_path)
+        self._hot_set_dirty = False
+
+    async def persist_hot_set(self, hot_set_path: str, name_of: Callable[[str], str] = os.path.basename,
+                              interval: float = 5.0):
+        """Background loop writing the hot set whenever the cache contents change.
+
+        ``name_of`` turns a cached path into the name stored in the hot set.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            if self._hot_set_dirty:
+                try:
+                    self.save_hot_set(hot_set_path, name_of)
+                except OSError as e:
+                    logger.warning(f"Could not save hot set: {e}")
+
+    async def warm(self, locate: Callable[[str], str], hot_set_path: str) -> int:
+        """Load the files listed in a hot-set file, most recently used first.
+
+        ``locate`` maps a name from the hot set to the file's path. Yields
+        to the event loop between files so takeover traffic is served while
+        warming. Returns the number of files loaded.
+        """
+        if not self.enabled or not os.path.exists(hot_set_path):
+            return 0
+        with open(hot_set_path, "r", encoding="utf-8") as f:
+            names = json.load(f)
+
+        loaded = 0
+        start = time.perf_counter()
+        # Stop before the warm-up starts evicting the hottest files again
+        budget = self.max_bytes - self.bytes
+        for name in names:
+            try:
+                path = locate(name)
+                if path in self._entries:
+                    continue
+                entry = self.load(path)
+            except (OSError, ValueError):
+                continue  # Deleted since the hot set was written
+            if entry is not None:
+                loaded += 1
+                budget -= len(entry.data)
+                if budget <= 0:
+                    break
+            await asyncio.sleep(0)
+        logger.info(f"Warmed read cache with {loaded} files in {(time.perf_counter() - start) * 1000:.1f}ms")
+        return loaded
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "max_file_bytes": self.max_file_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+def create_cache_router(cache: ReadCache) -> APIRouter:
+    router = APIRouter(prefix="/cache")
+
+    @router.get("/stats")
+    async def cache_stats():
+        """Read cache hit, miss and eviction counters."""
+        return cache.stats()
+
+    return router
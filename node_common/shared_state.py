@@ -0,0 +1,185 @@
+import json
+import mmap
+import os
+import struct
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+if os.name == 'nt':  # Windows
+    import msvcrt
+else:
+    import fcntl
+
+# Path of the state file shared by all workers of a node; unset means the
+# node runs as a single process and keeps its state in memory
+STATE_PATH_ENV = "ONTAP_NODE_STATE"
+
+# initialized, version, body length, lease deadline, epoch, highest epoch
+# seen, whether the node wants the lease
+HEADER = struct.Struct("<QQQdqqq")
+INITIALIZED = 0x4F4E544150  # "ONTAP"
+VERSION_OFFSET = 8
+LENGTH_OFFSET = 16
+LEASE_OFFSET = 24
+EPOCH_OFFSET = 32
+HIGHEST_EPOCH_OFFSET = 40
+WANTS_LEASE_OFFSET = 48
+INITIAL_SIZE = 64 * 1024
+
+class LocalNodeState:
+    """Node state held in process memory, for single-worker nodes."""
+
+    def __init__(self, node_model):
+        self.node = node_model
+        self.lease_deadline = 0.0
+        self.epoch = 0
+        self.highest_epoch = 0
+        self.wants_lease = False
+
+    @contextmanager
+    def update(self) -> Iterator:
+        yield self.node
+
+class SharedNodeState:
+    """Node state in a memory-mapped file shared by every uvicorn worker.
+
+    The node model is stored as JSON after a fixed header holding a version
+    counter. Readers compare the version with the one they last parsed and
+    only re-read the body when another worker has changed it, so reads are
+    normally a single memory access. Writers take an exclusive file lock,
+    reload, apply the change and bump the version. The fencing lease, and
+    whether the node wants it, live in the header as raw numbers so write
+    checks never parse JSON and a release by one worker stops every
+    worker's renewals.
+    """
+
+    def __init__(self, node_model, path: str):
+        self._model_class = type(node_model)
+        self._file = open(path, "a+b")
+        self._map: Optional[mmap.mmap] = None
+        self._cached = None
+        self._cached_version = -1
+        with self._locked():
+            if os.fstat(self._file.fileno()).st_size < INITIAL_SIZE:
+                self._file.truncate(INITIAL_SIZE)
+            self._remap()
+            initialized = HEADER.unpack_from(self._map, 0)[0]
+            if initialized != INITIALIZED:
+                # First worker to attach seeds the state
+                self._write(node_model, version=1)
+                HEADER.pack_into(self._map, 0, INITIALIZED, 1, self._body_length(), 0.0, 0, 0, 0)
+
+    def _remap(self):
+        if self._map is not None:
+            self._map.close()
+        self._map = mmap.mmap(self._file.fileno(), os.fstat(self._file.fileno()).st_size)
+
+    @contextmanager
+    def _locked(self):
+        fd = self._file.fileno()
+        if os.name == 'nt':
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def _version(self) -> int:
+        return struct.unpack_from("<Q", self._map, VERSION_OFFSET)[0]
+
+    def _body_length(self) -> int:
+        return struct.unpack_from("<Q", self._map, LENGTH_OFFSET)[0]
+
+    def _read(self):
+        if os.fstat(self._file.fileno()).st_size != len(self._map):
+            self._remap()
+        length = self._body_length()
+        body = self._map[HEADER.size:HEADER.size + length]
+        self._cached = self._model_class(**json.loads(body))
+        self._cached_version = self._version()
+
+    def _write(self, node_model, version: int):
+        body = json.dumps(node_model.dict(), default=str).encode("utf-8")
+        needed = HEADER.size + len(body)
+        if needed > len(self._map):
+            self._file.truncate(max(needed, 2 * len(self._map)))
+            self._remap()
+        self._map[HEADER.size:needed] = body
+        struct.pack_into("<Q", self._map, LENGTH_OFFSET, len(body))
+        struct.pack_into("<Q", self._map, VERSION_OFFSET, version)
+        self._cached = node_model
+        self._cached_version = version
+
+    @property
+    def node(self):
+        """Latest node model; re-parsed only when another worker changed it."""
+        if self._version() != self._cached_version:
+            with self._locked():
+                self._read()
+        return self._cached
+
+    @contextmanager
+    def update(self) -> Iterator:
+        """Modify the node model atomically with respect to other workers."""
+        with self._locked():
+            self._read()
+            try:
+                yield self._cached
+            except BaseException:
+                # Drop the partially modified copy
+                self._cached_version = -1
+                raise
+            self._write(self._cached, self._version() + 1)
+
+    @property
+    def lease_deadline(self) -> float:
+        return struct.unpack_from("<d", self._map, LEASE_OFFSET)[0]
+
+    @lease_deadline.setter
+    def lease_deadline(self, value: float):
+        struct.pack_into("<d", self._map, LEASE_OFFSET, value)
+
+    @property
+    def epoch(self) -> int:
+        return struct.unpack_from("<q", self._map, EPOCH_OFFSET)[0]
+
+    @epoch.setter
+    def epoch(self, value: int):
+        struct.pack_into("<q", self._map, EPOCH_OFFSET, value)
+
+    @property
+    def highest_epoch(self) -> int:
+        return struct.unpack_from("<q", self._map, HIGHEST_EPOCH_OFFSET)[0]
+
+    @highest_epoch.setter
+    def highest_epoch(self, value: int):
+        struct.pack_into("<q", self._map, HIGHEST_EPOCH_OFFSET, value)
+
+    @property
+    def wants_lease(self) -> bool:
+        return bool(struct.unpack_from("<q", self._map, WANTS_LEASE_OFFSET)[0])
+
+    @wants_lease.setter
+    def wants_lease(self, value: bool):
+        struct.pack_into("<q", self._map, WANTS_LEASE_OFFSET, int(value))
+
+def create_node_state(node_model):
+    """Shared state when the node runs with several workers, otherwise local."""
+    path = os.environ.get(STATE_PATH_ENV)
+    if path:
+        return SharedNodeState(node_model, path)
+    return LocalNodeState(node_model)
+
+def reset_shared_state(path: str):
+    """Discard state left by a previous run before the workers start."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "wb"):
+        pass
@@ -0,0 +1,214 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
+
+from models import NodeStatus
+from node_common.namespace import Namespace
+
+# Session metadata and partial data, on storage both nodes can reach so an
+# upload started on one node can be finished on its partner after takeover
+UPLOAD_PATH = os.environ.get(
+    "ONTAP_UPLOAD_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "uploads")
+)
+# Sessions untouched for this long are removed
+UPLOAD_SESSION_TTL = float(os.environ.get("ONTAP_UPLOAD_SESSION_TTL", str(24 * 3600)))
+
+class UploadSessionStore:
+    """Resumable upload sessions kept as a JSON record plus a ``.part`` file.
+
+    A chunk is written and flushed to the part file before the session's
+    offset is advanced, and the offset is replaced atomically, so the
+    recorded offset never covers data that was not written. A chunk cut
+    short by a failover is not committed and is simply sent again.
+    """
+
+    def __init__(self, upload_path: str, namespace: Namespace):
+        self.upload_path = upload_path
+        self.namespace = namespace
+        os.makedirs(upload_path, exist_ok=True)
+
+    def _meta_path(self, upload_id: str) -> str:
+        return os.path.join(self.upload_path, f"{upload_id}.json")
+
+    def part_path(self, upload_id: str) -> str:
+        return os.path.join(self.upload_path, f"{upload_id}.part")
+
+    def _save(self, session: Dict):
+        session["updated"] = time.time()
+        meta_path = self._meta_path(session["id"])
+        tmp_path = meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(session, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, meta_path)
+
+    def create(self, filename: str, length: int) -> Dict:
+        self.expire()
+        session = {
+            "id": uuid.uuid4().hex,
+            "filename": self.namespace.validate(filename),
+            "length": length,
+            "offset": 0,
+            "created": time.time()
+        }
+        open(self.part_path(session["id"]), "wb").close()
+        self._save(session)
+        return session
+
+    def get(self, upload_id: str) -> Optional[Dict]:
+        # Ids are generated hex strings; anything else cannot name a session
+        if not upload_id.isalnum():
+            return None
+        try:
+            with open(self._meta_path(upload_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def commit(self, session: Dict, new_offset: int):
+        session["offset"] = new_offset
+        self._save(session)
+
+    def finish(self, session: Dict) -> str:
+        """Move the completed data into storage and drop the session.
+
+        Compresses the data first if its volume asks for it, so call it
+        from an executor.
+        """
+        file_path = self.namespace.commit(session["filename"], self.part_path(session["id"]))
+        self.remove(session["id"])
+        return file_path
+
+    def remove(self, upload_id: str):
+        for path in (self._meta_path(upload_id), self.part_path(upload_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def list(self) -> List[Dict]:
+        sessions = []
+        for name in sorted(os.listdir(self.upload_path)):
+            if name.endswith(".json"):
+                session = self.get(name[:-len(".json")])
+                if session is not None:
+                    sessions.append(session)
+        return sessions
+
+    def expire(self, ttl: float = UPLOAD_SESSION_TTL):
+        cutoff = time.time() - ttl
+        for session in self.list():
+            if session.get("updated", session["created"]) < cutoff:
+                self.remove(session["id"])
+
+def offset_headers(session: Dict) -> Dict[str, str]:
+    return {
+        "Upload-Offset": str(session["offset"]),
+        "Upload-Length": str(session["length"]),
+        "Cache-Control": "no-store"
+    }
+
+def create_upload_router(store: UploadSessionStore, state, fencing, faults, read_cache, qos) -> APIRouter:
+    """tus-style resumable uploads: create a session, PATCH chunks at offsets, HEAD for the offset."""
+    router = APIRouter(prefix="/uploads")
+
+    def check_available():
+        if state.node.status == NodeStatus.FAILED:
+            raise HTTPException(status_code=503, detail="Node is in failed state")
+
+    def get_session(upload_id: str) -> Dict:
+        session = store.get(upload_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Upload session not found")
+        return session
+
+    async def finish(session: Dict) -> str:
+        return await asyncio.get_running_loop().run_in_executor(None, store.finish, session)
+
+    @router.get("")
+    async def list_uploads():
+        """Unfinished upload sessions."""
+        return {"uploads": store.list()}
+
+    @router.post("", status_code=201)
+    async def create_upload(filename: str, length: int):
+        """Start a resumable upload of ``length`` bytes."""
+        check_available()
+        fencing.check_write()
+        if length < 0:
+            raise HTTPException(status_code=400, detail="Upload length must not be negative")
+        try:
+            session = store.create(filename, length)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if length == 0:
+            read_cache.invalidate(await finish(session))
+        return JSONResponse(
+            session,
+            status_code=201,
+            headers={"Location": f"/uploads/{session['id']}", **offset_headers(session)}
+        )
+
+    @router.head("/{upload_id}")
+    async def upload_offset(upload_id: str):
+        """Current committed offset, for resuming after an interruption."""
+        check_available()
+        return Response(status_code=200, headers=offset_headers(get_session(upload_id)))
+
+    @router.patch("/{upload_id}")
+    async def upload_chunk(upload_id: str, request: Request,
+                           offset: int = Header(..., alias="Upload-Offset"),
+                           volume: Optional[str] = Header(None, alias="X-Volume")):
+        """Append a chunk at the session's current offset."""
+        check_available()
+        fencing.check_write()
+        session = get_session(upload_id)
+        if offset != session["offset"]:
+            return JSONResponse(
+                {"detail": f"Offset mismatch: upload is at {session['offset']}"},
+                status_code=409,
+                headers=offset_headers(session)
+            )
+
+        faults.storage_delay()
+        end = offset
+        async with qos.throttle(volume) as throttle:
+            with open(store.part_path(upload_id), "r+b") as f:
+                # Drop anything past the committed offset from an interrupted chunk
+                f.truncate(offset)
+                f.seek(offset)
+                async for chunk in request.stream():
+                    end += len(chunk)
+                    if end > session["length"]:
+                        raise HTTPException(status_code=413, detail="Chunk extends past the upload length")
+                    # Throttled as it arrives, which also slows the sender
+                    await throttle.admit(nbytes=len(chunk))
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+
+        # Partner may have taken over while the chunk was arriving
+        fencing.check_write()
+        store.commit(session, end)
+        if end == session["length"]:
+            read_cache.invalidate(await finish(session))
+        return Response(status_code=204, headers=offset_headers(session))
+
+    @router.delete("/{upload_id}", status_code=204)
+    async def cancel_upload(upload_id: str):
+        """Abandon an upload and discard its partial data."""
+        check_available()
+        fencing.check_write()
+        get_session(upload_id)
+        store.remove(upload_id)
+        return Response(status_code=204)
+
+    return router
@@ -0,0 +1,415 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+from fastapi import APIRouter, Body, Header, HTTPException, Query
+
+from models import NodeStatus, QoSPolicy, Volume
+from node_common.namespace import Namespace
+from tracing.clients import aiohttp_trace_config
+from tracing.tracer import NOOP_TRACER, Tracer
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+# Files copied per step, between which progress is saved and cancellation checked
+MOVE_BATCH = int(os.environ.get("ONTAP_VOLUME_MOVE_BATCH", "200"))
+# Cut over once a catch-up pass finds this few changed files holding this few bytes;
+# a move still finding more after the last pass fails rather than copying them all
+# with writes held off
+CUTOVER_MAX_CHANGES = int(os.environ.get("ONTAP_VOLUME_MOVE_CUTOVER_FILES", "100"))
+CUTOVER_MAX_BYTES = int(os.environ.get("ONTAP_VOLUME_MOVE_CUTOVER_BYTES", str(64 * MB)))
+MAX_CATCHUP_PASSES = int(os.environ.get("ONTAP_VOLUME_MOVE_MAX_PASSES", "5"))
+# The old copy outlives the cutover by this long, so reads that found it just before can finish
+CLEANUP_DELAY_S = 5.0
+# A move in progress that has not saved its record for this long was interrupted, e.g. by a restart
+STALE_MOVE_S = 60.0
+RUNNING = ("copying", "catching-up", "cutover", "cleaning-up")
+
+class MoveCancelled(Exception):
+    pass
+
+class VolumeMover:
+    """Moves volumes to the partner node while they keep serving I/O.
+
+    The volume's files are copied to the aggregate named after the
+    destination node in the background, then catch-up passes copy whatever
+    was written or deleted since, found by comparing the index with what
+    was copied. Once a pass finds few enough changes, writes are held off
+    for a final pass and the switch of the volume's location, which is the
+    only pause clients see. The old copy is deleted shortly after, then
+    ownership passes to the partner; if the partner cannot take it the
+    move waits in ``handover-pending`` until the handover is retried.
+
+    Each move runs in the worker that started it; its progress is saved as
+    a JSON record so any worker can report on it.
+    """
+
+    def __init__(self, moves_path: str, namespace: Namespace, state, fencing, partner_url: str,
+                 tracer: Tracer = NOOP_TRACER):
+        self.moves_path = moves_path
+        self.namespace = namespace
+        self.state = state
+        self.fencing = fencing
+        self.partner_url = partner_url
+        self.tracer = tracer
+        # Moves running in this worker, and those asked to stop
+        self._active = set()
+        self._cancelled = set()
+        self._session: Optional[aiohttp.ClientSession] = None
+        os.makedirs(moves_path, exist_ok=True)
+
+    def _record_path(self, move_id: str) -> str:
+        return os.path.join(self.moves_path, f"{move_id}.json")
+
+    def _save(self, move: Dict):
+        move["updated"] = time.time()
+        copying_s = move["copy_s"]
+        move["throughput_mbps"] = move["bytes_copied"] / MB / copying_s if copying_s else 0.0
+        record_path = self._record_path(move["id"])
+        tmp_path = record_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(move, f)
+        os.replace(tmp_path, record_path)
+
+    def get(self, move_id: str) -> Optional[Dict]:
+        # Ids are generated hex strings; anything else cannot name a move
+        if not move_id.isalnum():
+            return None
+        try:
+            with open(self._record_path(move_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def list(self) -> List[Dict]:
+        moves = []
+        for name in os.listdir(self.moves_path):
+            if name.endswith(".json"):
+                move = self.get(name[:-len(".json")])
+                if move is not None:
+                    moves.append(move)
+        return sorted(moves, key=lambda move: move["started"])
+
+    def running(self, move: Dict) -> bool:
+        return move["state"] in RUNNING and time.time() - move["updated"] < STALE_MOVE_S
+
+    def start(self, volume: str, destination: str, max_mbps: Optional[float] = None) -> Dict:
+        """Begin moving ``volume`` to ``destination`` in the background and return its record."""
+        move = {
+            "id": uuid.uuid4().hex,
+            "volume": volume,
+            "source": self.state.node.name,
+            "destination": destination,
+            "source_location": self.namespace.location_of(volume),
+            "destination_location": destination,
+            "state": "copying",
+            "max_mbps": max_mbps,
+            "files_total": 0,
+            "files_copied": 0,
+            "bytes_copied": 0,
+            "copy_s": 0.0,
+            "throughput_mbps": 0.0,
+            "passes": [],
+            "cutover_pause_ms": None,
+            "owner_changed": False,
+            "started": time.time(),
+            "finished": None,
+            "error": None
+        }
+        self._save(move)
+        self._active.add(move["id"])
+        asyncio.create_task(self._run(move))
+        return move
+
+    def cancel(self, move_id: str) -> bool:
+        """Ask a move running in this worker to stop before its cutover."""
+        move = self.get(move_id)
+        if move_id not in self._active or move["state"] not in ("copying", "catching-up"):
+            return False
+        self._cancelled.add(move_id)
+        return True
+
+    def _check(self, move: Dict):
+        if move["id"] in self._cancelled:
+            raise MoveCancelled()
+        if not self.fencing.owns_storage():
+            raise RuntimeError("Lost ownership of shared storage")
+
+    def _copy(self, move: Dict, names: List[str], manifest: Dict[str, Tuple[int, float]],
+              copied: Dict[str, Tuple[int, float]], paced: bool = True) -> int:
+        """Copy files to the destination, paced to the move's bandwidth cap. Returns the bytes copied."""
+        total = 0
+        start = time.monotonic()
+        for name in names:
+            try:
+                total += self.namespace.copy(name, move["source_location"], move["destination_location"])
+                copied[name] = manifest[name]
+            except FileNotFoundError:
+                # Deleted since the manifest was read
+                self.namespace.discard(name, move["destination_location"])
+                copied.pop(name, None)
+            if paced and move["max_mbps"]:
+                ahead = total / (move["max_mbps"] * MB) - (time.monotonic() - start)
+                if ahead > 0:
+                    time.sleep(ahead)
+        return total
+
+    async def _copy_all(self, move: Dict, names: List[str], manifest: Dict[str, Tuple[int, float]],
+                        copied: Dict[str, Tuple[int, float]]):
+        loop = asyncio.get_running_loop()
+        for i in range(0, len(names), MOVE_BATCH):
+            self._check(move)
+            start = time.monotonic()
+            batch = names[i:i + MOVE_BATCH]
+            move["bytes_copied"] += await loop.run_in_executor(None, self._copy, move, batch, manifest, copied)
+            move["files_copied"] += len(batch)
+            move["copy_s"] += time.monotonic() - start
+            self._save(move)
+
+    def _discard(self, names: List[str], location: str):
+        for name in names:
+            self.namespace.discard(name, location)
+
+    def _changes(self, copied: Dict[str, Tuple[int, float]],
+                 current: Dict[str, Tuple[int, float]]) -> Tuple[List[str], List[str]]:
+        """Names written since they were copied, and names copied but deleted since."""
+        changed = [name for name, stat in current.items() if copied.get(name) != stat]
+        deleted = [name for name in copied if name not in current]
+        return changed, deleted
+
+    def _small_enough(self, changed: List[str], deleted: List[str], current: Dict[str, Tuple[int, float]]) -> bool:
+        """Whether changes are few and small enough to copy with writes held off."""
+        return (len(changed) + len(deleted) <= CUTOVER_MAX_CHANGES
+                and sum(current[name][0] for name in changed) <= CUTOVER_MAX_BYTES)
+
+    def _cut_over(self, move: Dict, copied: Dict[str, Tuple[int, float]]) -> Optional[float]:
+        """Final pass and switch of location with writes held off. Returns the pause in milliseconds.
+
+        Writers wait for the cutover; reads look locations up without the
+        namespace lock and carry on. Returns None without switching if
+        writes made since the last catch-up pass leave more to copy than
+        ``CUTOVER_MAX_CHANGES`` files or ``CUTOVER_MAX_BYTES``.
+        """
+        start = time.perf_counter()
+        with self.namespace.writes_held():
+            current = self.namespace.volume_files(move["volume"])
+            changed, deleted = self._changes(copied, current)
+            if not self._small_enough(changed, deleted, current):
+                return None
+            for name in deleted:
+                self.namespace.discard(name, move["destination_location"])
+                del copied[name]
+            # Not paced: writers are waiting
+            move["bytes_copied"] += self._copy(move, changed, current, copied, paced=False)
+            move["files_total"] += len(changed)
+            move["files_copied"] += len(changed)
+            self.namespace.place(move["volume"], move["destination_location"])
+        return (time.perf_counter() - start) * 1000
+
+    async def _run(self, move: Dict):
+        try:
+            await self._move(move)
+        finally:
+            self._active.discard(move["id"])
+            self._cancelled.discard(move["id"])
+
+    async def _relocate(self, move: Dict, copied: Dict[str, Tuple[int, float]]):
+        """Copy the volume to its destination, catch up with the writes made meanwhile and cut over."""
+        loop = asyncio.get_running_loop()
+        volume = move["volume"]
+        manifest = await loop.run_in_executor(None, self.namespace.volume_files, volume)
+        move["files_total"] = len(manifest)
+        await self._copy_all(move, sorted(manifest), manifest, copied)
+
+        # Catch up with the writes made while copying until little enough is left for the cutover,
+        # and again if more was written by the time writes were held off
+        while move["cutover_pause_ms"] is None:
+            move["state"] = "catching-up"
+            while True:
+                self._check(move)
+                current = await loop.run_in_executor(None, self.namespace.volume_files, volume)
+                changed, deleted = self._changes(copied, current)
+                if self._small_enough(changed, deleted, current):
+                    break
+                if len(move["passes"]) >= MAX_CATCHUP_PASSES:
+                    raise RuntimeError(f"Writes outpaced the move: {len(changed) + len(deleted)} files still "
+                                       f"changed after {MAX_CATCHUP_PASSES} catch-up passes")
+                move["passes"].append(len(changed) + len(deleted))
+                move["files_total"] += len(changed)
+                for name in deleted:
+                    self.namespace.discard(name, move["destination_location"])
+                    del copied[name]
+                await self._copy_all(move, changed, current, copied)
+
+            move["state"] = "cutover"
+            self._save(move)
+            move["cutover_pause_ms"] = await loop.run_in_executor(None, self._cut_over, move, copied)
+
+    async def _move(self, move: Dict):
+        volume = move["volume"]
+        copied: Dict[str, Tuple[int, float]] = {}
+        try:
+            with self.tracer.span("volume_move", attributes={"volume": volume, "destination": move["destination"]}):
+                if move["source_location"] != move["destination_location"]:
+                    await self._relocate(move, copied)
+                else:
+                    # Already stored there, e.g. moved before this node's state was reset; only ownership changes
+                    move["cutover_pause_ms"] = 0.0
+        except Exception as e:
+            # Nothing reads the destination copy until the cutover, which did not happen
+            await asyncio.get_running_loop().run_in_executor(None, self._discard, list(copied),
+                                                             move["destination_location"])
+            if isinstance(e, MoveCancelled):
+                move["state"] = "cancelled"
+            else:
+                move.update(state="failed", error=str(e))
+                logger.error(f"Move of {volume} failed: {e}")
+            move["finished"] = time.time()
+            self._save(move)
+            return
+
+        # Reads that located a file just before the cutover may still be using the old copy. Ownership
+        # changes after it is gone, so the partner cannot start moving the volume back into it meanwhile
+        move["state"] = "cleaning-up"
+        self._save(move)
+        await asyncio.sleep(CLEANUP_DELAY_S)
+        await asyncio.get_running_loop().run_in_executor(None, self._discard, list(copied), move["source_location"])
+        await self.hand_over(move)
+
+    async def hand_over(self, move: Dict) -> Dict:
+        """Pass ownership to the partner and finish the move, or leave it pending a retry."""
+        move["owner_changed"] = await self._hand_over(move)
+        if move["owner_changed"]:
+            logger.info(f"Moved {move['volume']} to {move['destination']} "
+                        f"with a {move['cutover_pause_ms']:.1f}ms cutover")
+            move.update(state="done", error=None, finished=time.time())
+        else:
+            # The files are already in the destination aggregate and still served from here
+            move.update(state="handover-pending",
+                        error=f"{move['destination']} did not take ownership; retry the handover")
+        self._save(move)
+        return move
+
+    async def _hand_over(self, move: Dict) -> bool:
+        """Pass ownership of the moved volume, and its QoS policy, to the partner.
+
+        The volume stays owned by this node until the partner has adopted it.
+        """
+        node = self.state.node
+        volume = next((v for v in node.volumes if v.name == move["volume"]), None)
+        if volume is None:
+            return False
+        policy = next((p for p in node.qos_policies if p.name == volume.qos_policy), None)
+        adopted = volume.copy(update={"owner_node": move["destination"]})
+        body = {"volume": json.loads(adopted.json()), "qos_policy": json.loads(policy.json()) if policy else None}
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5),
+                                                  trace_configs=[aiohttp_trace_config(self.tracer)])
+        try:
+            async with self._session.post(f"{self.partner_url}/volumes/adopt", json=body,
+                                          headers={"X-Fencing-Epoch": str(self.fencing.epoch)}) as response:
+                if response.status != 200:
+                    logger.error(f"Partner refused {move['volume']}: {await response.text()}")
+                    return False
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Partner unreachable to take over {move['volume']}: {e}")
+            return False
+        with self.state.update() as node:
+            node.volumes = [v for v in node.volumes if v.name != move["volume"]]
+        return True
+
+def create_volume_router(mover: VolumeMover, state, fencing) -> APIRouter:
+    """Volume listing, non-disruptive moves to the partner node and replica sync times."""
+    router = APIRouter(prefix="/volumes")
+
+    @router.get("")
+    async def list_volumes():
+        """Volumes owned by this node and the aggregate each one's files are in."""
+        return {
+            "volumes": [
+                {**v.dict(), "location": mover.namespace.location_of(v.name) or None}
+                for v in state.node.volumes
+            ]
+        }
+
+    @router.post("/{volume}/move")
+    async def start_move(volume: str, destination: Optional[str] = None,
+                         max_mbps: Optional[float] = Query(None, gt=0)):
+        """Start moving a volume to the partner node; poll the returned move for progress."""
+        node = state.node
+        destination = destination or node.partner_node
+        if destination != node.partner_node:
+            raise HTTPException(status_code=400, detail=f"Volumes can only move to the partner, {node.partner_node}")
+        target = next((v for v in node.volumes if v.name == volume), None)
+        if target is None:
+            raise HTTPException(status_code=404, detail="Volume not found")
+        if target.is_replica:
+            raise HTTPException(status_code=400, detail="Replica volumes cannot be moved")
+        if node.status != NodeStatus.HEALTHY:
+            raise HTTPException(status_code=409, detail=f"Node is in {node.status.value} state")
+        fencing.check_write()
+        if any(m["volume"] == volume and mover.running(m) for m in mover.list()):
+            raise HTTPException(status_code=409, detail=f"{volume} is already being moved")
+        return mover.start(volume, destination, max_mbps)
+
+    @router.get("/moves")
+    async def list_moves():
+        """Every move recorded on this node, oldest first."""
+        return {"moves": mover.list()}
+
+    @router.get("/moves/{move_id}")
+    async def get_move(move_id: str):
+        """Phase, progress, copy throughput and cutover pause of a move."""
+        move = mover.get(move_id)
+        if move is None:
+            raise HTTPException(status_code=404, detail="Move not found")
+        return move
+
+    @router.post("/moves/{move_id}/handover")
+    async def retry_handover(move_id: str):
+        """Retry passing ownership of a moved volume the partner did not take."""
+        move = mover.get(move_id)
+        if move is None:
+            raise HTTPException(status_code=404, detail="Move not found")
+        if move["state"] != "handover-pending":
+            raise HTTPException(status_code=409, detail=f"Move is {move['state']}, not waiting for a handover")
+        return await mover.hand_over(move)
+
+    @router.delete("/moves/{move_id}")
+    async def cancel_move(move_id: str):
+        """Stop a move before its cutover and discard what it copied."""
+        if mover.get(move_id) is None:
+            raise HTTPException(status_code=404, detail="Move not found")
+        if not mover.cancel(move_id):
+            raise HTTPException(status_code=409, detail="Move is past its cutover or not running in this worker")
+        return {"message": f"Move {move_id} is being cancelled"}
+
+    @router.put("/{volume}/last-sync")
+    async def set_last_sync(volume: str, at: datetime):
+        """Record when a replica volume was last brought up to date with its source."""
+        with state.update() as node:
+            target = next((v for v in node.volumes if v.name == volume), None)
+            if target is None:
+                raise HTTPException(status_code=404, detail="Volume not found")
+            target.last_sync = at
+        return {"volume": volume, "last_sync": at}
+
+    @router.post("/adopt")
+    async def adopt_volume(volume: Volume = Body(...), qos_policy: Optional[QoSPolicy] = Body(None),
+                           epoch: Optional[int] = Header(None, alias="X-Fencing-Epoch")):
+        """Take ownership of a volume the partner has moved here."""
+        fencing.check_epoch(epoch)
+        with state.update() as node:
+            node.volumes = [v for v in node.volumes if v.name != volume.name] + [volume]
+            if qos_policy is not None and not any(p.name == qos_policy.name for p in node.qos_policies):
+                node.qos_policies.append(qos_policy)
+        return {"volume": volume.name, "owner_node": volume.owner_node}
+
+    return router
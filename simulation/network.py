@@ -0,0 +1,116 @@
+import asyncio
+import json
+import random
+from typing import Dict, Optional, Tuple
+
+import aiohttp
+
+# aiohttp's default total timeout, used for requests that don't set one
+DEFAULT_REQUEST_TIMEOUT = 300.0
+
+class SimulatedNetwork:
+    """One-way delays and packet loss drawn from a seeded random generator.
+
+    Delay is a fixed base latency plus exponentially distributed jitter. A
+    lost message is never delivered, so the sender only notices through its
+    timeout.
+    """
+
+    def __init__(self, rng: random.Random, latency_ms: float = 0.5, jitter_ms: float = 0.5, loss: float = 0.0):
+        self.rng = rng
+        self.latency_s = latency_ms / 1000
+        self.jitter_s = jitter_ms / 1000
+        self.loss = loss
+
+    def sample(self) -> Tuple[float, bool]:
+        """Delay of one message in seconds, and whether it is lost."""
+        delay = self.latency_s
+        if self.jitter_s:
+            delay += self.rng.expovariate(1 / self.jitter_s)
+        lost = self.loss > 0 and self.rng.random() < self.loss
+        return delay, lost
+
+class SimulatedResponse:
+    # Simulated nodes always answer in JSON, like a node without wire format support
+    content_type = "application/json"
+
+    def __init__(self, status: int, payload: Optional[Dict] = None):
+        self.status = status
+        self._payload = payload or {}
+
+    async def json(self) -> Dict:
+        return self._payload
+
+    async def read(self) -> bytes:
+        return json.dumps(self._payload).encode()
+
+class _RequestContext:
+    def __init__(self, request):
+        self._request = request
+
+    async def __aenter__(self) -> SimulatedResponse:
+        return await self._request
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+class SimulatedSession:
+    """Stand-in for ``aiohttp.ClientSession`` that delivers requests to simulated nodes.
+
+    Supports the subset of the session API the HA controller uses. Each
+    request and response crosses the simulated network; timeouts, refused
+    connections and hung servers surface as the same exceptions aiohttp
+    raises, so the controller's error handling runs unchanged.
+    """
+
+    def __init__(self, network: SimulatedNetwork, nodes: Dict[str, "object"]):
+        self.network = network
+        # Base URL -> node with an async ``handle(method, path)``
+        self.nodes = nodes
+
+    async def __aenter__(self) -> "SimulatedSession":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def get(self, url: str, timeout: Optional[aiohttp.ClientTimeout] = None,
+            headers: Optional[Dict] = None) -> _RequestContext:
+        return _RequestContext(self._request("GET", url, timeout))
+
+    def post(self, url: str, timeout: Optional[aiohttp.ClientTimeout] = None,
+             headers: Optional[Dict] = None) -> _RequestContext:
+        return _RequestContext(self._request("POST", url, timeout))
+
+    async def _request(self, method: str, url: str, timeout: Optional[aiohttp.ClientTimeout]) -> SimulatedResponse:
+        base, path = split_url(url)
+        node = self.nodes[base]
+        limit = timeout.total if timeout is not None and timeout.total else DEFAULT_REQUEST_TIMEOUT
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + limit
+
+        delay, lost = self.network.sample()
+        if lost or delay >= limit:
+            await asyncio.sleep(limit)
+            raise asyncio.TimeoutError()
+        await asyncio.sleep(delay)
+        if node.crashed:
+            raise aiohttp.ClientConnectionError(f"Cannot connect to {base}: connection refused")
+        if node.hung:
+            await asyncio.sleep(max(0.0, deadline - loop.time()))
+            raise asyncio.TimeoutError()
+
+        status, payload = await node.handle(method, path)
+
+        delay, lost = self.network.sample()
+        if lost or loop.time() + delay >= deadline:
+            await asyncio.sleep(max(0.0, deadline - loop.time()))
+            raise asyncio.TimeoutError()
+        await asyncio.sleep(delay)
+        return SimulatedResponse(status, payload)
+
+def split_url(url: str) -> Tuple[str, str]:
+    """``sim://node-a/health`` -> (``sim://node-a``, ``/health``)."""
+    scheme, _, rest = url.partition("://")
+    host, _, path = rest.partition("/")
+    return f"{scheme}://{host}", "/" + path
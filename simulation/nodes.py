@@ -0,0 +1,95 @@
+import asyncio
+from typing import Dict, Optional, Tuple
+
+from models import LIFStatus, LogicalInterface, Node, NodeStatus, Volume
+
+class SimulatedNode:
+    """In-process node answering the controller's requests like node_a/node_b.
+
+    Holds the same ``Node`` model and applies the same status transitions
+    and LIF moves as the FastAPI handlers, with takeover processing time
+    taken from the simulation configuration.
+    """
+
+    def __init__(self, model: Node, takeover_s: float = 0.0):
+        self.model = model
+        self.takeover_s = takeover_s
+        self.partner: Optional["SimulatedNode"] = None
+        self.crashed = False
+        self.hung = False
+        # NVRAM entries mirrored from the partner
+        self.nvram_received = 0
+        self.takeover_requested_at: Optional[float] = None
+        self.takeover_completed_at: Optional[float] = None
+        self.taken_over = asyncio.Event()
+
+    @property
+    def name(self) -> str:
+        return self.model.name
+
+    @property
+    def serving(self) -> bool:
+        return not (self.crashed or self.hung or self.model.status == NodeStatus.FAILED)
+
+    def crash(self):
+        self.crashed = True
+
+    def hang(self):
+        self.hung = True
+
+    def fail(self):
+        """Same transition as ``POST /failover``."""
+        self.model.status = NodeStatus.FAILED
+        for lif in self.model.lifs:
+            lif.status = LIFStatus.MIGRATING
+            lif.current_node = self.model.partner_node
+
+    async def handle(self, method: str, path: str) -> Tuple[int, Dict]:
+        if method == "GET" and path == "/health":
+            if self.model.status == NodeStatus.FAILED:
+                return 503, {"detail": "Node is in failed state"}
+            return 200, {"status": self.model.status.value, "role": self.model.role}
+        # Only the secondary implements takeover, as in node_b
+        if method == "POST" and path == "/takeover" and self.model.role == "secondary":
+            return await self.takeover()
+        return 404, {"detail": "Not Found"}
+
+    async def takeover(self) -> Tuple[int, Dict]:
+        loop = asyncio.get_running_loop()
+        if self.takeover_requested_at is None:
+            self.takeover_requested_at = loop.time()
+        # Lease acquisition and LIF migration
+        await asyncio.sleep(self.takeover_s)
+        if self.model.status == NodeStatus.TAKEOVER:
+            return 200, {"message": "Already in takeover mode"}
+
+        self.model.status = NodeStatus.TAKEOVER
+        for lif in self.partner.model.lifs:
+            lif.current_node = self.name
+            lif.status = LIFStatus.ONLINE
+            self.model.lifs.append(lif)
+        self.takeover_completed_at = loop.time()
+        self.taken_over.set()
+        return 200, {"message": "Takeover initiated"}
+
+def create_node_pair(takeover_s: float) -> Tuple[SimulatedNode, SimulatedNode]:
+    """Node A (primary) and Node B (secondary) as configured in node_a/node_b."""
+    node_a = SimulatedNode(Node(
+        name="node-a",
+        role="primary",
+        partner_node="node-b",
+        volumes=[Volume(name="vol1", size_gb=100, used_gb=20.5, state="online", owner_node="node-a")],
+        lifs=[LogicalInterface(name="lif1", ip_address="192.168.1.10", current_node="node-a",
+                               home_node="node-a", protocol="nfs", port=2049)]
+    ), takeover_s)
+    node_b = SimulatedNode(Node(
+        name="node-b",
+        role="secondary",
+        partner_node="node-a",
+        volumes=[Volume(name="vol1-replica", size_gb=100, used_gb=20.5, state="online", owner_node="node-b",
+                        is_replica=True)],
+        lifs=[LogicalInterface(name="lif2", ip_address="192.168.1.11", current_node="node-b",
+                               home_node="node-b", protocol="nfs", port=2049)]
+    ), takeover_s)
+    node_a.partner, node_b.partner = node_b, node_a
+    return node_a, node_b
@@ -0,0 +1,44 @@
+import asyncio
+import selectors
+
+class SimulationStalled(RuntimeError):
+    pass
+
+class _VirtualSelector(selectors.DefaultSelector):
+    """Selector that never waits: it advances the loop's clock instead.
+
+    The loop asks the selector to block until its next timer is due, so
+    jumping the clock by exactly that timeout makes the timer ready on the
+    next iteration. Registered file descriptors (only the loop's self-pipe)
+    are never polled.
+    """
+
+    def __init__(self, loop_clock: "VirtualTimeLoop"):
+        super().__init__()
+        self._clock = loop_clock
+
+    def select(self, timeout=None):
+        if timeout is None:
+            # Nothing ready and no timer pending: the coroutine being run waits forever
+            raise SimulationStalled("No pending timers; the simulation can never finish")
+        if timeout > 0:
+            self._clock.now += timeout
+        return []
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    """An asyncio event loop on a virtual clock.
+
+    ``asyncio.sleep``, ``wait_for`` and other timers run unchanged, but time
+    only passes when every task is waiting, and then jumps straight to the
+    next deadline. Runs are deterministic as long as the coroutines use
+    seeded randomness and no real I/O.
+    """
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+        super().__init__(_VirtualSelector(self))
+        # Timers are due exactly when the clock reaches them
+        self._clock_resolution = 1e-9
+
+    def time(self) -> float:
+        return self.now
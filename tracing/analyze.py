@@ -0,0 +1,206 @@
+import glob
+import json
+import os
+import sys
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import click
+from rich.console import Console
+from rich.table import Table
+from rich.tree import Tree
+
+# Add parent directory to path for imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tracing.tracer import CLIENT, TRACE_PATH
+
+console = Console()
+
+def load_traces(path: str) -> Dict[str, List[Dict]]:
+    """Read every exported span under ``path`` grouped by trace id."""
+    traces = defaultdict(list)
+    for filename in glob.glob(os.path.join(path, "*.jsonl")):
+        with open(filename) as f:
+            for line in f:
+                try:
+                    span = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Partially written line from a killed process
+                traces[span["trace_id"]].append(span)
+    return traces
+
+def end_of(span: Dict) -> float:
+    return span["start"] + span["duration_ms"] / 1000
+
+def build_tree(spans: List[Dict]):
+    """Return the root spans and the children of each span, both ordered by start time.
+
+    Spans whose parent was not recorded (the caller had tracing off, or its
+    process was killed before exporting) are treated as roots.
+    """
+    ids = {span["span_id"] for span in spans}
+    children = defaultdict(list)
+    roots = []
+    for span in sorted(spans, key=lambda s: s["start"]):
+        if span["parent_id"] in ids:
+            children[span["parent_id"]].append(span)
+        else:
+            roots.append(span)
+    return roots, children
+
+def critical_path(span: Dict, children: Dict[str, List[Dict]]) -> List[Dict]:
+    """The chain of spans that determined ``span``'s end time, in start order.
+
+    Walks back from the end of the span, each time taking the child that
+    finished last among those started before the point reached so far;
+    time not covered by such a child is the span's own work. Children may
+    end slightly after their parent (a server span outlives the client
+    span once the response headers are out), so only start times are
+    compared against the cursor.
+    """
+    path = [span]
+    cursor = end_of(span)
+    for child in sorted(children.get(span["span_id"], []), key=end_of, reverse=True):
+        if child["start"] < cursor:
+            path.extend(critical_path(child, children))
+            cursor = child["start"]
+    return sorted(path, key=lambda s: s["start"])
+
+def trace_summary(trace_id: str, spans: List[Dict]) -> Dict:
+    roots, _ = build_tree(spans)
+    root = max(roots, key=lambda s: s["duration_ms"])
+    return {
+        "trace_id": trace_id,
+        "root": root,
+        "spans": len(spans),
+        "services": sorted({span["service"] for span in spans})
+    }
+
+def hop_latencies(spans: List[Dict], children: Dict[str, List[Dict]]) -> List[Dict]:
+    """Pair each client span with the server span it caused.
+
+    The difference between them is time on the network and waiting to be
+    served (connection setup, accept queue, worker busy).
+    """
+    hops = []
+    for span in sorted(spans, key=lambda s: s["start"]):
+        if span["kind"] != CLIENT:
+            continue
+        server = next((child for child in children.get(span["span_id"], []) if child["kind"] == "server"), None)
+        hops.append({
+            "from": span["service"],
+            "to": server["service"] if server else span["attributes"].get("peer", "?"),
+            "request": span["name"],
+            "client_ms": span["duration_ms"],
+            "server_ms": server["duration_ms"] if server else None,
+            "status": span["status"]
+        })
+    return hops
+
+def format_ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+@click.group()
+@click.option("--path", default=TRACE_PATH, show_default=True, help="Directory the components export spans to")
+@click.pass_context
+def cli(ctx, path):
+    """Inspect traces recorded with ONTAP_TRACING=1"""
+    ctx.obj = load_traces(path)
+
+@cli.command()
+@click.option("--limit", default=10, help="Number of traces to list")
+@click.option("--service", default=None, help="Only traces whose root span is from this service")
+@click.option("--name", default=None, help="Only traces whose root span name contains this text")
+@click.option("--min-ms", default=0.0, help="Only traces at least this slow")
+@click.pass_obj
+def slowest(traces, limit, service, name, min_ms):
+    """List the slowest traces"""
+    summaries = [trace_summary(trace_id, spans) for trace_id, spans in traces.items()]
+    summaries = [
+        s for s in summaries
+        if s["root"]["duration_ms"] >= min_ms
+        and (service is None or s["root"]["service"] == service)
+        and (name is None or name in s["root"]["name"])
+    ]
+    summaries.sort(key=lambda s: s["root"]["duration_ms"], reverse=True)
+
+    table = Table(title=f"Slowest traces ({len(summaries)} matching)")
+    table.add_column("Trace")
+    table.add_column("Root")
+    table.add_column("Duration (ms)", justify="right")
+    table.add_column("Spans", justify="right")
+    table.add_column("Services")
+    for s in summaries[:limit]:
+        table.add_row(s["trace_id"], f"{s['root']['service']}: {s['root']['name']}",
+                      format_ms(s["root"]["duration_ms"]), str(s["spans"]), ", ".join(s["services"]))
+    console.print(table)
+
+@cli.command()
+@click.argument("trace_id", required=False)
+@click.pass_obj
+def show(traces, trace_id):
+    """Print a trace's span tree, critical path and per-hop latency (the slowest trace by default)"""
+    if trace_id is None:
+        if not traces:
+            console.print("[yellow]No traces recorded[/yellow]")
+            return
+        trace_id = max(traces, key=lambda t: trace_summary(t, traces[t])["root"]["duration_ms"])
+    matches = [t for t in traces if t.startswith(trace_id)]
+    if len(matches) != 1:
+        console.print(f"[red]{'No' if not matches else 'Several'} traces match {trace_id}[/red]")
+        return
+    trace_id = matches[0]
+    spans = traces[trace_id]
+    roots, children = build_tree(spans)
+    root = max(roots, key=lambda s: s["duration_ms"])
+    path = critical_path(root, children)
+    on_path = {span["span_id"] for span in path}
+    origin = min(span["start"] for span in spans)
+
+    def label(span):
+        text = (f"{span['service']}: {span['name']}  {format_ms(span['duration_ms'])} ms"
+                f"  [dim]+{(span['start'] - origin) * 1000:.1f} ms[/dim]")
+        if span["status"] == "error" or (isinstance(span["status"], int) and span["status"] >= 400):
+            text += f"  [red]{span['status']}[/red]"
+        return f"[bold]{text}[/bold]" if span["span_id"] in on_path else text
+
+    def add(tree, span):
+        branch = tree.add(label(span))
+        for child in children.get(span["span_id"], []):
+            add(branch, child)
+
+    tree = Tree(f"Trace {trace_id} (critical path in bold)")
+    for r in roots:
+        add(tree, r)
+    console.print(tree)
+
+    table = Table(title="Critical path")
+    table.add_column("Span")
+    table.add_column("Duration (ms)", justify="right")
+    table.add_column("Self (ms)", justify="right")
+    for i, span in enumerate(path):
+        # Time not spent waiting on this span's children on the path
+        covered = sum(p["duration_ms"] for p in path[i + 1:] if p["parent_id"] == span["span_id"])
+        table.add_row(f"{span['service']}: {span['name']}", format_ms(span["duration_ms"]),
+                      format_ms(max(0.0, span["duration_ms"] - covered)))
+    console.print(table)
+
+    hops = hop_latencies(spans, children)
+    if hops:
+        table = Table(title="Per-hop latency")
+        table.add_column("Hop")
+        table.add_column("Request")
+        table.add_column("Client (ms)", justify="right")
+        table.add_column("Server (ms)", justify="right")
+        table.add_column("Network + queue (ms)", justify="right")
+        table.add_column("Status")
+        for hop in hops:
+            # Clients stop timing at the response headers, so a server span can be slightly longer
+            gap = max(0.0, hop["client_ms"] - hop["server_ms"]) if hop["server_ms"] is not None else None
+            table.add_row(f"{hop['from']} → {hop['to']}", hop["request"], format_ms(hop["client_ms"]),
+                          format_ms(hop["server_ms"]), format_ms(gap), str(hop["status"]))
+        console.print(table)
+
+if __name__ == "__main__":
+    cli()
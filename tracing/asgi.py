@@ -0,0 +1,72 @@
+from fastapi import FastAPI
+
+from tracing.tracer import SERVER, Tracer, parse_traceparent
+
+class TracingMiddleware:
+    """Pure ASGI middleware recording a server span per request.
+
+    The span continues the caller's trace when the request carries a
+    traceparent header and is current while the endpoint runs, so client
+    spans for calls it makes become its children.
+    """
+
+    def __init__(self, app, tracer: Tracer, fastapi_app: FastAPI, traced_only: bool = False):
+        self.app = app
+        self.tracer = tracer
+        self.traced_only = traced_only
+        self.fastapi_app = fastapi_app
+        self._route_paths = None
+
+    def _route_for(self, scope) -> str:
+        if self._route_paths is None:
+            self._route_paths = {
+                route.endpoint: route.path for route in self.fastapi_app.routes if hasattr(route, "endpoint")
+            }
+        return self._route_paths.get(scope.get("endpoint"), scope["path"])
+
+    async def __call__(self, scope, receive, send):
+        if not self.tracer.enabled or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+        parent = parse_traceparent(traceparent)
+        if parent is None and self.traced_only:
+            return await self.app(scope, receive, send)
+        span = self.tracer.start_span(scope["method"], SERVER, parent,
+                                      {"http.method": scope["method"], "http.path": scope["path"]})
+        if span is None:
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                span.status = message["status"]
+            await send(message)
+
+        token = self.tracer.activate(span)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            span.status = "error"
+            span.attributes["error"] = type(e).__name__
+            raise
+        finally:
+            self.tracer.deactivate(token)
+            # The route is only known once the router has matched the request
+            route = self._route_for(scope)
+            span.name = f"{scope['method']} {route}"
+            span.attributes["http.route"] = route
+            self.tracer.finish(span)
+
+def install_tracing(app: FastAPI, service: str, traced_only: bool = False) -> Tracer:
+    """Record a server span for each request to ``app`` and return the service's tracer.
+
+    With ``traced_only`` requests that do not continue a caller's trace are
+    not recorded.
+    """
+    tracer = Tracer(service)
+    app.add_middleware(TracingMiddleware, tracer=tracer, fastapi_app=app, traced_only=traced_only)
+    return tracer
@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+import aiohttp
+import requests
+
+from tracing.tracer import CLIENT, Tracer, current_span, inject
+
+def _client_span(tracer: Tracer, method: str, url: str):
+    parts = urlsplit(str(url))
+    return tracer.start_span(f"{method.upper()} {parts.path or '/'}", CLIENT,
+                             attributes={"http.method": method.upper(), "http.path": parts.path,
+                                         "peer": parts.netloc})
+
+class TracingSession(requests.Session):
+    """A requests session recording a client span per request and propagating its traceparent.
+
+    Streamed responses are timed until their headers arrive; the body is
+    covered by the caller's span.
+    """
+
+    def __init__(self, tracer: Tracer):
+        super().__init__()
+        self.tracer = tracer
+
+    def request(self, method, url, *args, **kwargs):
+        span = _client_span(self.tracer, method, url) if self.tracer.enabled else None
+        if span is None:
+            return super().request(method, url, *args, **kwargs)
+        kwargs["headers"] = inject(dict(kwargs.get("headers") or {}), span)
+        try:
+            response = super().request(method, url, *args, **kwargs)
+        except Exception as e:
+            span.attributes["error"] = type(e).__name__
+            self.tracer.finish(span, "error")
+            raise
+        self.tracer.finish(span, response.status_code)
+        return response
+
+def aiohttp_trace_config(tracer: Tracer, traced_only: bool = False) -> aiohttp.TraceConfig:
+    """Hooks for ``aiohttp.ClientSession(trace_configs=[...])`` recording client spans.
+
+    aiohttp fires the hooks in the task making the request, so the span
+    current there becomes the parent. With ``traced_only`` requests made
+    outside any span, like background lease renewals, are not recorded.
+    """
+    config = aiohttp.TraceConfig(trace_config_ctx_factory=lambda trace_request_ctx: SimpleNamespace(span=None))
+
+    async def on_request_start(session, ctx, params):
+        if tracer.enabled and not (traced_only and current_span() is None):
+            ctx.span = _client_span(tracer, params.method, params.url)
+            inject(params.headers, ctx.span)
+
+    async def on_request_end(session, ctx, params):
+        tracer.finish(ctx.span, params.response.status)
+
+    async def on_request_exception(session, ctx, params):
+        if ctx.span is not None:
+            ctx.span.attributes["error"] = type(params.exception).__name__
+            tracer.finish(ctx.span, "error")
+
+    config.on_request_start.append(on_request_start)
+    config.on_request_end.append(on_request_end)
+    config.on_request_exception.append(on_request_exception)
+    return config
@@ -0,0 +1,40 @@
+from flask import Flask, g, request
+
+from tracing.tracer import SERVER, Tracer, parse_traceparent
+
+def install_tracing(app: Flask, service: str) -> Tracer:
+    """Flask counterpart of ``tracing.asgi.install_tracing``.
+
+    The span stays current until the request context is torn down, which
+    for streamed responses is after the last chunk has been sent.
+    """
+    tracer = Tracer(service)
+    if not tracer.enabled:
+        return tracer
+
+    @app.before_request
+    def start_span():
+        route = request.url_rule.rule if request.url_rule else request.path
+        span = tracer.start_span(f"{request.method} {route}", SERVER,
+                                 parse_traceparent(request.headers.get("traceparent")),
+                                 {"http.method": request.method, "http.path": request.path, "http.route": route})
+        g.trace_span = span
+        g.trace_token = tracer.activate(span)
+
+    @app.after_request
+    def record_status(response):
+        span = g.get("trace_span")
+        if span is not None:
+            span.status = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_span(exc):
+        span = g.pop("trace_span", None)
+        tracer.deactivate(g.pop("trace_token", None))
+        if span is not None:
+            if exc is not None:
+                span.attributes["error"] = type(exc).__name__
+            tracer.finish(span, "error" if exc is not None else None)
+
+    return tracer
@@ -0,0 +1,167 @@
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, NamedTuple, Optional, Union
+
+# Spans are only recorded when tracing is switched on, e.g. by `main.py --trace`
+TRACING_ENABLED = os.environ.get("ONTAP_TRACING", "0") == "1"
+TRACE_PATH = os.environ.get(
+    "ONTAP_TRACE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "traces")
+)
+
+TRACEPARENT_HEADER = "traceparent"
+_TRACEPARENT_RE = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+SERVER = "server"
+CLIENT = "client"
+INTERNAL = "internal"
+
+class SpanContext(NamedTuple):
+    """The remote parent carried by an incoming traceparent header."""
+    trace_id: str
+    span_id: str
+    sampled: bool
+
+def parse_traceparent(value: Optional[str]) -> Optional[SpanContext]:
+    """Parse a W3C traceparent header, returning None for missing or invalid values."""
+    if not value:
+        return None
+    match = _TRACEPARENT_RE.match(value.strip().lower())
+    if not match:
+        return None
+    version, trace_id, span_id, flags = match.groups()
+    if version == "ff" or trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return SpanContext(trace_id, span_id, bool(int(flags, 16) & 1))
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "service", "name", "kind",
+                 "start", "_started", "attributes", "status")
+
+    def __init__(self, trace_id: str, span_id: str, parent_id: Optional[str], service: str,
+                 name: str, kind: str, attributes: Optional[Dict] = None):
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.service = service
+        self.name = name
+        self.kind = kind
+        # Wall clock lines spans up across processes; the duration uses the monotonic clock
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.attributes = attributes or {}
+        self.status: Union[int, str, None] = None
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self, duration_ms: float) -> Dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "service": self.service,
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start,
+            "duration_ms": duration_ms,
+            "status": self.status,
+            "attributes": self.attributes
+        }
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("ontap_current_span", default=None)
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+class FileSpanExporter:
+    """Appends finished spans as JSON lines to a file per process under the trace directory."""
+
+    def __init__(self, path: str, service: str):
+        os.makedirs(path, exist_ok=True)
+        self.path = os.path.join(path, f"{service}-{os.getpid()}.jsonl")
+        self._lock = threading.Lock()
+        self._file = None
+
+    def export(self, record: Dict):
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            # Opened lazily so forked uvicorn workers each get their own file
+            if self._file is None:
+                self._file = open(self.path, "a", buffering=1)
+            self._file.write(line)
+
+class Tracer:
+    """Creates spans for one service and hands finished spans to the exporter.
+
+    When disabled every method returns immediately and no span objects are
+    created, so instrumented code pays a single flag check.
+    """
+
+    def __init__(self, service: str, path: str = TRACE_PATH, enabled: bool = TRACING_ENABLED):
+        self.service = service
+        self.enabled = enabled
+        self.exporter = FileSpanExporter(path, service) if enabled else None
+
+    def start_span(self, name: str, kind: str = INTERNAL, parent: Union[Span, SpanContext, None] = None,
+                   attributes: Optional[Dict] = None) -> Optional[Span]:
+        """Start a span under ``parent`` (default: the current span), or a new trace without one."""
+        if not self.enabled:
+            return None
+        if parent is None:
+            parent = _current_span.get()
+        if isinstance(parent, SpanContext) and not parent.sampled:
+            return None
+        if parent is None:
+            trace_id, parent_id = secrets.token_hex(16), None
+        else:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        return Span(trace_id, secrets.token_hex(8), parent_id, self.service, name, kind, attributes)
+
+    def finish(self, span: Optional[Span], status: Union[int, str, None] = None):
+        if span is None:
+            return
+        if status is not None:
+            span.status = status
+        self.exporter.export(span.to_dict((time.perf_counter() - span._started) * 1000))
+
+    @contextmanager
+    def span(self, name: str, kind: str = INTERNAL, parent: Union[Span, SpanContext, None] = None,
+             attributes: Optional[Dict] = None):
+        """Run a block as the current span; an exception marks it as an error."""
+        span = self.start_span(name, kind, parent, attributes)
+        if span is None:
+            yield None
+            return
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.attributes.setdefault("error", type(e).__name__)
+            raise
+        finally:
+            _current_span.reset(token)
+            self.finish(span)
+
+    def activate(self, span: Optional[Span]):
+        """Make ``span`` current; pass the returned token to ``deactivate``."""
+        return _current_span.set(span) if span is not None else None
+
+    def deactivate(self, token):
+        if token is not None:
+            _current_span.reset(token)
+
+def inject(headers: Dict, span: Optional[Span]) -> Dict:
+    """Add the traceparent for ``span`` to outgoing request headers."""
+    if span is not None:
+        headers[TRACEPARENT_HEADER] = span.traceparent()
+    return headers
+
+NOOP_TRACER = Tracer("noop", enabled=False)
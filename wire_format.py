@@ -0,0 +1,555 @@
+import json
+import math
+import struct
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from models import LIFStatus, LogicalInterface, Node, NodeStatus, NVRAMEntry, QoSPolicy, Volume
+
+try:
+    import msgpack
+except ImportError:  # Optional; free-form fields are sent as JSON without it
+    msgpack = None
+
+# Control-plane messages as fixed-width struct fields and length-prefixed
+# strings, with datetimes as integer microseconds and enums as one-byte codes.
+# Free-form dicts such as NVRAMEntry.data are embedded as msgpack when it is
+# installed and as JSON otherwise; a flag byte says which, so either end can
+# read the other. Records skip pydantic validation and are meant for traffic
+# between the simulator's own components.
+WIRE_CONTENT_TYPE = "application/vnd.ontap.wire"
+# Sent by clients that can read either encoding
+WIRE_ACCEPT = {"Accept": f"{WIRE_CONTENT_TYPE}, application/json;q=0.5"}
+
+VERSION = 2
+
+class WireFormatError(ValueError):
+    pass
+
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+# Microseconds since 1970-01-01 in the value's own wall clock, UTC offset in seconds
+_DATETIME = struct.Struct("<qi")
+
+_NO_STRING = 0xFFFF
+_NO_INT = -(1 << 63)
+_NO_TIME = -(1 << 63)
+_NO_FLOAT = float("nan")
+_NAIVE = -(1 << 31)
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+_PAYLOAD_JSON = 0
+_PAYLOAD_MSGPACK = 1
+# Bound once; json.dumps and json.loads rebuild or sniff on every call
+_encode_json = json.JSONEncoder(separators=(",", ":"), default=str).encode
+_decode_json = json.JSONDecoder().decode
+
+_NODE_STATUSES = tuple(NodeStatus)
+_NODE_STATUS_CODES = {status: code for code, status in enumerate(_NODE_STATUSES)}
+_LIF_STATUSES = tuple(LIFStatus)
+_LIF_STATUS_CODES = {status: code for code, status in enumerate(_LIF_STATUSES)}
+
+def _put_str(out: bytearray, value: Optional[str]):
+    if value is None:
+        out += _U16.pack(_NO_STRING)
+        return
+    data = value.encode()
+    if len(data) >= _NO_STRING:
+        raise WireFormatError(f"String of {len(data)} bytes is too long")
+    out += _U16.pack(len(data))
+    out += data
+
+def _datetime_fields(value: Optional[datetime]) -> tuple:
+    if value is None:
+        return _NO_TIME, 0
+    offset = value.utcoffset()
+    micros = (value.replace(tzinfo=None) - _EPOCH) // _MICROSECOND
+    return micros, _NAIVE if offset is None else int(offset.total_seconds())
+
+def _from_datetime_fields(micros: int, offset: int) -> Optional[datetime]:
+    if micros == _NO_TIME:
+        return None
+    value = _EPOCH + timedelta(microseconds=micros)
+    if offset != _NAIVE:
+        value = value.replace(tzinfo=timezone(timedelta(seconds=offset)))
+    return value
+
+def _put_datetime(out: bytearray, value: Optional[datetime]):
+    out += _DATETIME.pack(*_datetime_fields(value))
+
+def _put_payload(out: bytearray, value: Any):
+    data = None
+    if msgpack is not None:
+        try:
+            data = msgpack.packb(value)
+            out += _U8.pack(_PAYLOAD_MSGPACK)
+        except TypeError:
+            data = None
+    if data is None:
+        data = _encode_json(value).encode()
+        out += _U8.pack(_PAYLOAD_JSON)
+    out += _U32.pack(len(data))
+    out += data
+
+class _Reader:
+    __slots__ = ("buf", "pos")
+
+    def __init__(self, buf: bytes):
+        self.buf = buf
+        self.pos = 0
+
+    def fields(self, layout: struct.Struct) -> tuple:
+        values = layout.unpack_from(self.buf, self.pos)
+        self.pos += layout.size
+        return values
+
+    def str(self) -> Optional[str]:
+        (length,) = _U16.unpack_from(self.buf, self.pos)
+        self.pos += 2
+        if length == _NO_STRING:
+            return None
+        end = self.pos + length
+        if end > len(self.buf):
+            raise WireFormatError("Truncated message")
+        value = self.buf[self.pos:end].decode()
+        self.pos = end
+        return value
+
+    def datetime(self) -> Optional[datetime]:
+        micros, offset = _DATETIME.unpack_from(self.buf, self.pos)
+        self.pos += _DATETIME.size
+        return _from_datetime_fields(micros, offset)
+
+    def payload(self) -> Any:
+        kind = self.buf[self.pos]
+        (length,) = _U32.unpack_from(self.buf, self.pos + 1)
+        start = self.pos + 5
+        end = start + length
+        if end > len(self.buf):
+            raise WireFormatError("Truncated message")
+        self.pos = end
+        data = self.buf[start:end]
+        if kind == _PAYLOAD_MSGPACK:
+            if msgpack is None:
+                raise WireFormatError("Message needs msgpack, which is not installed")
+            return msgpack.unpackb(data)
+        return _decode_json(data.decode())
+
+class LIFRecord:
+    __slots__ = ("name", "ip_address", "current_node", "home_node", "status", "protocol", "port")
+    _FIXED = struct.Struct("<Bi")
+
+    def __init__(self, name: str, ip_address: str, current_node: str, home_node: str,
+                 status: LIFStatus, protocol: str, port: int):
+        self.name = name
+        self.ip_address = ip_address
+        self.current_node = current_node
+        self.home_node = home_node
+        self.status = status
+        self.protocol = protocol
+        self.port = port
+
+    @classmethod
+    def from_model(cls, lif: LogicalInterface) -> "LIFRecord":
+        return cls(lif.name, lif.ip_address, lif.current_node, lif.home_node, lif.status, lif.protocol, lif.port)
+
+    def to_model(self) -> LogicalInterface:
+        return LogicalInterface.construct(**self.to_json())
+
+    def to_json(self) -> Dict:
+        return {
+            "name": self.name,
+            "ip_address": self.ip_address,
+            "current_node": self.current_node,
+            "home_node": self.home_node,
+            "status": self.status,
+            "protocol": self.protocol,
+            "port": self.port
+        }
+
+    def pack(self, out: bytearray):
+        _put_str(out, self.name)
+        _put_str(out, self.ip_address)
+        _put_str(out, self.current_node)
+        _put_str(out, self.home_node)
+        _put_str(out, self.protocol)
+        out += self._FIXED.pack(_LIF_STATUS_CODES[self.status], self.port)
+
+    @classmethod
+    def unpack(cls, reader: _Reader) -> "LIFRecord":
+        name, ip_address, current_node, home_node, protocol = (
+            reader.str(), reader.str(), reader.str(), reader.str(), reader.str()
+        )
+        status, port = reader.fields(cls._FIXED)
+        return cls(name, ip_address, current_node, home_node, _LIF_STATUSES[status], protocol, port)
+
+class QoSPolicyRecord:
+    __slots__ = ("name", "max_iops", "max_mbps", "min_iops", "min_mbps")
+    # Unset limits are sent as _NO_INT and NaN
+    _FIXED = struct.Struct("<qdqd")
+
+    def __init__(self, name: str, max_iops: Optional[int] = None, max_mbps: Optional[float] = None,
+                 min_iops: Optional[int] = None, min_mbps: Optional[float] = None):
+        self.name = name
+        self.max_iops = max_iops
+        self.max_mbps = max_mbps
+        self.min_iops = min_iops
+        self.min_mbps = min_mbps
+
+    @classmethod
+    def from_model(cls, policy: QoSPolicy) -> "QoSPolicyRecord":
+        return cls(policy.name, policy.max_iops, policy.max_mbps, policy.min_iops, policy.min_mbps)
+
+    def to_model(self) -> QoSPolicy:
+        return QoSPolicy.construct(**self.to_json())
+
+    def to_json(self) -> Dict:
+        return {
+            "name": self.name,
+            "max_iops": self.max_iops,
+            "max_mbps": self.max_mbps,
+            "min_iops": self.min_iops,
+            "min_mbps": self.min_mbps
+        }
+
+    def pack(self, out: bytearray):
+        _put_str(out, self.name)
+        out += self._FIXED.pack(
+            _NO_INT if self.max_iops is None else self.max_iops,
+            _NO_FLOAT if self.max_mbps is None else self.max_mbps,
+            _NO_INT if self.min_iops is None else self.min_iops,
+            _NO_FLOAT if self.min_mbps is None else self.min_mbps
+        )
+
+    @classmethod
+    def unpack(cls, reader: _Reader) -> "QoSPolicyRecord":
+        name = reader.str()
+        max_iops, max_mbps, min_iops, min_mbps = reader.fields(cls._FIXED)
+        return cls(name,
+                   None if max_iops == _NO_INT else max_iops,
+                   None if math.isnan(max_mbps) else max_mbps,
+                   None if min_iops == _NO_INT else min_iops,
+                   None if math.isnan(min_mbps) else min_mbps)
+
+class VolumeRecord:
+    __slots__ = ("name", "size_gb", "used_gb", "state", "owner_node", "is_replica", "last_sync", "qos_policy")
+    _FIXED = struct.Struct("<qd?")
+
+    def __init__(self, name: str, size_gb: int, used_gb: float, state: str, owner_node: str,
+                 is_replica: bool = False, last_sync: Optional[datetime] = None, qos_policy: Optional[str] = None):
+        self.name = name
+        self.size_gb = size_gb
+        self.used_gb = used_gb
+        self.state = state
+        self.owner_node = owner_node
+        self.is_replica = is_replica
+        self.last_sync = last_sync
+        self.qos_policy = qos_policy
+
+    @classmethod
+    def from_model(cls, volume: Volume) -> "VolumeRecord":
+        return cls(volume.name, volume.size_gb, volume.used_gb, volume.state, volume.owner_node,
+                   volume.is_replica, volume.last_sync, volume.qos_policy)
+
+    def to_model(self) -> Volume:
+        return Volume.construct(**self.to_json())
+
+    def to_json(self) -> Dict:
+        return {
+            "name": self.name,
+            "size_gb": self.size_gb,
+            "used_gb": self.used_gb,
+            "state": self.state,
+            "owner_node": self.owner_node,
+            "is_replica": self.is_replica,
+            "last_sync": self.last_sync,
+            "qos_policy": self.qos_policy
+        }
+
+    def pack(self, out: bytearray):
+        _put_str(out, self.name)
+        _put_str(out, self.state)
+        _put_str(out, self.owner_node)
+        _put_str(out, self.qos_policy)
+        out += self._FIXED.pack(self.size_gb, self.used_gb, self.is_replica)
+        _put_datetime(out, self.last_sync)
+
+    @classmethod
+    def unpack(cls, reader: _Reader) -> "VolumeRecord":
+        name, state, owner_node, qos_policy = reader.str(), reader.str(), reader.str(), reader.str()
+        size_gb, used_gb, is_replica = reader.fields(cls._FIXED)
+        return cls(name, size_gb, used_gb, state, owner_node, is_replica, reader.datetime(), qos_policy)
+
+class NVRAMRecord:
+    __slots__ = ("timestamp", "operation", "data", "sequence_no")
+    # Timestamp, timestamp UTC offset, sequence number
+    _FIXED = struct.Struct("<qiq")
+
+    def __init__(self, timestamp: datetime, operation: str, data: Dict, sequence_no: int):
+        self.timestamp = timestamp
+        self.operation = operation
+        self.data = data
+        self.sequence_no = sequence_no
+
+    @classmethod
+    def from_model(cls, entry: NVRAMEntry) -> "NVRAMRecord":
+        return cls(entry.timestamp, entry.operation, entry.data, entry.sequence_no)
+
+    def to_model(self) -> NVRAMEntry:
+        return NVRAMEntry.construct(**self.to_json())
+
+    def to_json(self) -> Dict:
+        return {
+            "timestamp": self.timestamp,
+            "operation": self.operation,
+            "data": self.data,
+            "sequence_no": self.sequence_no
+        }
+
+    def pack(self, out: bytearray):
+        out += self._FIXED.pack(*_datetime_fields(self.timestamp), self.sequence_no)
+        _put_str(out, self.operation)
+        _put_payload(out, self.data)
+
+    @classmethod
+    def unpack(cls, reader: _Reader) -> "NVRAMRecord":
+        micros, offset, sequence_no = reader.fields(cls._FIXED)
+        return cls(_from_datetime_fields(micros, offset), reader.str(), reader.payload(), sequence_no)
+
+def _pack_list(out: bytearray, records: List):
+    out += _U32.pack(len(records))
+    for record in records:
+        record.pack(out)
+
+def _unpack_list(reader: _Reader, record_class) -> List:
+    (count,) = reader.fields(_U32)
+    return [record_class.unpack(reader) for _ in range(count)]
+
+def _pack_nvram_log(out: bytearray, entries: List[NVRAMRecord]):
+    # The data dicts of the whole log go in one payload after the entries,
+    # so decoding a long log parses one document rather than one per entry
+    out += _U32.pack(len(entries))
+    for entry in entries:
+        out += NVRAMRecord._FIXED.pack(*_datetime_fields(entry.timestamp), entry.sequence_no)
+        _put_str(out, entry.operation)
+    _put_payload(out, [entry.data for entry in entries])
+
+def _unpack_nvram_log(reader: _Reader) -> List[NVRAMRecord]:
+    (count,) = reader.fields(_U32)
+    fixed = NVRAMRecord._FIXED
+    entries = []
+    for _ in range(count):
+        micros, offset, sequence_no = reader.fields(fixed)
+        entries.append(NVRAMRecord(_from_datetime_fields(micros, offset), reader.str(), None, sequence_no))
+    data = reader.payload()
+    if len(data) != count:
+        raise WireFormatError(f"NVRAM log has {count} entries but {len(data)} payloads")
+    for entry, payload in zip(entries, data):
+        entry.data = payload
+    return entries
+
+class NodeRecord:
+    __slots__ = ("name", "status", "role", "partner_node", "volumes", "lifs", "nvram_log", "last_heartbeat",
+                 "qos_policies")
+
+    def __init__(self, name: str, status: NodeStatus, role: str, partner_node: Optional[str],
+                 volumes: List[VolumeRecord], lifs: List[LIFRecord], nvram_log: List[NVRAMRecord],
+                 last_heartbeat: Optional[datetime], qos_policies: Optional[List[QoSPolicyRecord]] = None):
+        self.name = name
+        self.status = status
+        self.role = role
+        self.partner_node = partner_node
+        self.volumes = volumes
+        self.lifs = lifs
+        self.nvram_log = nvram_log
+        self.last_heartbeat = last_heartbeat
+        self.qos_policies = qos_policies or []
+
+    @classmethod
+    def from_model(cls, node: Node) -> "NodeRecord":
+        return cls(node.name, node.status, node.role, node.partner_node,
+                   [VolumeRecord.from_model(v) for v in node.volumes],
+                   [LIFRecord.from_model(l) for l in node.lifs],
+                   [NVRAMRecord.from_model(e) for e in node.nvram_log],
+                   node.last_heartbeat,
+                   [QoSPolicyRecord.from_model(p) for p in node.qos_policies])
+
+    def to_model(self) -> Node:
+        return Node.construct(
+            name=self.name,
+            status=self.status,
+            role=self.role,
+            partner_node=self.partner_node,
+            volumes=[v.to_model() for v in self.volumes],
+            lifs=[l.to_model() for l in self.lifs],
+            nvram_log=[e.to_model() for e in self.nvram_log],
+            qos_policies=[p.to_model() for p in self.qos_policies],
+            last_heartbeat=self.last_heartbeat
+        )
+
+    def to_json(self) -> Dict:
+        return {
+            "name": self.name,
+            "status": self.status,
+            "role": self.role,
+            "partner_node": self.partner_node,
+            "volumes": [v.to_json() for v in self.volumes],
+            "lifs": [l.to_json() for l in self.lifs],
+            "nvram_log": [e.to_json() for e in self.nvram_log],
+            "qos_policies": [p.to_json() for p in self.qos_policies],
+            "last_heartbeat": self.last_heartbeat
+        }
+
+    def pack(self, out: bytearray):
+        _put_str(out, self.name)
+        out += _U8.pack(_NODE_STATUS_CODES[self.status])
+        _put_str(out, self.role)
+        _put_str(out, self.partner_node)
+        _put_datetime(out, self.last_heartbeat)
+        _pack_list(out, self.volumes)
+        _pack_list(out, self.lifs)
+        _pack_nvram_log(out, self.nvram_log)
+        _pack_list(out, self.qos_policies)
+
+    @classmethod
+    def unpack(cls, reader: _Reader) -> "NodeRecord":
+        name = reader.str()
+        (status,) = reader.fields(_U8)
+        role, partner_node, last_heartbeat = reader.str(), reader.str(), reader.datetime()
+        volumes = _unpack_list(reader, VolumeRecord)
+        lifs = _unpack_list(reader, LIFRecord)
+        nvram_log = _unpack_nvram_log(reader)
+        qos_policies = _unpack_list(reader, QoSPolicyRecord)
+        return cls(name, _NODE_STATUSES[status], role, partner_node, volumes, lifs, nvram_log, last_heartbeat,
+                   qos_policies)
+
+class HealthRecord:
+    """Body of ``GET /health``, polled by the HA controller every heartbeat."""
+    __slots__ = ("status", "last_heartbeat", "role")
+    TYPE = 1
+
+    def __init__(self, status: NodeStatus, last_heartbeat: Optional[datetime], role: str):
+        self.status = status
+        self.last_heartbeat = last_heartbeat
+        self.role = role
+
+    def to_json(self) -> Dict:
+        return {"status": self.status, "last_heartbeat": self.last_heartbeat, "role": self.role}
+
+    def pack(self, out: bytearray):
+        out += _U8.pack(_NODE_STATUS_CODES[self.status])
+        _put_datetime(out, self.last_heartbeat)
+        _put_str(out, self.role)
+
+    @classmethod
+    def unpack(cls, reader: _Reader) -> "HealthRecord":
+        (status,) = reader.fields(_U8)
+        return cls(_NODE_STATUSES[status], reader.datetime(), reader.str())
+
+class StatusRecord:
+    """Body of ``GET /status``. The JSON form repeats the volumes and LIFs; this sends them once."""
+    __slots__ = ("node", "nvram_entries", "fencing")
+    TYPE = 2
+
+    def __init__(self, node: NodeRecord, nvram_entries: int, fencing: Dict):
+        self.node = node
+        self.nvram_entries = nvram_entries
+        self.fencing = fencing
+
+    def to_json(self) -> Dict:
+        node = self.node.to_json()
+        return {
+            "node": node,
+            "volumes": node["volumes"],
+            "lifs": node["lifs"],
+            "nvram_entries": self.nvram_entries,
+            "fencing": self.fencing
+        }
+
+    def pack(self, out: bytearray):
+        self.node.pack(out)
+        out += _U32.pack(self.nvram_entries)
+        _put_payload(out, self.fencing)
+
+    @classmethod
+    def unpack(cls, reader: _Reader) -> "StatusRecord":
+        node = NodeRecord.unpack(reader)
+        (nvram_entries,) = reader.fields(_U32)
+        return cls(node, nvram_entries, reader.payload())
+
+class NVRAMSyncRecord(NVRAMRecord):
+    """Body of ``POST /nvram/sync``."""
+    __slots__ = ()
+    TYPE = 3
+
+class AckRecord:
+    """Reply to takeover, giveback, failover and NVRAM sync requests."""
+    __slots__ = ("message", "timestamp", "sequence_no")
+    TYPE = 4
+    # Timestamp, timestamp UTC offset, sequence number
+    _FIXED = struct.Struct("<qiq")
+
+    def __init__(self, message: str, timestamp: Optional[datetime] = None, sequence_no: Optional[int] = None):
+        self.message = message
+        self.timestamp = timestamp
+        self.sequence_no = sequence_no
+
+    def to_json(self) -> Dict:
+        body = {"message": self.message}
+        if self.timestamp is not None:
+            body["timestamp"] = self.timestamp
+        if self.sequence_no is not None:
+            body["sequence_no"] = self.sequence_no
+        return body
+
+    def pack(self, out: bytearray):
+        out += self._FIXED.pack(*_datetime_fields(self.timestamp),
+                                _NO_INT if self.sequence_no is None else self.sequence_no)
+        _put_str(out, self.message)
+
+    @classmethod
+    def unpack(cls, reader: _Reader) -> "AckRecord":
+        micros, offset, sequence_no = reader.fields(cls._FIXED)
+        return cls(reader.str(), _from_datetime_fields(micros, offset),
+                   None if sequence_no == _NO_INT else sequence_no)
+
+_MESSAGE_TYPES = {record.TYPE: record for record in (HealthRecord, StatusRecord, NVRAMSyncRecord, AckRecord)}
+
+def encode(message) -> bytes:
+    """Frame a message record as a version byte, a type byte and its fields."""
+    out = bytearray(_U8.pack(VERSION))
+    out += _U8.pack(message.TYPE)
+    message.pack(out)
+    return bytes(out)
+
+def decode(body: bytes):
+    """Decode a framed message back into its record class."""
+    if len(body) < 2 or body[0] != VERSION:
+        raise WireFormatError("Not a supported wire format message")
+    record_class = _MESSAGE_TYPES.get(body[1])
+    if record_class is None:
+        raise WireFormatError(f"Unknown message type {body[1]}")
+    reader = _Reader(body)
+    reader.pos = 2
+    try:
+        message = record_class.unpack(reader)
+    except (struct.error, IndexError, UnicodeDecodeError, ValueError) as e:
+        raise WireFormatError(f"Malformed {record_class.__name__}: {e}") from e
+    if reader.pos != len(body):
+        raise WireFormatError(f"{len(body) - reader.pos} unexpected trailing bytes")
+    return message
+
+def is_wire(content_type: Optional[str]) -> bool:
+    return bool(content_type) and content_type.split(";", 1)[0].strip() == WIRE_CONTENT_TYPE
+
+def decode_body(content_type: Optional[str], body: bytes) -> Dict:
+    """Parse a response body in whichever encoding the server chose, in its JSON shape.
+
+    Used by clients of the nodes; nodes read request bodies with
+    ``negotiate.read_message``, which yields typed records instead.
+    """
+    if is_wire(content_type):
+        return decode(body).to_json()
+    return json.loads(body)